@@ -1,7 +1,8 @@
 from typing import Union
 
+from django.conf import settings
 from django.contrib import admin, messages
-from django.db.models import Prefetch
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
 from django.forms import ModelForm
 from django.http import HttpRequest, HttpResponse
@@ -15,6 +16,7 @@ from .models import Product, Supplier
 ERROR_DEBT_MSG = "Ошибка: нельзя удалить звено {name} с долгом перед поставщиком"
 ERROR_DEBT_NEXT_LEVEL_MSG = ("Ошибка: нельзя удалить звено {name}, так как у его поставщика {debtor_name} "
                              "на следующем уровне иерархии есть долг")
+ERROR_CYCLE_MSG = "Ошибка: нельзя создать циклическую зависимость между поставщиками"
 
 
 class BaseAdmin(admin.ModelAdmin):
@@ -83,18 +85,9 @@ class SupplierAdmin(BaseAdmin):
     list_display = ['id', 'type_supplier', 'name', 'link_to_parent', 'number_of_intermediaries', 'debt']
     list_display_links = ['name']
     list_filter = ['city']
+    ordering = ['sort_path']
     actions = ['clear_debt']
 
-    @staticmethod
-    def _reassign_children_to_parent(obj):
-        """
-        Переназначает детей поставщика на его родительское звено.
-
-        """
-        for child in obj.get_children():
-            child.parent = obj.parent
-            child.save()
-
     @staticmethod
     def _show_debt_error_message(request, obj, debtor):
         """
@@ -105,51 +98,75 @@ class SupplierAdmin(BaseAdmin):
         else:
             messages.error(request, ERROR_DEBT_NEXT_LEVEL_MSG.format(name=obj.name, debtor_name=debtor.name))
 
-    def _handle_deletion(self, request, obj):
+    def _handle_deletion(self, request, obj, blockers):
         """
         Обрабатывает удаление поставщика, учитывая наличие задолженности.
+        При мягком удалении дети не переназначаются: это делает фоновая очистка.
         """
-        can_delete, debtor = obj.can_be_deleted()
-        if not can_delete:
+        debtor = blockers.get(obj.pk)
+        if debtor is not None:
             self._show_debt_error_message(request, obj, debtor)
             return False
 
-        self._reassign_children_to_parent(obj)
+        if not settings.SUPPLIER_SOFT_DELETE:
+            Supplier.objects.reparent_children(obj)
         return True
 
     def delete_model(self, request, obj):
         """
         Удаляет модель поставщика, учитывая наличие задолженности.
         """
-        if self._handle_deletion(request, obj):
-            super().delete_model(request, obj)
-            Supplier.objects.rebuild()
+        if settings.SUPPLIER_SOFT_DELETE:
+            return self.delete_queryset(request, Supplier.objects.filter(pk=obj.pk))
+
+        with Supplier.objects.lock_trees(obj, tree_ids=[None] if obj.parent_id is None else []):
+            blockers = Supplier.objects.filter(pk=obj.pk).deletion_blockers()
+            if self._handle_deletion(request, obj, blockers):
+                Supplier.objects.delete_node(obj)
 
     def delete_queryset(self, request, queryset):
         """
         Удаляет набор объектов, учитывая наличие задолженности.
-        """
-        queryset = queryset.prefetch_related(
-            Prefetch('children', to_attr='cached_children')
-        )
-        ids_to_delete = []
-        for obj in queryset:
-            if self._handle_deletion(request, obj):
-                ids_to_delete.append(obj.id)
-
-        if ids_to_delete:
-            queryset_to_delete = queryset.filter(id__in=ids_to_delete)
-            super().delete_queryset(request, queryset_to_delete)
-            Supplier.objects.rebuild()
+        Задолженность всех выбранных звеньев проверяется одним запросом,
+        при мягком удалении звенья помечаются тоже одним запросом.
+        """
+        objs = list(queryset)
+        if settings.SUPPLIER_SOFT_DELETE:
+            blockers = queryset.deletion_blockers()
+            Supplier.objects.soft_delete(*[obj.pk for obj in objs if self._handle_deletion(request, obj, blockers)])
+            return
+
+        roots = any(obj.parent_id is None for obj in objs)
+        with Supplier.objects.lock_trees(*objs, tree_ids=[None] if roots else []):
+            blockers = queryset.deletion_blockers()
+            ids_to_delete = []
+            for obj in objs:
+                if self._handle_deletion(request, obj, blockers):
+                    ids_to_delete.append(obj.id)
+
+            if ids_to_delete:
+                Supplier.objects.delete_nodes(Supplier.objects.filter(id__in=ids_to_delete))
 
     def save_model(self, request, obj, form, change):
         """
         Сохраняет модель поставщика с проверкой на циклическую зависимость.
+        Перенос звена в собственное поддерево отклоняется до записи по интервалам lft/rght,
+        нарушение ограничения CHECK звена показывается сообщением правила.
         """
+        if change and Supplier.objects.creates_cycle(obj, obj.parent):
+            messages.error(request, ERROR_CYCLE_MSG)
+            return
         try:
-            super().save_model(request, obj, form, change)
+            with transaction.atomic():
+                super().save_model(request, obj, form, change)
         except InvalidMove:
-            messages.error(request, "Ошибка: нельзя создать циклическую зависимость между поставщиками")
+            messages.error(request, ERROR_CYCLE_MSG)
+        except IntegrityError as e:
+            # Правила иерархии проверяет форма по ограничениям модели, сюда попадают параллельные изменения.
+            message = Supplier.constraint_error(e)
+            if message is None:
+                raise
+            messages.error(request, message)
 
     def response_change(self, request: HttpRequest, obj: Supplier) -> HttpResponse:
         """
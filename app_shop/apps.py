@@ -5,3 +5,6 @@ class AppShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_shop'
     verbose_name = 'Торговая сеть'
+
+    def ready(self):
+        import app_shop.signals  # noqa: F401
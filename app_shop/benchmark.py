@@ -0,0 +1,127 @@
+import time
+from contextlib import contextmanager
+from typing import List
+
+from django.db import connection
+
+from app_shop.integrity import number_subtree
+from app_shop.models import Supplier
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCounter:
+    """
+    Обертка над выполнением SQL, считающая запросы и измененные строки.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.rows += max(context['cursor'].rowcount, 0)
+        return result
+
+
+@contextmanager
+def measure():
+    """
+    Замеряет время, количество запросов и измененных строк внутри блока.
+    """
+    counter = WriteCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield counter
+    counter.seconds = time.perf_counter() - started
+
+
+def make_supplier(index: int, type_supplier: str, **fields) -> Supplier:
+    """
+    Возвращает несохраненное звено с уникальными по ``index`` названием и email.
+    """
+    return Supplier(**{
+        'type_supplier': type_supplier,
+        'name': f'bench-{index:08d}',
+        'email': f'bench-{index}@example.com',
+        'country': 'Россия',
+        'city': 'Москва',
+        'street': 'Ленина',
+        'house_number': '1',
+        'debt': 0,
+        **fields,
+    })
+
+
+def build_forest(size: int, fanout: int = 10) -> List[Supplier]:
+    """
+    Создает сеть из заводов с дистрибьюторами и розницей общим размером около ``size`` звеньев.
+
+    Значения lft/rght/level/tree_id вычисляются сразу, поэтому вставка идет через
+    bulk_create без перестроения дерева, ключи сортировки
+    заполняются одним запросом. Возвращает корни созданных деревьев.
+    """
+    tree_size = 1 + fanout + fanout * fanout
+    middle_width = 2 * (fanout + 1)
+    first_tree_id = Supplier.objects._get_next_tree_id()
+    index = Supplier.objects.count()
+
+    roots = []
+    for tree in range(max(size // tree_size, 1)):
+        index += 1
+        roots.append(make_supplier(index, 'factory', tree_id=first_tree_id + tree, level=0,
+                                   lft=1, rght=2 * tree_size))
+    Supplier.objects.bulk_create(roots)
+
+    middles = []
+    for root in roots:
+        for position in range(fanout):
+            index += 1
+            left = 2 + position * middle_width
+            middles.append(make_supplier(index, 'retail', parent=root, tree_id=root.tree_id, level=1,
+                                         lft=left, rght=left + middle_width - 1))
+    Supplier.objects.bulk_create(middles)
+
+    leaves = []
+    for middle in middles:
+        for position in range(fanout):
+            index += 1
+            left = middle.lft + 1 + 2 * position
+            leaves.append(make_supplier(index, 'entrepreneur', parent=middle, tree_id=middle.tree_id, level=2,
+                                        lft=left, rght=left + 1))
+    Supplier.objects.bulk_create(leaves, batch_size=5000)
+    Supplier.objects.rebuild_sort_paths()
+
+    return roots
+
+
+def build_tree(size: int, fanout: int = 10) -> Supplier:
+    """
+    Создает одно дерево из ``size`` звеньев: завод, у каждого звена до ``fanout`` детей,
+    уровни заполняются по очереди. При малом fanout дерево глубокое: при fanout=2 - log2(size) уровней.
+
+    Границы lft/rght вычисляются по номерам звеньев до вставки, звенья вставляются
+    через bulk_create по уровням, чтобы id родителя был известен. Возвращает корень.
+    """
+    children = {index: [(child,) for child in range(fanout * index + 1, min(fanout * (index + 1), size - 1) + 1)]
+                for index in range(size)}
+    tree_id = Supplier.objects._get_next_tree_id()
+    first = Supplier.objects.count() + 1
+
+    levels: List[List[Supplier]] = []
+    nodes = {}
+    for index, left, right, level in sorted(number_subtree(children, (0,)), key=lambda bounds: bounds[0]):
+        type_supplier = 'factory' if index == 0 else 'retail' if children[index] else 'entrepreneur'
+        parent = nodes[(index - 1) // fanout] if index else None
+        nodes[index] = make_supplier(first + index, type_supplier, parent=parent, tree_id=tree_id, level=level,
+                                     lft=left, rght=right)
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(nodes[index])
+    for level in levels:
+        Supplier.objects.bulk_create(level, batch_size=5000)
+    Supplier.objects.rebuild_sort_paths()
+    return nodes[0]
@@ -0,0 +1,302 @@
+"""
+Массовая загрузка цепочек звеньев сети.
+
+Документ - список звеньев (или объект с ключом suppliers). Родитель звена задается
+вложенностью (children), ссылкой parent_ref на ref другого звена документа или
+parent - id существующего звена. Документ проверяется целиком: ошибки всех звеньев
+возвращаются вместе, и при любой ошибке ничего не записывается.
+
+Поля дерева вычисляются до вставки: id резервируются в последовательности одним запросом,
+поэтому у новых деревьев lft/rght/level/tree_id и ключи сортировки известны сразу,
+и звенья вставляются через bulk_create без перестроения. Существующие деревья, к которым
+присоединяются звенья, перенумеровываются по связям parent один раз после вставки.
+Итоги поддерева и версии деревьев ведут триггеры базы данных.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.db import IntegrityError, connection
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from app_shop.hierarchy import get_hierarchy
+from app_shop.integrity import number_subtree, rebuild_tree
+from app_shop.models import ERROR_FACTORY_PARENT_MSG, ERROR_ROOT_DEBT_MSG, Supplier
+from app_shop.serializers import SupplierImportSerializer
+
+PENDING_BOUND = 2 ** 31 - 1
+
+RESERVE_IDS_SQL = "SELECT nextval(pg_get_serial_sequence('suppliers', 'id')) FROM generate_series(1, %s)"
+
+ERROR_CYCLE_MSG = 'Зацикленные отношения не допустимы'
+
+
+class SupplierImportError(Exception):
+    """
+    Документ не прошел проверку. errors - список {'index', 'ref', 'errors'} по звеньям
+    в порядке обхода документа; index и ref равны None для ошибок всего документа.
+    """
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(errors)
+        self.errors = errors
+
+
+@dataclass
+class ImportRow:
+    """
+    Звено документа: порядковый номер при обходе, ref и ссылка на родителя.
+    """
+
+    index: int
+    ref: str
+    data: dict
+    parent_ref: Optional[str] = None
+    parent: Optional[int] = None
+    named: bool = False
+    validated: Optional[dict] = None
+
+
+@dataclass
+class ImportResult:
+    """
+    Итог загрузки: вставлено звеньев, создано новых деревьев, перенумеровано существующих,
+    время в секундах и id звеньев по ref, указанным в документе.
+    """
+
+    rows: int = 0
+    trees: int = 0
+    rebuilt_trees: int = 0
+    seconds: float = 0.0
+    ids: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def parse_document(document) -> Tuple[List[ImportRow], Dict[int, List[str]]]:
+    """
+    Разворачивает вложенный документ в список звеньев в порядке обхода в глубину
+    и возвращает его вместе с ошибками структуры по номерам звеньев.
+    Звенья без ref получают ref '#<номер>'.
+    """
+    items = document.get('suppliers') if isinstance(document, dict) else document
+    if not isinstance(items, list):
+        raise SupplierImportError([{'index': None, 'ref': None, 'errors': ['Ошибка: ожидается список звеньев']}])
+
+    rows: List[ImportRow] = []
+    errors: Dict[int, List[str]] = {}
+    stack = [(item, None) for item in reversed(items)]
+    while stack:
+        item, nesting_ref = stack.pop()
+        index = len(rows)
+        if not isinstance(item, dict):
+            rows.append(ImportRow(index, f'#{index}', {}, parent_ref=nesting_ref))
+            errors.setdefault(index, []).append('Ошибка: звено должно быть объектом')
+            continue
+
+        data = dict(item)
+        ref, parent_ref, parent = data.pop('ref', None), data.pop('parent_ref', None), data.pop('parent', None)
+        children = data.pop('children', [])
+        row = ImportRow(index, f'#{index}' if ref is None else str(ref), data,
+                        parent_ref=None if parent_ref is None else str(parent_ref), parent=parent,
+                        named=ref is not None)
+        rows.append(row)
+
+        if nesting_ref is not None:
+            if parent_ref is not None or parent is not None:
+                errors.setdefault(index, []).append('Ошибка: родитель вложенного звена задается вложенностью')
+            row.parent_ref, row.parent = nesting_ref, None
+        elif parent is not None and parent_ref is not None:
+            errors.setdefault(index, []).append('Ошибка: указаны одновременно parent и parent_ref')
+        elif parent is not None and (isinstance(parent, bool) or not isinstance(parent, int)):
+            errors.setdefault(index, []).append('Ошибка: parent должен быть id существующего звена')
+            row.parent = None
+
+        if not isinstance(children, list):
+            errors.setdefault(index, []).append('Ошибка: children должен быть списком звеньев')
+            continue
+        stack.extend((child, row.ref) for child in reversed(children))
+    return rows, errors
+
+
+def plan_order(rows: List[ImportRow], errors: Dict[int, List[str]]) -> List[ImportRow]:
+    """
+    Возвращает звенья в порядке вставки: каждое звено после своего родителя из документа.
+    Звенья, до которых нельзя дойти от звеньев без parent_ref, лежат на цикле ссылок или под ним.
+    """
+    by_ref: Dict[str, ImportRow] = {}
+    for row in rows:
+        if row.ref in by_ref:
+            errors.setdefault(row.index, []).append(f'Ошибка: ref {row.ref} повторяется в документе')
+        else:
+            by_ref[row.ref] = row
+
+    children: Dict[str, List[ImportRow]] = {}
+    order = []
+    for row in rows:
+        if row.parent_ref is None:
+            order.append(row)
+        elif row.parent_ref not in by_ref:
+            errors.setdefault(row.index, []).append(f'Ошибка: звено с ref {row.parent_ref} не найдено в документе')
+        else:
+            children.setdefault(row.parent_ref, []).append(row)
+    for row in order:
+        if by_ref.get(row.ref) is row:
+            order.extend(children.get(row.ref, []))
+
+    planned = {row.index for row in order}
+    orphaned: Dict[str, bool] = {}
+    for row in rows:
+        if row.index in planned or row.parent_ref not in by_ref:
+            continue
+        chain, current = {}, row
+        while current.ref not in orphaned and current.ref not in chain and current.parent_ref in by_ref:
+            chain[current.ref] = True
+            current = by_ref[current.parent_ref]
+        # Цепочка без цикла обрывается на звене с ненайденным parent_ref, ошибка уже записана у него.
+        missing = orphaned.get(current.ref, current.ref not in chain and current.parent_ref not in by_ref)
+        orphaned.update(dict.fromkeys(chain, missing))
+        if not missing:
+            errors.setdefault(row.index, []).append(ERROR_CYCLE_MSG)
+    return order
+
+
+def validate_rows(rows: List[ImportRow], errors: Dict[int, List[str]]) -> None:
+    """
+    Проверяет поля каждого звена и правила иерархии, а уникальность
+    (страна, город, название, email) - внутри документа.
+    Поля сериализатора создаются один раз для всего документа.
+    """
+    keys: Dict[tuple, int] = {}
+    serializer = SupplierImportSerializer()
+    for row in rows:
+        try:
+            row.validated = serializer.run_validation(row.data)
+        except serializers.ValidationError as e:
+            errors.setdefault(row.index, []).extend(
+                message if name == api_settings.NON_FIELD_ERRORS_KEY else f'{name}: {message}'
+                for name, messages in e.detail.items() for message in messages
+            )
+            continue
+
+        has_parent = row.parent is not None or row.parent_ref is not None
+        if row.validated['type_supplier'] == 'factory' and has_parent:
+            errors.setdefault(row.index, []).append(ERROR_FACTORY_PARENT_MSG)
+        if not has_parent and row.validated['debt'] > 0:
+            errors.setdefault(row.index, []).append(ERROR_ROOT_DEBT_MSG)
+
+        key = unique_key(row.validated)
+        if key in keys:
+            errors.setdefault(row.index, []).append(
+                f'Ошибка: звено с такими страной, городом, названием и email уже есть в документе '
+                f'(звено {keys[key]})'
+            )
+        else:
+            keys[key] = row.index
+
+
+def unique_key(data: dict) -> tuple:
+    return data['country'], data['city'], data['name'], data['email']
+
+
+def check_database(rows: List[ImportRow], parents: Dict[int, Supplier], errors: Dict[int, List[str]]) -> None:
+    """
+    Проверяет одним запросом к каждой таблице существование родителей и уникальность звеньев в базе.
+    """
+    validated = [row for row in rows if row.validated is not None]
+    taken = set(Supplier.all_objects.filter(email__in={row.validated['email'] for row in validated})
+                .values_list('country', 'city', 'name', 'email'))
+    for row in validated:
+        if unique_key(row.validated) in taken:
+            errors.setdefault(row.index, []).append(
+                'Ошибка: звено с такими страной, городом, названием и email уже существует'
+            )
+    for row in rows:
+        if row.parent is not None and row.parent not in parents:
+            errors.setdefault(row.index, []).append(f'Ошибка: звено {row.parent} не найдено')
+
+
+def reserve_ids(count: int) -> List[int]:
+    """
+    Резервирует count значений первичного ключа в последовательности таблицы звеньев.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(RESERVE_IDS_SQL, [count])
+        return sorted(pk for pk, in cursor.fetchall())
+
+
+def build_nodes(order: List[ImportRow], parents: Dict[int, Supplier]) -> Tuple[List[Supplier], List[Supplier]]:
+    """
+    Создает несохраненные звенья с id, ключами сортировки и полями дерева.
+
+    Новые деревья нумеруются сразу. Звенья, присоединяемые к существующим деревьям,
+    получают временные границы PENDING_BOUND: при перенумерации дерева они
+    оказываются после прежних детей родителя в порядке документа.
+    Возвращает все звенья и корни новых деревьев.
+    """
+    nodes: Dict[str, Supplier] = {}
+    children: Dict[int, List[tuple]] = {}
+    roots = []
+    next_tree_id = Supplier.objects._get_next_tree_id()
+    for row, pk in zip(order, reserve_ids(len(order))):
+        node = Supplier(pk=pk, lft=PENDING_BOUND, rght=PENDING_BOUND, **row.validated)
+        parent = nodes[row.parent_ref] if row.parent_ref is not None else parents.get(row.parent)
+        if parent is None:
+            node.tree_id, node.level, node.sort_path = next_tree_id, 0, []
+            next_tree_id += 1
+            roots.append(node)
+        else:
+            node.parent_id, node.tree_id, node.level = parent.pk, parent.tree_id, parent.level + 1
+            node.sort_path = list(parent.sort_path)
+            children.setdefault(parent.pk, []).append((pk,))
+        node.sort_path += [node.name, str(pk).zfill(19)]
+        nodes[row.ref] = node
+
+    by_pk = {node.pk: node for node in nodes.values()}
+    step = Supplier.objects.gap or 1
+    for root in roots:
+        for pk, left, right, _level in number_subtree(children, (root.pk,), step):
+            by_pk[pk].lft, by_pk[pk].rght = left, right
+    return list(nodes.values()), roots
+
+
+def import_suppliers(document, batch_size: int = 1000) -> ImportResult:
+    """
+    Проверяет документ и вставляет его звенья одной транзакцией.
+
+    Вставка выполняется под блокировкой деревьев существующих родителей и ключа новых деревьев.
+    При ошибках проверки выбрасывает SupplierImportError со всеми найденными ошибками.
+    """
+    started = time.perf_counter()
+    rows, errors = parse_document(document)
+    order = plan_order(rows, errors)
+    validate_rows(rows, errors)
+
+    parent_ids = {row.parent for row in rows if row.parent is not None}
+    try:
+        with Supplier.objects.lock_trees(*Supplier.objects.in_bulk(parent_ids).values(), tree_ids=[None]):
+            parents = Supplier.objects.only('id', 'tree_id', 'level', 'sort_path').in_bulk(parent_ids)
+            check_database(rows, parents, errors)
+            if errors:
+                raise SupplierImportError([
+                    {'index': index, 'ref': rows[index].ref, 'errors': errors[index]} for index in sorted(errors)
+                ])
+
+            nodes, roots = build_nodes(order, parents)
+            Supplier.objects.bulk_create(nodes, batch_size=batch_size)
+            touched = {parent.tree_id for parent in parents.values()}
+            for root_id, tree_id in Supplier.all_objects.filter(tree_id__in=touched, parent=None).values_list(
+                    'id', 'tree_id'):
+                rebuild_tree(root_id, tree_id)
+
+            get_hierarchy().nodes_inserted([node.pk for node in nodes])
+    except IntegrityError as e:
+        # Такое же звено вставили параллельно между проверкой и вставкой.
+        raise SupplierImportError([{'index': None, 'ref': None, 'errors': [f'Ошибка: {e}']}]) from e
+
+    ids = {row.ref: node.pk for row, node in zip(order, nodes) if row.named}
+    return ImportResult(rows=len(nodes), trees=len(roots), rebuilt_trees=len(touched),
+                        seconds=time.perf_counter() - started, ids=ids)
@@ -0,0 +1,108 @@
+"""
+Координатор структурных изменений деревьев звеньев сети.
+
+Изменения одного дерева выполняются по очереди под транзакционной
+advisory-блокировкой PostgreSQL с ключом tree_id, изменения разных деревьев
+идут параллельно. Блокировка с ключом 0 сериализует создание новых деревьев,
+чтобы два новых корня не получили один tree_id. Каждая блокировка деревьев
+берет разделяемую блокировку с ключом ALL_TREES, а онлайн-перестроение - исключительную:
+перенос новых значений ждет изменений, которые уже прочитали границы деревьев.
+
+Все пути записи (API, админка, загрузка, очистка) изменяют дерево инкрементально под его блокировкой
+и не оставляют его поврежденным, поэтому очереди исправлений нет: деревья, поврежденные
+в обход приложения, находит и перестраивает команда check_tree.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from django.db import connection, transaction
+
+TREE_LOCK_NAMESPACE = 7301
+
+NEW_TREE = 0
+
+ALL_TREES = -1
+
+
+class LockStats:
+    """
+    Время ожидания блокировок деревьев в текущем процессе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+
+lock_stats = LockStats()
+
+
+@contextmanager
+def tree_lock(tree_ids: Iterable[Optional[int]]):
+    """
+    Открывает транзакцию и блокирует деревья tree_ids до ее завершения.
+
+    Блокировки берутся в порядке возрастания tree_id, поэтому изменения,
+    затрагивающие несколько деревьев, не блокируют друг друга взаимно.
+    None означает создание нового дерева и блокирует ключ NEW_TREE.
+    """
+    keys = sorted({NEW_TREE if tree_id is None else tree_id for tree_id in tree_ids})
+    with transaction.atomic():
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            # Разделяемая блокировка ALL_TREES берется тем же запросом, что и первый ключ.
+            first = keys[:1]
+            sql = 'SELECT pg_advisory_xact_lock_shared(%s, %s)' + ', pg_advisory_xact_lock(%s, %s)' * len(first)
+            params = [TREE_LOCK_NAMESPACE, ALL_TREES]
+            for key in first:
+                params += [TREE_LOCK_NAMESPACE, key]
+            cursor.execute(sql, params)
+            for key in keys[1:]:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [TREE_LOCK_NAMESPACE, key])
+        lock_stats.record(time.perf_counter() - started)
+        yield
+
+
+@contextmanager
+def all_trees_lock():
+    """
+    Открывает транзакцию и блокирует структуру всех деревьев до ее завершения:
+    ждет транзакции, которые держат блокировки деревьев, и не дает взять новые.
+    """
+    with transaction.atomic():
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [TREE_LOCK_NAMESPACE, ALL_TREES])
+        lock_stats.record(time.perf_counter() - started)
+        yield
+
+
+def tree_metrics() -> Dict[str, float]:
+    """
+    Метрики координатора: очередь ожидающих блокировки дерева сеансов
+    и время ожидания блокировок в текущем процессе.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+        SELECT COUNT(*) FROM pg_locks WHERE locktype = 'advisory' AND classid = %s AND NOT granted""",
+                       [TREE_LOCK_NAMESPACE])
+        lock_waiters, = cursor.fetchone()
+    return {
+        'lock_waiters': lock_waiters,
+        'lock_waits': lock_stats.waits,
+        'lock_wait_seconds_total': lock_stats.wait_seconds,
+        'lock_wait_seconds_max': lock_stats.max_wait_seconds,
+    }
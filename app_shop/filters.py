@@ -0,0 +1,78 @@
+"""
+Фильтры списков API.
+
+Точные фильтры и фильтры диапазонов звеньев и продуктов поддержаны составными индексами
+(см. Meta.indexes моделей), чтобы выборка по ним не читала всю таблицу. Сочетания фильтров
+без своего составного индекса (например, type_supplier и city) объединяют индексы отдельных
+фильтров через BitmapAnd.
+Поиск звеньев - по полнотекстовому индексу, см. app_shop.search.
+"""
+from django.contrib.postgres.search import SearchRank
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django_filters import rest_framework as django_filters
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from app_shop.models import Product, Supplier
+from app_shop.search import prefix_query, search_vector
+
+
+class SupplierSearchFilter(filters.BaseFilterBackend):
+    """
+    Поиск звеньев по параметру search с сортировкой по релевантности (аннотация rank).
+    Явная сортировка параметром ordering заменяет сортировку по релевантности.
+    Ранг приводится к double precision: значение real драйвер возвращает округленным,
+    и курсор страницы с таким значением пропускал бы звенья с равным рангом.
+    """
+
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = prefix_query(request.query_params.get(self.search_param, ''))
+        if query is None:
+            return queryset
+        return (queryset
+                .annotate(search=search_vector(), rank=Cast(SearchRank(search_vector(), query), FloatField()))
+                .filter(search=query)
+                .order_by('-rank'))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по префиксам слов названия, страны, города, улицы и email',
+            'schema': {'type': 'string'},
+        }]
+
+
+class SupplierFilter(django_filters.FilterSet):
+    """
+    Фильтры списка звеньев: тип, страна, город, родитель, цепочка (tree_id) и диапазон долга
+    (debt__gte, debt__lte).
+    """
+
+    class Meta:
+        model = Supplier
+        fields = {
+            'type_supplier': ['exact'],
+            'country': ['exact'],
+            'city': ['exact'],
+            'parent': ['exact'],
+            'tree_id': ['exact'],
+            'debt': ['gte', 'lte'],
+        }
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Фильтры списка продуктов: поставщик и диапазон даты выхода (release_date__gte, release_date__lte).
+    """
+
+    class Meta:
+        model = Product
+        fields = {
+            'supplier': ['exact'],
+            'release_date': ['gte', 'lte'],
+        }
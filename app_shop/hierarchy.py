@@ -0,0 +1,233 @@
+"""
+Стратегии хранения иерархии звеньев сети.
+
+Nested set (django-mptt) остается основным хранилищем: на lft/rght/tree_id
+опираются админка, сортировка и API. Таблица замыкания и материализованный путь
+ведутся дополнительно, если выбраны в настройке SUPPLIER_HIERARCHY, и отвечают
+на запросы get_children, get_descendants, get_ancestors и get_level.
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+from mptt.models import MPTTModel
+
+HIERARCHY_BACKENDS = {
+    'nested_set': 'app_shop.hierarchy.NestedSetHierarchy',
+    'closure': 'app_shop.hierarchy.ClosureTableHierarchy',
+    'path': 'app_shop.hierarchy.MaterializedPathHierarchy',
+}
+
+
+def get_hierarchy(name: str = None) -> 'NestedSetHierarchy':
+    """
+    Возвращает стратегию хранения иерархии по имени или из настройки SUPPLIER_HIERARCHY.
+    """
+    name = name or getattr(settings, 'SUPPLIER_HIERARCHY', 'nested_set')
+    return import_string(HIERARCHY_BACKENDS[name])()
+
+
+class NestedSetHierarchy:
+    """
+    Иерархия на интервалах lft/rght, которые ведет django-mptt.
+    Дополнительного обслуживания не требует.
+    """
+
+    name = 'nested_set'
+
+    def get_children(self, node):
+        return MPTTModel.get_children(node)
+
+    def get_descendants(self, node, include_self=False):
+        return MPTTModel.get_descendants(node, include_self=include_self)
+
+    def get_ancestors(self, node, ascending=False, include_self=False):
+        return MPTTModel.get_ancestors(node, ascending=ascending, include_self=include_self)
+
+    def get_level(self, node) -> int:
+        return MPTTModel.get_level(node)
+
+    def node_inserted(self, node) -> None:
+        """Звено вставлено в дерево."""
+
+    def node_moved(self, node) -> None:
+        """Звено вместе с поддеревом перенесено к новому родителю."""
+
+    def children_lifted(self, node) -> None:
+        """Дети звена переназначены на его родителя перед удалением звена."""
+
+    def nodes_inserted(self, pks) -> None:
+        """Звенья pks вставлены одним набором (массовая загрузка), их потомки - только среди них."""
+
+    def rebuild(self) -> None:
+        """Заполняет хранилище по связям parent."""
+
+    @staticmethod
+    def _execute(sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class ClosureTableHierarchy(NestedSetHierarchy):
+    """
+    Таблица замыкания: для каждого звена хранятся все его предки с расстоянием.
+
+    Вставка стоит O(глубина), перенос - O(размер поддерева * глубина),
+    чтение поддерева и предков - один индексный поиск.
+    """
+
+    name = 'closure'
+    table = 'supplier_closure'
+
+    def get_children(self, node):
+        return type(node)._default_manager.filter(ancestor_links__ancestor=node, ancestor_links__depth=1)
+
+    def get_descendants(self, node, include_self=False):
+        min_depth = 0 if include_self else 1
+        return type(node)._default_manager.filter(ancestor_links__ancestor=node,
+                                                  ancestor_links__depth__gte=min_depth)
+
+    def get_ancestors(self, node, ascending=False, include_self=False):
+        min_depth = 0 if include_self else 1
+        queryset = type(node)._default_manager.filter(descendant_links__descendant=node,
+                                                      descendant_links__depth__gte=min_depth)
+        return queryset.order_by('descendant_links__depth' if ascending else '-descendant_links__depth')
+
+    def get_level(self, node) -> int:
+        return node.ancestor_links.count() - 1
+
+    def node_inserted(self, node) -> None:
+        self._execute(f"""
+        INSERT INTO {self.table} (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, %s, depth + 1 FROM {self.table} WHERE descendant_id = %s
+        UNION ALL
+        SELECT %s, %s, 0""", [node.pk, node.parent_id, node.pk, node.pk])
+
+    def node_moved(self, node) -> None:
+        self._execute(f"""
+        DELETE FROM {self.table}
+        WHERE descendant_id IN (SELECT descendant_id FROM {self.table} WHERE ancestor_id = %s)
+          AND ancestor_id NOT IN (SELECT descendant_id FROM {self.table} WHERE ancestor_id = %s)""",
+                      [node.pk, node.pk])
+        if node.parent_id:
+            self._execute(f"""
+            INSERT INTO {self.table} (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM {self.table} AS above, {self.table} AS below
+            WHERE above.descendant_id = %s AND below.ancestor_id = %s""", [node.parent_id, node.pk])
+
+    def children_lifted(self, node) -> None:
+        self._execute(f"""
+        UPDATE {self.table} SET depth = depth - 1
+        WHERE descendant_id IN (SELECT descendant_id FROM {self.table} WHERE ancestor_id = %s AND depth > 0)
+          AND ancestor_id IN (SELECT ancestor_id FROM {self.table} WHERE descendant_id = %s AND depth > 0)""",
+                      [node.pk, node.pk])
+        self._execute(f"DELETE FROM {self.table} WHERE ancestor_id = %s AND depth > 0", [node.pk])
+
+    def nodes_inserted(self, pks) -> None:
+        self._execute(f"""
+        INSERT INTO {self.table} (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE links (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM suppliers WHERE id = ANY(%s)
+            UNION ALL
+            SELECT suppliers.parent_id, links.descendant_id, links.depth + 1
+            FROM links JOIN suppliers ON suppliers.id = links.ancestor_id
+            WHERE suppliers.parent_id IS NOT NULL
+        )
+        SELECT ancestor_id, descendant_id, depth FROM links""", [list(pks)])
+
+    def rebuild(self) -> None:
+        self._execute(f"DELETE FROM {self.table}")
+        self._execute(f"""
+        INSERT INTO {self.table} (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE links (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM suppliers
+            UNION ALL
+            SELECT links.ancestor_id, suppliers.id, links.depth + 1
+            FROM links JOIN suppliers ON suppliers.parent_id = links.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM links""")
+
+
+class MaterializedPathHierarchy(NestedSetHierarchy):
+    """
+    Материализованный путь: у каждого звена хранится строка id предков '1/5/9/'.
+
+    Вставка стоит O(1), перенос - один UPDATE поддерева по префиксу пути,
+    чтение поддерева - поиск по префиксу в индексе varchar_pattern_ops.
+    """
+
+    name = 'path'
+    table = 'supplier_paths'
+
+    def _path(self, node) -> str:
+        return node.hierarchy_path.path
+
+    def get_children(self, node):
+        return type(node)._default_manager.filter(parent=node)
+
+    def get_descendants(self, node, include_self=False):
+        queryset = type(node)._default_manager.filter(hierarchy_path__path__startswith=self._path(node))
+        return queryset if include_self else queryset.exclude(pk=node.pk)
+
+    def get_ancestors(self, node, ascending=False, include_self=False):
+        ids = [int(pk) for pk in self._path(node).split('/') if pk]
+        if not include_self:
+            ids.pop()
+        queryset = type(node)._default_manager.filter(pk__in=ids)
+        return queryset.order_by('-hierarchy_path__depth' if ascending else 'hierarchy_path__depth')
+
+    def get_level(self, node) -> int:
+        return node.hierarchy_path.depth
+
+    def node_inserted(self, node) -> None:
+        self._execute(f"""
+        INSERT INTO {self.table} (supplier_id, path, depth)
+        SELECT %s,
+               COALESCE((SELECT path FROM {self.table} WHERE supplier_id = %s), '') || %s || '/',
+               COALESCE((SELECT depth + 1 FROM {self.table} WHERE supplier_id = %s), 0)""",
+                      [node.pk, node.parent_id, str(node.pk), node.parent_id])
+
+    def node_moved(self, node) -> None:
+        self._execute(f"""
+        UPDATE {self.table} AS moved
+        SET path = target.path || substr(moved.path, length(source.path) + 1),
+            depth = moved.depth - source.depth + target.depth
+        FROM (SELECT path, depth FROM {self.table} WHERE supplier_id = %s) AS source,
+             (SELECT COALESCE((SELECT path FROM {self.table} WHERE supplier_id = %s), '') || %s || '/' AS path,
+                     COALESCE((SELECT depth + 1 FROM {self.table} WHERE supplier_id = %s), 0) AS depth) AS target
+        WHERE moved.path LIKE source.path || '%%'""",
+                      [node.pk, node.parent_id, str(node.pk), node.parent_id])
+
+    def children_lifted(self, node) -> None:
+        self._execute(f"""
+        UPDATE {self.table} AS lifted
+        SET path = substr(source.path, 1, length(source.path) - length(%s) - 1)
+                   || substr(lifted.path, length(source.path) + 1),
+            depth = lifted.depth - 1
+        FROM (SELECT path FROM {self.table} WHERE supplier_id = %s) AS source
+        WHERE lifted.path LIKE source.path || '_%%'""", [str(node.pk), node.pk])
+
+    def nodes_inserted(self, pks) -> None:
+        self._execute(f"""
+        INSERT INTO {self.table} (supplier_id, path, depth)
+        WITH RECURSIVE paths (id, path, depth) AS (
+            SELECT node.id, COALESCE(parent.path, '') || node.id::text || '/', COALESCE(parent.depth + 1, 0)
+            FROM suppliers AS node LEFT JOIN {self.table} AS parent ON parent.supplier_id = node.parent_id
+            WHERE node.id = ANY(%s) AND (node.parent_id = ANY(%s)) IS NOT TRUE
+            UNION ALL
+            SELECT suppliers.id, paths.path || suppliers.id::text || '/', paths.depth + 1
+            FROM paths JOIN suppliers ON suppliers.parent_id = paths.id
+        )
+        SELECT id, path, depth FROM paths""", [list(pks), list(pks)])
+
+    def rebuild(self) -> None:
+        self._execute(f"DELETE FROM {self.table}")
+        self._execute(f"""
+        INSERT INTO {self.table} (supplier_id, path, depth)
+        WITH RECURSIVE paths (id, path, depth) AS (
+            SELECT id, id::text || '/', 0 FROM suppliers WHERE parent_id IS NULL
+            UNION ALL
+            SELECT suppliers.id, paths.path || suppliers.id::text || '/', paths.depth + 1
+            FROM paths JOIN suppliers ON suppliers.parent_id = paths.id
+        )
+        SELECT id, path, depth FROM paths""")
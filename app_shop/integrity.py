@@ -0,0 +1,199 @@
+"""
+Проверка и точечное восстановление nested set звеньев сети.
+
+Проверка читает таблицу потоком в порядке (tree_id, lft) и держит в памяти
+только стек открытых интервалов текущего дерева, поэтому работает за O(n)
+при памяти O(глубина). Восстанавливаются только поврежденные деревья:
+интервалы каждого из них заново вычисляются по связям parent.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from app_shop.coordinator import tree_lock
+from app_shop.models import Supplier
+
+TREE_FIELDS = ('id', 'parent_id', 'tree_id', 'lft', 'rght', 'level')
+
+SUBTREE_SQL = """
+WITH RECURSIVE subtree AS (
+    SELECT id, parent_id, tree_id, lft, rght, level FROM suppliers WHERE id = %s
+    UNION ALL
+    SELECT suppliers.id, suppliers.parent_id, suppliers.tree_id, suppliers.lft, suppliers.rght, suppliers.level
+    FROM suppliers JOIN subtree ON suppliers.parent_id = subtree.id
+)
+SELECT id, parent_id, tree_id, lft, rght, level FROM subtree
+"""
+
+LOCK_TREE_SQL = """
+SELECT id FROM suppliers WHERE tree_id = (SELECT tree_id FROM suppliers WHERE id = %s) FOR UPDATE
+"""
+
+CROSS_TREE_PARENTS_SQL = """
+SELECT DISTINCT parent.tree_id
+FROM suppliers AS child JOIN suppliers AS parent ON parent.id = child.parent_id
+WHERE child.tree_id = ANY(%s) AND parent.tree_id <> child.tree_id
+"""
+
+
+@dataclass
+class CheckResult:
+    """
+    Итог проверки: количество звеньев и деревьев, tree_id поврежденных деревьев.
+    """
+
+    nodes: int = 0
+    trees: int = 0
+    broken: Set[int] = field(default_factory=set)
+
+
+def check_trees(rows: Iterable[Tuple[int, int, int, int, int, int]], dense: bool = True) -> CheckResult:
+    """
+    Проверяет интервалы по строкам (id, parent_id, tree_id, lft, rght, level),
+    упорядоченным по (tree_id, lft).
+
+    Для каждого звена ожидаемый родитель - ближайший открытый интервал стека.
+    Дерево считается поврежденным, если parent_id или level не совпадают с интервалами,
+    интервалы пересекаются, у дерева несколько корней или, при плотной нумерации,
+    границы корня не равны 1 и 2 * количество звеньев.
+    """
+    result = CheckResult()
+    tree_id = None
+    stack: List[Tuple[int, int]] = []
+    root = None
+    size = last_left = 0
+
+    def tree_is_valid() -> bool:
+        return not dense or root == (1, 2 * size)
+
+    for pk, parent_id, node_tree_id, left, right, level in rows:
+        result.nodes += 1
+        if node_tree_id != tree_id:
+            if tree_id is not None and not tree_is_valid():
+                result.broken.add(tree_id)
+            tree_id, stack, root, size, last_left = node_tree_id, [], None, 0, 0
+            result.trees += 1
+        if tree_id in result.broken:
+            continue
+
+        size += 1
+        while stack and stack[-1][1] < left:
+            stack.pop()
+        expected_parent, parent_right = stack[-1] if stack else (None, None)
+        nested = right < parent_right if stack else root is None
+        if not nested or left >= right or left <= last_left or (parent_id, level) != (expected_parent, len(stack)):
+            result.broken.add(tree_id)
+            continue
+        if root is None:
+            root = (left, right)
+        stack.append((pk, right))
+        last_left = left
+
+    if tree_id is not None and tree_id not in result.broken and not tree_is_valid():
+        result.broken.add(tree_id)
+    return result
+
+
+def check_table(chunk_size: int = 5000) -> CheckResult:
+    """
+    Проверяет всю таблицу suppliers, читая ее через серверный курсор.
+
+    Деревья, в которые ведут связи parent из поврежденных деревьев,
+    тоже считаются поврежденными: их нужно перестроить вместе.
+    """
+    rows = Supplier.all_objects.order_by('tree_id', 'lft').values_list(*TREE_FIELDS).iterator(chunk_size=chunk_size)
+    result = check_trees(rows, dense=not Supplier.objects.gap)
+
+    pending = set(result.broken)
+    with connection.cursor() as cursor:
+        while pending:
+            cursor.execute(CROSS_TREE_PARENTS_SQL, [list(pending)])
+            pending = {tree_id for tree_id, in cursor.fetchall()} - result.broken
+            result.broken |= pending
+    return result
+
+
+def plan_rebuild(broken: Set[int]) -> List[Tuple[int, Optional[int]]]:
+    """
+    Возвращает пары (id корня, tree_id) для перестроения поврежденных деревьев.
+    Если у дерева несколько корней, лишние получают tree_id None: новый tree_id
+    выделяет rebuild_tree под блокировкой создания нового дерева.
+    """
+    roots = Supplier.all_objects.filter(tree_id__in=broken, parent=None).order_by('tree_id', 'lft', 'id')
+    jobs, seen = [], set()
+    for pk, tree_id in roots.values_list('id', 'tree_id'):
+        jobs.append((pk, None if tree_id in seen else tree_id))
+        seen.add(tree_id)
+    return jobs
+
+
+def rebuild_trees(jobs: List[Tuple[int, Optional[int]]]) -> int:
+    """
+    Перестраивает деревья из jobs по связям parent и возвращает количество измененных строк.
+    Вызывается в отдельных процессах пула, каждое дерево - в своей транзакции.
+    """
+    return sum(rebuild_tree(root_id, tree_id) for root_id, tree_id in jobs)
+
+
+def children_map(nodes: Iterable[tuple]) -> Dict[int, List[tuple]]:
+    """
+    Группирует строки (id, parent_id, tree_id, lft, ...) по родителю в прежнем порядке (tree_id, lft).
+    """
+    children: Dict[int, List[tuple]] = {}
+    for node in sorted(nodes, key=lambda node: (node[2], node[3], node[0])):
+        children.setdefault(node[1], []).append(node)
+    return children
+
+
+def number_subtree(children: Dict[int, List[tuple]], root: tuple, step: int = 1) -> Iterator[Tuple[int, ...]]:
+    """
+    Вычисляет (id, lft, rght, level) поддерева root по связям parent.
+
+    При step > 1 границы расставляются с этим шагом, как при разреженной нумерации,
+    листья получают интервал ширины 1.
+    """
+    bound = 1 - step
+    stack = [(root, 0, False)]
+    opened = {}
+    while stack:
+        node, level, closing = stack.pop()
+        pk = node[0]
+        if not closing:
+            bound += step
+            opened[pk] = bound
+            stack.append((node, level, True))
+            stack.extend((child, level + 1, False) for child in reversed(children.get(pk, [])))
+            continue
+        bound += 1 if not children.get(pk) else step
+        yield pk, opened.pop(pk), bound, level
+
+
+def rebuild_tree(root_id: int, tree_id: Optional[int]) -> int:
+    """
+    Заново вычисляет lft/rght/level/tree_id поддерева root_id по связям parent.
+    Записываются только строки, значения которых изменились.
+
+    При tree_id None поддерево переносится в новое дерево: номер выделяется и записывается
+    под блокировкой NEW_TREE, поэтому одновременно созданный корень не получит тот же tree_id.
+    """
+    step = getattr(settings, 'SUPPLIER_NESTED_SET_GAP', 0) or 1
+    current_tree_id = Supplier.all_objects.filter(pk=root_id).values_list('tree_id', flat=True).first()
+    with tree_lock([current_tree_id, tree_id]):
+        if tree_id is None:
+            tree_id = Supplier.all_objects._get_next_tree_id()
+        with connection.cursor() as cursor:
+            cursor.execute(LOCK_TREE_SQL, [root_id])
+            cursor.execute(SUBTREE_SQL, [root_id])
+            nodes = cursor.fetchall()
+
+        current = {node[0]: (node[2], node[3], node[4], node[5]) for node in nodes}
+        root = next(node for node in nodes if node[0] == root_id)
+        changed = [
+            Supplier(id=pk, tree_id=tree_id, lft=left, rght=right, level=level)
+            for pk, left, right, level in number_subtree(children_map(nodes), root, step)
+            if current[pk] != (tree_id, left, right, level)
+        ]
+        Supplier.objects.bulk_update(changed, ['tree_id', 'lft', 'rght', 'level'], batch_size=1000)
+    return len(changed)
@@ -0,0 +1,190 @@
+import random
+from contextlib import nullcontext
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.test.utils import override_settings
+
+from app_shop.benchmark import build_forest, build_tree, make_supplier, measure
+from app_shop.search import SEARCH_FIELDS, prefix_query, search_vector
+from app_shop.hierarchy import HIERARCHY_BACKENDS, get_hierarchy
+from app_shop.models import Supplier
+
+
+class Command(BaseCommand):
+    """
+    Замеряет стоимость операций над деревом поставщиков на сетях разного размера
+    и формы: много деревьев по 1 + fanout + fanout^2 звеньев (forest)
+    или одно большое дерево (tree), глубокое при малом fanout.
+
+    Каждый прогон выполняется в транзакции, которая откатывается в конце,
+    поэтому данные в базе не изменяются.
+    """
+
+    help = 'Замеряет стоимость операций над деревом поставщиков'
+
+    SCENARIOS = ('delete', 'rebuild', 'hierarchy', 'roots', 'gaps', 'search')
+
+    SHAPES = ('forest', 'tree')
+
+    DEFAULT_SIZES = [1000, 10000]
+
+    # Сравнение стратегий хранения иерархии - на размерах, где разница в сдвигах строк заметна.
+    SCENARIO_SIZES = {'hierarchy': [10000, 100000, 1000000]}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            help='Размеры сети (количество звеньев), по умолчанию '
+                                 f'{self.DEFAULT_SIZES}, для hierarchy - {self.SCENARIO_SIZES["hierarchy"]}')
+        parser.add_argument('--fanout', type=int, default=10, help='Количество детей у каждого звена')
+        parser.add_argument('--shape', nargs='+', choices=self.SHAPES, default=['forest'],
+                            help='Форма сети: много небольших деревьев или одно большое дерево')
+        parser.add_argument('--scenario', nargs='+', choices=self.SCENARIOS, default=['delete', 'rebuild'])
+
+    def handle(self, *args, **options):
+        for scenario in options['scenario']:
+            for size in options['sizes'] or self.SCENARIO_SIZES.get(scenario, self.DEFAULT_SIZES):
+                self.size = size
+                for shape in options['shape']:
+                    with transaction.atomic():
+                        if shape == 'tree':
+                            roots = [build_tree(size, options['fanout'])]
+                        else:
+                            roots = build_forest(size, options['fanout'])
+                        results = getattr(self, f'run_{scenario}')(roots)
+                        transaction.set_rollback(True)
+                    for label, result in results:
+                        self.stdout.write(
+                            f'{label:<22} shape={shape:<6} size={size:<8} queries={result.queries:<6} '
+                            f'rows={result.rows:<8} time={result.seconds * 1000:.1f}ms'
+                        )
+
+    @staticmethod
+    def run_delete(roots):
+        """
+        Удаление дистрибьютора с переназначением его детей, как в API.
+        """
+        node = roots[0].get_children()[0]
+        with measure() as result:
+            Supplier.objects.reparent_children(node)
+            Supplier.objects.delete_node(node)
+        return [('delete', result)]
+
+    @staticmethod
+    def run_rebuild(roots):
+        """
+        Полная перестройка таблицы, которая раньше выполнялась после каждого удаления.
+        """
+        with measure() as result:
+            Supplier.objects.rebuild()
+        return [('rebuild', result)]
+
+    def run_roots(self, roots):
+        """
+        Вставка заводов-корней в случайном порядке названий, в обычном режиме
+        и с алфавитной вставкой mptt. Ни в одном режиме tree_id существующих деревьев
+        не сдвигаются, поэтому число измененных строк равно числу вставок.
+        """
+        names = random.sample(range(self.size), self.size)
+        results = []
+        for label, order_insertion_by in (('roots', []), ('roots:sorted', ['name'])):
+            sid = transaction.savepoint()
+            with mock.patch.object(Supplier._mptt_meta, 'order_insertion_by', order_insertion_by):
+                with measure() as result:
+                    for index in names:
+                        make_supplier(index, 'factory', name=f'root-{index:08d}').save()
+            results.append((label, result))
+            transaction.savepoint_rollback(sid)
+        return results
+
+    @staticmethod
+    def run_gaps(roots):
+        """
+        Вставка листьев в начало дерева при плотной и разреженной нумерации lft/rght.
+        """
+        results = []
+        for label, gap in (('gaps:dense', 0), ('gaps:sparse', 64)):
+            sid = transaction.savepoint()
+            with override_settings(SUPPLIER_NESTED_SET_GAP=gap):
+                Supplier.objects.rebuild()
+                parents = list(roots[0].get_children())
+                with measure() as result:
+                    for index, parent in enumerate(parents * 10):
+                        make_supplier(index, 'entrepreneur', name=f'gap-{index:08d}', parent=parent).save()
+            results.append((label, result))
+            transaction.savepoint_rollback(sid)
+        return results
+
+    def run_search(self, roots):
+        """
+        Поиск звена по email: сравнение ILIKE '%...%' по полям поиска и полнотекстового индекса.
+        """
+        text = f'bench-{self.size // 2}@example.com'
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE suppliers')
+        condition = models.Q()
+        for field in SEARCH_FIELDS:
+            condition |= models.Q(**{f'{field}__icontains': text})
+        with measure() as scan:
+            list(Supplier.objects.filter(condition))
+        with measure() as indexed:
+            list(Supplier.objects.annotate(search=search_vector()).filter(search=prefix_query(text)))
+        return [('search:icontains', scan), ('search:fulltext', indexed)]
+
+    def run_hierarchy(self, roots):
+        """
+        Сравнение стратегий хранения иерархии: вставка, перенос, удаление и чтение поддерева.
+
+        Для таблицы замыкания и материализованного пути обновления nested set отключены,
+        поэтому замеряется только стоимость обслуживания самой стратегии.
+        """
+        results = []
+        for name in HIERARCHY_BACKENDS:
+            sid = transaction.savepoint()
+            with override_settings(SUPPLIER_HIERARCHY=name):
+                results += [(f'{name}:{label}', result) for label, result in self._run_hierarchy_operations(roots)]
+            transaction.savepoint_rollback(sid)
+        return results
+
+    @staticmethod
+    def _run_hierarchy_operations(roots):
+        hierarchy = get_hierarchy()
+        hierarchy.rebuild()
+        nested_set = hierarchy.name == 'nested_set'
+        if len(roots) > 1:
+            parent, moved, deleted = (root.get_children()[0] for root in roots[:3])
+            target = roots[-1]
+        else:
+            # Звенья одного уровня не предки друг друга: звено переносится в соседнее поддерево.
+            level = 1
+            while Supplier.objects.filter(tree_id=roots[0].tree_id, level=level).count() < 4:
+                level += 1
+            parent, moved, deleted, target = Supplier.objects.filter(
+                tree_id=roots[0].tree_id, level=level).order_by('lft')[:4]
+
+        with nullcontext() if nested_set else Supplier.objects.disable_mptt_updates():
+            with measure() as insert:
+                Supplier.objects.create(type_supplier='entrepreneur', name='bench-insert', email='insert@example.com',
+                                        country='Россия', city='Москва', street='Ленина', house_number='1',
+                                        debt=0, parent=parent)
+
+            with measure() as move:
+                moved.parent = target
+                moved.save()
+                if not nested_set:
+                    hierarchy.node_moved(moved)
+
+            with measure() as delete:
+                if nested_set:
+                    Supplier.objects.reparent_children(deleted)
+                    Supplier.objects.delete_node(deleted)
+                else:
+                    hierarchy.children_lifted(deleted)
+                    Supplier.objects.filter(parent=deleted).update(parent=deleted.parent_id)
+                    models.Model.delete(deleted)
+
+        with measure() as read:
+            list(hierarchy.get_descendants(target))
+
+        return [('insert', insert), ('move', move), ('delete', delete), ('subtree', read)]
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_shop.integrity import TREE_FIELDS, check_table, check_trees, plan_rebuild, rebuild_trees
+from app_shop.models import Supplier
+
+
+class Command(BaseCommand):
+    """
+    Проверяет интервалы nested set всех деревьев по связям parent
+    и перестраивает только поврежденные деревья в пуле процессов.
+    """
+
+    help = 'Проверяет nested set звеньев сети и перестраивает поврежденные деревья'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить, ничего не изменяя')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Количество процессов для перестроения; 1 - в текущем процессе')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Размер порции при чтении таблицы')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = check_table(options['chunk_size'])
+        self.stdout.write(
+            f'Проверено звеньев: {result.nodes}, деревьев: {result.trees}, '
+            f'повреждено деревьев: {len(result.broken)} за {time.perf_counter() - started:.2f} с'
+        )
+        if not result.broken or options['dry_run']:
+            return
+
+        started = time.perf_counter()
+        jobs = plan_rebuild(result.broken)
+        workers = max(1, min(options['workers'], len(jobs)))
+        if workers == 1:
+            changed = rebuild_trees(jobs)
+        else:
+            connections.close_all()
+            chunks = [jobs[index::workers] for index in range(workers)]
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                changed = sum(executor.map(rebuild_trees, chunks))
+        self.stdout.write(
+            f'Перестроено деревьев: {len(jobs)}, изменено строк: {changed} '
+            f'за {time.perf_counter() - started:.2f} с, процессов: {workers}'
+        )
+
+        roots = Supplier.all_objects.filter(pk__in=[root_id for root_id, _tree_id in jobs])
+        tree_ids = result.broken | set(roots.values_list('tree_id', flat=True))
+        rows = Supplier.all_objects.filter(tree_id__in=tree_ids).order_by('tree_id', 'lft').values_list(*TREE_FIELDS)
+        still_broken = check_trees(rows.iterator(), dense=not Supplier.objects.gap).broken
+        if still_broken:
+            self.stderr.write(f'Не удалось восстановить деревья (циклы в связях parent?): {sorted(still_broken)}')
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_shop.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    """
+    Очищает звенья, помеченные удаленными: удаляет их продукты порциями, переназначает детей
+    и удаляет строки. После сбоя достаточно запустить команду снова.
+    """
+
+    help = 'Фоновая очистка звеньев сети, помеченных удаленными'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Сколько звеньев очищать за порцию')
+        parser.add_argument('--product-batch-size', type=int, default=10000,
+                            help='Сколько продуктов удалять одной транзакцией')
+        parser.add_argument('--limit', type=int, default=None, help='Максимум звеньев за запуск')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Работать постоянно, проверяя новые пометки через указанное число секунд')
+
+    def handle(self, *args, **options):
+        while True:
+            result = purge_deleted(options['batch_size'], options['product_batch_size'], options['limit'],
+                                   progress=self.report)
+            if result.processed:
+                self.stdout.write(
+                    f'Очищено звеньев: {result.purged}, восстановлено: {result.restored}, '
+                    f'удалено продуктов: {result.products} за {result.seconds:.2f} с'
+                )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def report(self, progress):
+        self.stdout.write(f'Обработано звеньев {progress.processed} из {progress.total}, '
+                          f'удалено продуктов: {progress.products}, {progress.seconds:.1f} с')
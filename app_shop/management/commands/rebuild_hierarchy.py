@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_shop.hierarchy import get_hierarchy
+
+
+class Command(BaseCommand):
+    """
+    Заполняет выбранное в SUPPLIER_HIERARCHY хранилище иерархии по связям parent.
+    Нужна после переключения стратегии на уже заполненной базе.
+    """
+
+    help = 'Заполняет хранилище иерархии звеньев по связям parent'
+
+    def handle(self, *args, **options):
+        hierarchy = get_hierarchy()
+        with transaction.atomic():
+            hierarchy.rebuild()
+        self.stdout.write(f'Хранилище иерархии {hierarchy.name} заполнено')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_shop.benchmark import measure
+from app_shop.models import Supplier
+from app_shop.online_rebuild import OnlineRebuild
+
+
+class Command(BaseCommand):
+    """
+    Перестраивает nested set всех звеньев сети по связям parent.
+
+    По умолчанию работает онлайн: значения вычисляются в теневой таблице,
+    а таблица звеньев блокируется от записи только на время финального переноса.
+    """
+
+    help = 'Перестраивает nested set звеньев сети без долгой блокировки записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offline', action='store_true',
+                            help='Полная перестройка Supplier.objects.rebuild() в одной транзакции')
+        parser.add_argument('--max-passes', type=int, default=5, help='Максимум проходов догоняющего пересчета')
+        parser.add_argument('--swap-threshold', type=int, default=100,
+                            help='Сколько деревьев можно пересчитать под блокировкой при переносе')
+        parser.add_argument('--lock-timeout', default='5s', help='Ожидание блокировки таблицы при переносе')
+
+    def handle(self, *args, **options):
+        if options['offline']:
+            with measure() as result, transaction.atomic():
+                Supplier.objects.rebuild()
+            self.stdout.write(f'Перестроено за {result.seconds:.2f} с, изменено строк: {result.rows}')
+            return
+
+        result = OnlineRebuild(options['max_passes'], options['swap_threshold'], options['lock_timeout']).run()
+        self.stdout.write(
+            f'Перестроено звеньев: {result.nodes}, изменено строк: {result.rows}, '
+            f'проходов догоняющего пересчета: {result.passes}, '
+            f'всего {result.seconds:.2f} с, из них под блокировкой {result.lock_seconds:.3f} с'
+        )
@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app_shop.coordinator import tree_metrics
+
+
+class Command(BaseCommand):
+    """
+    Выводит метрики координатора деревьев в JSON: количество сеансов, ожидающих
+    блокировки дерева, и время ожидания блокировок.
+    """
+
+    help = 'Выводит метрики координатора деревьев звеньев'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(tree_metrics(), ensure_ascii=False))
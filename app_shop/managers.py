@@ -0,0 +1,643 @@
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from django.conf import settings
+from django.db.models import Exists, Max, OuterRef, Q, QuerySet, Subquery
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from mptt.exceptions import InvalidMove
+from mptt.managers import TreeManager
+from mptt.querysets import TreeQuerySet
+from mptt.signals import node_moved
+
+from app_shop.coordinator import tree_lock
+from app_shop.hierarchy import get_hierarchy
+
+if TYPE_CHECKING:
+    from app_shop.models import Supplier
+
+
+REBUILD_SORT_PATHS_SQL = """
+WITH RECURSIVE paths (id, sort_path) AS (
+    SELECT id, ARRAY[name, lpad(id::text, 19, '0')]::varchar[]
+    FROM suppliers WHERE parent_id IS NULL
+    UNION ALL
+    SELECT suppliers.id, paths.sort_path || ARRAY[suppliers.name, lpad(suppliers.id::text, 19, '0')]::varchar[]
+    FROM paths JOIN suppliers ON suppliers.parent_id = paths.id
+)
+UPDATE suppliers SET sort_path = paths.sort_path FROM paths WHERE suppliers.id = paths.id
+"""
+
+RESPACE_SQL = """
+WITH bounds AS (
+    SELECT {id} AS id, {tree_id} AS tree_id, {left} AS bound, FALSE AS is_right FROM {table} WHERE {scope}
+    UNION ALL
+    SELECT {id}, {tree_id}, {right}, TRUE FROM {table} WHERE {scope}
+), steps AS (
+    SELECT id, tree_id, bound,
+           CASE WHEN is_right AND LAG(id) OVER tree_order = id AND id IS DISTINCT FROM %s THEN 1 ELSE %s END AS step
+    FROM bounds
+    WINDOW tree_order AS (PARTITION BY tree_id ORDER BY bound)
+), spaced AS (
+    SELECT id, MIN(bound) OVER (PARTITION BY tree_id)
+               + SUM(step) OVER (PARTITION BY tree_id ORDER BY bound) - FIRST_VALUE(step) OVER (
+                   PARTITION BY tree_id ORDER BY bound) AS bound
+    FROM steps
+)
+UPDATE {table} SET {left} = respaced.new_left, {right} = respaced.new_right
+FROM (SELECT id, MIN(bound) AS new_left, MAX(bound) AS new_right FROM spaced GROUP BY id) AS respaced
+WHERE {table}.{id} = respaced.id
+"""
+
+# Звенья, помеченные удаленными, не входят в задолженность и количество потомков,
+# но пока остаются в дереве, учитываются в глубине поддерева.
+REBUILD_ROLLUPS_SQL = """
+UPDATE suppliers AS node
+SET subtree_debt = rollup.debt, descendant_count = rollup.descendants, subtree_depth = rollup.depth
+FROM (
+    SELECT ancestor.id,
+           COALESCE(SUM(descendant.debt) FILTER (WHERE descendant.deleted_at IS NULL), 0) AS debt,
+           COUNT(*) FILTER (WHERE descendant.deleted_at IS NULL AND descendant.id <> ancestor.id) AS descendants,
+           MAX(descendant.level) - ancestor.level AS depth
+    FROM suppliers AS ancestor
+    JOIN suppliers AS descendant
+      ON descendant.tree_id = ancestor.tree_id AND descendant.lft BETWEEN ancestor.lft AND ancestor.rght
+    WHERE {scope}
+    GROUP BY ancestor.id
+) AS rollup
+WHERE node.id = rollup.id
+  AND (node.subtree_debt, node.descendant_count, node.subtree_depth)
+      IS DISTINCT FROM (rollup.debt, rollup.descendants, rollup.depth)
+"""
+
+
+class SupplierQuerySet(TreeQuerySet):
+    """
+    Набор звеньев сети с групповыми проверками.
+    """
+
+    def deletion_blockers(self, include_deleted: bool = False) -> Dict[int, 'Supplier']:
+        """
+        Возвращает звенья набора, которые нельзя удалить, вместе с должником,
+        блокирующим удаление: само звено с долгом или первый ребенок с долгом.
+        При include_deleted должниками считаются и звенья, помеченные удаленными (очистка).
+
+        Выполняется одним запросом для любого количества звеньев.
+        """
+        manager = self.model.all_objects if include_deleted else self.model._default_manager
+        nodes = self.values('pk')
+        first_debtor_child = manager.filter(
+            parent_id=OuterRef('parent_id'), debt__gt=0
+        ).order_by('tree_id', 'lft').values('pk')[:1]
+
+        debtors = list(
+            manager
+            .filter(debt__gt=0)
+            .filter(Q(pk__in=nodes) | Q(parent_id__in=nodes, pk=Subquery(first_debtor_child)))
+            .annotate(blocks_self=Exists(nodes.filter(pk=OuterRef('pk'))),
+                      blocks_parent=Exists(nodes.filter(pk=OuterRef('parent_id'))))
+        )
+
+        blockers = {debtor.pk: debtor for debtor in debtors if debtor.blocks_self}
+        for debtor in debtors:
+            if debtor.blocks_parent:
+                blockers.setdefault(debtor.parent_id, debtor)
+        return blockers
+
+
+class SupplierManager(TreeManager.from_queryset(SupplierQuerySet)):
+    """
+    Менеджер звеньев сети с инкрементальным обслуживанием nested set.
+
+    Вместо полной перестройки таблицы (rebuild) изменения структуры
+    затрагивают только дерево удаляемого звена и узлы правее него.
+    При плотной нумерации (по умолчанию) вставка так же сдвигает границы всех звеньев
+    дерева правее места вставки: добавление звена в большое дерево стоит O(n) строк.
+
+    При разреженной нумерации (SUPPLIER_NESTED_SET_GAP > 0) между границами
+    интервалов остаются промежутки: лист вставляется, а поддерево переносится
+    последним ребенком в свободное место родителя без сдвига соседей,
+    удаление оставляет промежуток. Когда места не хватает, равномерно
+    перенумеровывается поддерево ближайшего предка, где места достаточно.
+
+    Звенья, помеченные удаленными (deleted_at), менеджер не возвращает, если не создан
+    с include_deleted=True. Структурные операции дерева (_mptt_filter, _mptt_update, bulk_update,
+    выбор tree_id) всегда работают со всей таблицей: помеченные звенья остаются в дереве до очистки.
+    """
+
+    def __init__(self, include_deleted: bool = False):
+        super().__init__()
+        self.include_deleted = include_deleted
+
+    def get_queryset(self, *args, **kwargs):
+        queryset = super().get_queryset(*args, **kwargs)
+        return queryset if self.include_deleted else queryset.filter(deleted_at__isnull=True)
+
+    def _all(self) -> QuerySet:
+        """
+        Все звенья таблицы, включая помеченные удаленными.
+        """
+        return super().get_queryset()
+
+    def _mptt_filter(self, qs=None, **filters):
+        return super()._mptt_filter(self._all() if qs is None else qs, **filters)
+
+    def _mptt_update(self, qs=None, **items):
+        return super()._mptt_update(self._all() if qs is None else qs, **items)
+
+    def _get_next_tree_id(self) -> int:
+        return (self._all().aggregate(last=Max(self.tree_id_attr))['last'] or 0) + 1
+
+    def bulk_update(self, objs, fields, batch_size=None) -> int:
+        return self._all().bulk_update(objs, fields, batch_size=batch_size)
+
+    @property
+    def gap(self) -> int:
+        """
+        Шаг разреженной нумерации lft/rght, 0 - плотная нумерация mptt.
+        """
+        return getattr(settings, 'SUPPLIER_NESTED_SET_GAP', 0)
+
+    def _sparse(self) -> bool:
+        return bool(self.gap) and not self.tree_model._mptt_is_tracking
+
+    def _tree_columns(self) -> dict:
+        """
+        Возвращает экранированные имена таблицы и колонок дерева для сырых запросов.
+        """
+        qn = self._get_connection().ops.quote_name
+        opts = self.model._meta
+        return {
+            'table': qn(opts.db_table),
+            'id': qn(opts.pk.column),
+            'parent': qn(opts.get_field(self.parent_attr).column),
+            'left': qn(opts.get_field(self.left_attr).column),
+            'right': qn(opts.get_field(self.right_attr).column),
+            'level': qn(opts.get_field(self.level_attr).column),
+            'tree_id': qn(opts.get_field(self.tree_id_attr).column),
+        }
+
+    def insert_node(self, node, target, position='last-child', *args, **kwargs):
+        """
+        Вставляет звено в дерево. Новый корень всегда получает tree_id после максимального,
+        даже если mptt просит поставить его рядом с другим корнем: tree_id существующих
+        деревьев не перенумеровываются, порядок корней задает ключ сортировки при чтении.
+        """
+        if target is not None and position in ('left', 'right') and target.is_root_node():
+            target, position = None, 'last-child'
+        if target is not None and position == 'last-child' and self._sparse():
+            return self._insert_into_gap(node, target, *args, **kwargs)
+        return super().insert_node(node, target, position, *args, **kwargs)
+
+    def _insert_into_gap(self, node, parent, save=False, allow_existing_pk=False, refresh_target=True):
+        if refresh_target:
+            parent._mptt_refresh()
+        left, right = self._free_slot(parent, 2)
+        setattr(node, self.left_attr, left)
+        setattr(node, self.right_attr, left + max(1, min(self.gap // 2, (right - left) // 2)))
+        setattr(node, self.level_attr, getattr(parent, self.level_attr) + 1)
+        setattr(node, self.tree_id_attr, getattr(parent, self.tree_id_attr))
+        setattr(node, self.parent_attr, parent)
+        if save:
+            node.save()
+        return node
+
+    def _move_node(self, node, target, position='last-child', save=True, refresh_target=True):
+        if target is not None and position == 'last-child' and self._sparse():
+            if refresh_target:
+                target._mptt_refresh()
+            if self._move_into_gap(node, target):
+                if save:
+                    node.save()
+                return
+            refresh_target = False
+        super()._move_node(node, target, position, save, refresh_target)
+
+    def _move_into_gap(self, node, target) -> bool:
+        """
+        Переносит звено с поддеревом последним ребенком target одним UPDATE поддерева,
+        если у target хватает свободного места. На старом месте остается промежуток.
+        Возвращает False, если места нет и перенос нужно выполнить со сдвигом интервалов.
+        """
+        tree_id, left, right = (getattr(node, attr) for attr in (self.tree_id_attr, self.left_attr, self.right_attr))
+        if tree_id == getattr(target, self.tree_id_attr) and left <= getattr(target, self.left_attr) <= right:
+            raise InvalidMove(_('A node may not be made a child of itself or any of its descendants.'))
+
+        slot = self._free_slot(target, right - left + 1, respace=False)
+        if slot is None:
+            return False
+        offset = slot[0] - left
+        level_change = getattr(target, self.level_attr) + 1 - getattr(node, self.level_attr)
+
+        self._get_connection().cursor().execute("""
+        UPDATE {table}
+        SET {left} = {left} + %s,
+            {right} = {right} + %s,
+            {level} = {level} + %s,
+            {tree_id} = %s,
+            {parent} = CASE
+                WHEN {id} = %s THEN %s
+                ELSE {parent} END
+        WHERE {tree_id} = %s AND {left} BETWEEN %s AND %s""".format(**self._tree_columns()), [
+            offset, offset, level_change, getattr(target, self.tree_id_attr), node.pk, target.pk,
+            tree_id, left, right,
+        ])
+        setattr(node, self.left_attr, left + offset)
+        setattr(node, self.right_attr, right + offset)
+        setattr(node, self.level_attr, getattr(node, self.level_attr) + level_change)
+        setattr(node, self.tree_id_attr, getattr(target, self.tree_id_attr))
+        return True
+
+    def _free_slot(self, parent, width: int, respace: bool = True):
+        """
+        Возвращает свободный промежуток (lft, rght) не меньше width после последнего ребенка parent.
+        Если промежуток меньше, перенумеровывает поддерево ближайшего предка
+        или, при respace=False, возвращает None.
+        """
+        last_right = self._all().filter(**{self.parent_attr: parent}).aggregate(last=Max(self.right_attr))['last']
+        left = (last_right or getattr(parent, self.left_attr)) + 1
+        right = getattr(parent, self.right_attr) - 1
+        if right - left + 1 >= width:
+            return left, right
+        if not respace:
+            return None
+        self._respace_ancestor(parent, width)
+        parent._mptt_refresh()
+        return self._free_slot(parent, width, respace=False)
+
+    def _respace_ancestor(self, node, width: int) -> None:
+        """
+        Перенумеровывает с равным шагом поддерево ближайшего предка node (включая само звено),
+        при котором у каждого звена остается не меньше width свободных значений после детей.
+        Корень при необходимости расширяется: правее него в дереве никого нет.
+        """
+        required_step = max(width + 1, self.gap // 4)
+        cursor = self._get_connection().cursor()
+        cursor.execute("""
+        SELECT ancestor.{left}, ancestor.{right}, ancestor.{parent} IS NULL,
+               (SELECT COUNT(*) FROM {table} AS descendant
+                WHERE descendant.{tree_id} = ancestor.{tree_id}
+                  AND descendant.{left} BETWEEN ancestor.{left} AND ancestor.{right})
+        FROM {table} AS ancestor
+        WHERE ancestor.{tree_id} = %s AND ancestor.{left} <= %s AND ancestor.{right} >= %s
+        ORDER BY ancestor.{left} DESC""".format(**self._tree_columns()), [
+            getattr(node, self.tree_id_attr), getattr(node, self.left_attr), getattr(node, self.right_attr),
+        ])
+        for left, right, is_root, count in cursor.fetchall():
+            step = (right - left) // (2 * count - 1)
+            if step >= required_step or is_root:
+                self._respace(max(step, required_step, self.gap if is_root else 0),
+                              getattr(node, self.tree_id_attr), left, right, expanded=node)
+                return
+
+    def _respace(self, step: int, tree_id=None, left=None, right=None, expanded=None) -> None:
+        """
+        Расставляет границы интервалов с шагом step, сохраняя их порядок:
+        в поддереве [left, right] дерева tree_id или во всей таблице.
+        Листья, кроме expanded, получают интервал ширины 1, чтобы их можно было переносить в промежутки.
+        """
+        columns = self._tree_columns()
+        if tree_id is None:
+            scope, params = 'TRUE', []
+        else:
+            scope, params = '{tree_id} = %s AND {left} BETWEEN %s AND %s'.format(**columns), [tree_id, left, right]
+        self._get_connection().cursor().execute(
+            RESPACE_SQL.format(scope=scope, **columns), params + params + [getattr(expanded, 'pk', None), step]
+        )
+
+    def _close_gap(self, size, target, tree_id) -> None:
+        """
+        При разреженной нумерации промежуток удаленного звена остается свободным.
+        """
+        if not self._sparse():
+            super()._close_gap(size, target, tree_id)
+
+    def _post_insert_update_cached_parent_right(self, instance, right_shift, seen=None) -> None:
+        if not self._sparse():
+            super()._post_insert_update_cached_parent_right(instance, right_shift, seen)
+
+    def _make_sibling_of_root_node(self, node, target, position) -> None:
+        """
+        Делает звено корнем нового дерева без сдвига tree_id других деревьев.
+        Перестановка корней между собой не требуется: их порядок задает ключ сортировки.
+        """
+        if node.is_child_node():
+            self._make_child_root_node(node)
+
+    def _create_tree_space(self, target_tree_id, num_trees=1) -> None:
+        """
+        Освободившийся tree_id остается пропуском: сдвиг всех последующих деревьев не нужен.
+        """
+        if num_trees > 0:
+            super()._create_tree_space(target_tree_id, num_trees)
+
+    @contextmanager
+    def lock_trees(self, *nodes, tree_ids=(), refresh_parent=False):
+        """
+        Сериализует структурные изменения деревьев звеньев nodes и деревьев tree_ids
+        через координатор (None - создание нового дерева).
+
+        После получения блокировок поля дерева звеньев (и parent при refresh_parent)
+        перечитываются; если звено за время ожидания перешло в другое дерево, блокируется и оно.
+        """
+        with ExitStack() as stack:
+            locked = set()
+            while True:
+                wanted = set(tree_ids) | {
+                    getattr(node, self.tree_id_attr) for node in nodes if not node._state.adding
+                }
+                if wanted <= locked:
+                    break
+                stack.enter_context(tree_lock(wanted - locked))
+                locked |= wanted
+                for node in nodes:
+                    if refresh_parent:
+                        self._refresh_tree_fields(node)
+                    else:
+                        node._mptt_refresh()
+            yield
+
+    def _refresh_tree_fields(self, node) -> None:
+        node.refresh_from_db(fields=(self.parent_attr, self.left_attr, self.right_attr,
+                                     self.level_attr, self.tree_id_attr))
+
+    def creates_cycle(self, node, parent) -> bool:
+        """
+        Проверяет до записи, что перенос node под parent создаст цикл:
+        parent - само звено или его потомок.
+        """
+        if node.pk is None or parent is None:
+            return False
+        return node.pk in self.invalid_moves({node.pk: parent.pk})
+
+    def invalid_moves(self, moves: Dict[int, Optional[int]]) -> Set[int]:
+        """
+        Проверяет набор переносов {id звена: id нового родителя или None} как одно изменение
+        и возвращает id звеньев, которые после всех переносов оказались бы в цикле.
+
+        Интервалы всех звеньев набора и новых родителей читаются одним запросом по первичному ключу.
+        Для каждого звена находится ближайший переносимый предок (или само звено), тогда после
+        переносов родительская цепочка звена M продолжается от ближайшего переносимого предка
+        его нового родителя. Цепочки переносимых звеньев проверяются за один проход.
+        """
+        ids = set(moves) | {parent_id for parent_id in moves.values() if parent_id is not None}
+        intervals = self.filter(pk__in=ids).values_list('pk', self.tree_id_attr, self.left_attr, self.right_attr)
+
+        moved_ancestor = {}
+        stack = []
+        for pk, tree_id, left, right in sorted(intervals, key=lambda row: (row[1], row[2])):
+            while stack and (stack[-1][1] != tree_id or stack[-1][2] < right):
+                stack.pop()
+            if pk in moves:
+                stack.append((pk, tree_id, right))
+            moved_ancestor[pk] = stack[-1][0] if stack else None
+
+        next_moved = {pk: moved_ancestor.get(parent_id) for pk, parent_id in moves.items() if pk in moved_ancestor}
+        cycles, checked = set(), set()
+        for start in next_moved:
+            chain = []
+            pk = start
+            while pk is not None and pk not in checked:
+                checked.add(pk)
+                chain.append(pk)
+                pk = next_moved.get(pk)
+            if pk in chain:
+                cycles.update(chain[chain.index(pk):])
+        return cycles
+
+    def tree_versions(self, *pks: int) -> Dict[int, Tuple[int, int]]:
+        """
+        Возвращает {id звена: (tree_id, версия дерева)} одним запросом по первичному ключу.
+        Версию увеличивает триггер при любом изменении строк дерева. Удаленные звенья не возвращаются.
+        """
+        cursor = self._get_connection().cursor()
+        cursor.execute("""
+        SELECT node.{id}, node.{tree_id}, COALESCE(versions.version, 0)
+        FROM {table} AS node LEFT JOIN supplier_tree_versions AS versions ON versions.tree_id = node.{tree_id}
+        WHERE node.{id} = ANY(%s) AND node.deleted_at IS NULL""".format(**self._tree_columns()), [list(pks)])
+        return {pk: (tree_id, version) for pk, tree_id, version in cursor.fetchall()}
+
+    def path_to(self, pk: int) -> QuerySet:
+        """
+        Возвращает звенья от первого звена цепочки до звена pk включительно
+        одним запросом по индексу (tree_id, lft): предки - интервалы, содержащие интервал звена.
+        """
+        node = self.filter(pk=pk)
+        return self.filter(**{
+            self.tree_id_attr: Subquery(node.values(self.tree_id_attr)),
+            f'{self.left_attr}__lte': Subquery(node.values(self.left_attr)),
+            f'{self.right_attr}__gte': Subquery(node.values(self.right_attr)),
+        }).order_by(self.left_attr)
+
+    def common_ancestor(self, first: int, second: int) -> Optional['Supplier']:
+        """
+        Возвращает ближайшее общее звено цепочек first и second (одно из них, если оно предок другого)
+        или None, если звенья в разных деревьях или одно из них удалено.
+        Выполняется одним запросом по индексу (tree_id, lft).
+        """
+        ancestors = self.raw("""
+        SELECT ancestor.*
+        FROM {table} AS ancestor, (
+            SELECT MIN({tree_id}) AS tree_id, MAX({tree_id}) AS other_tree_id,
+                   MIN({left}) AS lft, MAX({right}) AS rght
+            FROM {table} WHERE {id} IN (%s, %s) AND deleted_at IS NULL
+            HAVING COUNT(*) = %s
+        ) AS pair
+        WHERE pair.tree_id = pair.other_tree_id AND ancestor.{tree_id} = pair.tree_id
+          AND ancestor.{left} <= pair.lft AND ancestor.{right} >= pair.rght AND ancestor.deleted_at IS NULL
+        ORDER BY ancestor.{left} DESC
+        LIMIT 1""".format(**self._tree_columns()), [first, second, len({int(first), int(second)})])
+        return next(iter(ancestors), None)
+
+    def new_parents(self, moves: List[Tuple['Supplier', Optional['Supplier'], str]]) -> Dict[int, Optional[int]]:
+        """
+        Возвращает id нового родителя для каждого переноса (звено, target, position) с позициями mptt.
+        При позиции left/right родитель - родитель target с учетом предыдущих переносов набора.
+        """
+        parents = {}
+        for node, target, position in moves:
+            if target is None:
+                parents[node.pk] = None
+            elif position in ('left', 'right'):
+                parents[node.pk] = parents.get(target.pk, getattr(target, f'{self.parent_attr}_id'))
+            else:
+                parents[node.pk] = target.pk
+        return parents
+
+    def move_subtrees(self, moves: List[Tuple['Supplier', Optional['Supplier'], str]]) -> None:
+        """
+        Переносит звенья вместе с поддеревьями в одной транзакции.
+
+        Каждый перенос выполняется фиксированным числом UPDATE интервалов mptt
+        независимо от размера поддерева. Весь набор проверяется на циклы под
+        блокировкой деревьев до первой записи, при цикле выбрасывается InvalidMove.
+
+        Звено записывается только полем parent: долг и тип, прочитанные до блокировки,
+        не затирают параллельные изменения, а нарушенное ими правило звена
+        выбрасывается ограничением CHECK как IntegrityError.
+        """
+        nodes = [node for node, _, _ in moves] + [target for _, target, _ in moves if target is not None]
+        new_roots = any(target is None or position in ('left', 'right') for _, target, position in moves)
+        with self.lock_trees(*nodes, tree_ids=[None] if new_roots else [], refresh_parent=True):
+            if self.invalid_moves(self.new_parents(moves)):
+                raise InvalidMove(_('A node may not be made a child of itself or any of its descendants.'))
+            for index, (node, target, position) in enumerate(moves):
+                if index:
+                    self._refresh_tree_fields(node)
+                    if target is not None:
+                        self._refresh_tree_fields(target)
+                self._move_node(node, target, position, save=False)
+                node.save(update_fields=[self.parent_attr])
+                node_moved.send(sender=node.__class__, instance=node, target=target, position=position)
+
+    def reparent_children(self, node) -> None:
+        """
+        Переназначает всех детей звена на его родителя фиксированным числом запросов.
+
+        Если у звена есть родитель, дети поднимаются на уровень выше и занимают
+        место звена среди детей родителя: интервалы потомков сдвигаются на 1,
+        а само звено становится листом справа от них.
+
+        Если звено корневое, каждый ребенок становится корнем нового дерева
+        с tree_id после максимального, существующие деревья не перенумеровываются.
+        """
+        with self.lock_trees(node, tree_ids=[None] if node.parent_id is None else [], refresh_parent=True):
+            if node.is_leaf_node():
+                return
+
+            get_hierarchy().children_lifted(node)
+            cursor = self._get_connection().cursor()
+            columns = self._tree_columns()
+            left, right = node.lft, node.rght
+
+            cursor.execute("""
+            UPDATE {table}
+            SET sort_path = sort_path[1:depth.size - 2] || sort_path[depth.size + 1:]
+            FROM (SELECT cardinality(sort_path) AS size FROM {table} WHERE {id} = %s) AS depth
+            WHERE {tree_id} = %s AND {left} > %s AND {left} < %s""".format(**columns), [
+                node.pk, node.tree_id, left, right,
+            ])
+
+            if node.parent_id:
+                cursor.execute("""
+                UPDATE {table}
+                SET {left} = CASE
+                        WHEN {id} = %s THEN %s
+                        ELSE {left} - 1 END,
+                    {right} = CASE
+                        WHEN {id} = %s THEN %s
+                        ELSE {right} - 1 END,
+                    {level} = CASE
+                        WHEN {id} = %s THEN {level}
+                        ELSE {level} - 1 END,
+                    {parent} = CASE
+                        WHEN {parent} = %s THEN %s
+                        ELSE {parent} END
+                WHERE {tree_id} = %s AND {left} >= %s AND {left} < %s""".format(**columns), [
+                    node.pk, right - 1,
+                    node.pk, right,
+                    node.pk,
+                    node.pk, node.parent_id,
+                    node.tree_id, left, right,
+                ])
+                node.lft, node.rght = right - 1, right
+            else:
+                cursor.execute("""
+                UPDATE {table} AS node
+                SET {tree_id} = child.new_tree_id,
+                    {left} = node.{left} - child.{left} + 1,
+                    {right} = node.{right} - child.{left} + 1,
+                    {level} = node.{level} - 1,
+                    {parent} = CASE
+                        WHEN node.{id} = child.{id} THEN NULL
+                        ELSE node.{parent} END
+                FROM (
+                    SELECT {id}, {left}, {right},
+                           (SELECT MAX({tree_id}) FROM {table}) + ROW_NUMBER() OVER (ORDER BY {left}) AS new_tree_id
+                    FROM {table}
+                    WHERE {parent} = %s
+                ) AS child
+                WHERE node.{tree_id} = %s AND node.{left} BETWEEN child.{left} AND child.{right}""".format(**columns), [
+                    node.pk, node.tree_id,
+                ])
+                self._all().filter(pk=node.pk).update(**{self.right_attr: left + 1})
+                node.rght = left + 1
+
+    def update_sort_path(self, node) -> None:
+        """
+        Пересчитывает ключ сортировки звена и его поддерева одним запросом.
+
+        Ключ - массив пар (название, id) от корня до звена. Сортировка по нему
+        дает обход сети, в котором соседние звенья упорядочены по названию,
+        поэтому при вставке не нужно сдвигать lft/rght соседей.
+        """
+        cursor = self._get_connection().cursor()
+        cursor.execute("""
+        UPDATE {table} AS subtree
+        SET sort_path = node.prefix || subtree.sort_path[node.size + 1:]
+        FROM (
+            SELECT node.{tree_id}, node.{left}, node.{right}, cardinality(node.sort_path) AS size,
+                   COALESCE(parent.sort_path, '{{}}')
+                   || ARRAY[node.name, lpad(node.{id}::text, 19, '0')]::varchar[] AS prefix
+            FROM {table} AS node LEFT JOIN {table} AS parent ON parent.{id} = node.{parent}
+            WHERE node.{id} = %s
+        ) AS node
+        WHERE subtree.{tree_id} = node.{tree_id} AND subtree.{left} BETWEEN node.{left} AND node.{right}
+        """.format(**self._tree_columns()), [node.pk])
+
+    def rebuild(self, *args, **kwargs) -> None:
+        super().rebuild(*args, **kwargs)
+        if self.gap:
+            self._respace(self.gap)
+        self.rebuild_sort_paths()
+
+    def rebuild_sort_paths(self) -> None:
+        """
+        Заполняет ключи сортировки всех звеньев по связям parent.
+        """
+        cursor = self._get_connection().cursor()
+        cursor.execute(REBUILD_SORT_PATHS_SQL)
+
+    def rebuild_rollups(self, tree_ids: Optional[List[int]] = None) -> int:
+        """
+        Заново вычисляет итоги поддерева по интервалам lft/rght для деревьев tree_ids (по умолчанию всех)
+        и возвращает количество исправленных строк. Нужен после массовой загрузки
+        с отложенным обновлением дерева и для восстановления итогов.
+        """
+        cursor = self._get_connection().cursor()
+        if tree_ids is None:
+            cursor.execute(REBUILD_ROLLUPS_SQL.format(scope='TRUE'))
+        else:
+            cursor.execute(REBUILD_ROLLUPS_SQL.format(scope='ancestor.tree_id = ANY(%s)'), [list(tree_ids)])
+        return cursor.rowcount
+
+    def delete_node(self, node) -> None:
+        """
+        Удаляет звено, дети которого уже переназначены, и закрывает
+        образовавшийся промежуток в его дереве.
+
+        Сдвигаются lft/rght только у узлов того же tree_id, расположенных
+        правее удаляемого звена, и у его предков. Остальные деревья не изменяются.
+        """
+        with self.lock_trees(node):
+            node.delete()
+
+    def delete_nodes(self, queryset: QuerySet) -> None:
+        """
+        Удаляет набор звеньев, дети которых уже переназначены.
+
+        Звенья удаляются справа налево внутри каждого дерева, поэтому
+        каждое закрытие промежутка затрагивает только правую часть своего дерева.
+        """
+        nodes = list(queryset.order_by(self.tree_id_attr, f'-{self.left_attr}'))
+        with self.lock_trees(*nodes):
+            for node in nodes:
+                node.delete()
+
+    def soft_delete(self, *pks: int) -> int:
+        """
+        Помечает звенья удаленными одним запросом и возвращает количество помеченных.
+        Звенья остаются в дереве, их дети переназначаются и строки удаляются при очистке
+        (app_shop.purge).
+        """
+        return self._all().filter(pk__in=pks, deleted_at__isnull=True).update(deleted_at=timezone.now())
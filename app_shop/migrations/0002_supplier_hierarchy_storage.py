@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierPath',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='hierarchy_path', serialize=False, to='app_shop.supplier', verbose_name='Звено')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь')),
+                ('depth', models.PositiveIntegerField(verbose_name='Уровень')),
+            ],
+            options={
+                'verbose_name': 'Путь звена',
+                'verbose_name_plural': 'Пути звеньев',
+                'db_table': 'supplier_paths',
+                'indexes': [models.Index(fields=['path'], name='supplier_paths_path_idx', opclasses=['varchar_pattern_ops'])],
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Расстояние')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='app_shop.supplier', verbose_name='Предок')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='app_shop.supplier', verbose_name='Потомок')),
+            ],
+            options={
+                'verbose_name': 'Связь предок-потомок',
+                'verbose_name_plural': 'Связи предок-потомок',
+                'db_table': 'supplier_closure',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='supplier_closure_desc_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+    ]
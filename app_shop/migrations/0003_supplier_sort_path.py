@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:40
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+from app_shop.managers import REBUILD_SORT_PATHS_SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0002_supplier_hierarchy_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='sort_path',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), default=list, editable=False, size=None, verbose_name='Ключ сортировки'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['sort_path'], name='suppliers_sort_path_idx'),
+        ),
+        migrations.RunSQL(REBUILD_SORT_PATHS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0003_supplier_sort_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['tree_id', 'lft'], name='suppliers_tree_lft_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0004_supplier_tree_lft_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeFixup',
+            fields=[
+                ('tree_id', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Дерево')),
+                ('requests', models.PositiveIntegerField(default=1, verbose_name='Количество заявок')),
+                ('requested_at', models.DateTimeField(verbose_name='Время первой заявки')),
+            ],
+            options={
+                'verbose_name': 'Заявка на исправление дерева',
+                'verbose_name_plural': 'Заявки на исправление деревьев',
+                'db_table': 'supplier_tree_fixups',
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-17 05:12
+
+from django.db import migrations, models
+
+BUMP_TREE_VERSIONS_SQL = """
+CREATE FUNCTION bump_supplier_tree_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO supplier_tree_versions (tree_id, version)
+        SELECT DISTINCT tree_id, 1 FROM new_rows ORDER BY tree_id
+        ON CONFLICT (tree_id) DO UPDATE SET version = supplier_tree_versions.version + 1;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO supplier_tree_versions (tree_id, version)
+        SELECT tree_id, 1 FROM (SELECT tree_id FROM new_rows UNION SELECT tree_id FROM old_rows) AS trees
+        ORDER BY tree_id
+        ON CONFLICT (tree_id) DO UPDATE SET version = supplier_tree_versions.version + 1;
+    ELSE
+        INSERT INTO supplier_tree_versions (tree_id, version)
+        SELECT DISTINCT tree_id, 1 FROM old_rows ORDER BY tree_id
+        ON CONFLICT (tree_id) DO UPDATE SET version = supplier_tree_versions.version + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER suppliers_tree_versions_insert AFTER INSERT ON suppliers
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_supplier_tree_versions();
+CREATE TRIGGER suppliers_tree_versions_update AFTER UPDATE ON suppliers
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_supplier_tree_versions();
+CREATE TRIGGER suppliers_tree_versions_delete AFTER DELETE ON suppliers
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_supplier_tree_versions();
+"""
+
+DROP_TREE_VERSIONS_SQL = """
+DROP TRIGGER suppliers_tree_versions_insert ON suppliers;
+DROP TRIGGER suppliers_tree_versions_update ON suppliers;
+DROP TRIGGER suppliers_tree_versions_delete ON suppliers;
+DROP FUNCTION bump_supplier_tree_versions();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0005_tree_fixups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeVersion',
+            fields=[
+                ('tree_id', models.PositiveIntegerField(primary_key=True, serialize=False, verbose_name='Дерево')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия дерева',
+                'verbose_name_plural': 'Версии деревьев',
+                'db_table': 'supplier_tree_versions',
+            },
+        ),
+        migrations.RunSQL(BUMP_TREE_VERSIONS_SQL, DROP_TREE_VERSIONS_SQL),
+    ]
@@ -0,0 +1,189 @@
+# Generated by Django 5.0.6 on 2026-10-17 06:20
+
+from django.db import migrations, models
+
+# Пересчет итогов по интервалам lft/rght на момент миграции (до мягкого удаления звеньев).
+REBUILD_ROLLUPS_SQL = """
+UPDATE suppliers AS node
+SET subtree_debt = rollup.debt, descendant_count = rollup.descendants, subtree_depth = rollup.depth
+FROM (
+    SELECT ancestor.id, SUM(descendant.debt) AS debt, COUNT(*) - 1 AS descendants,
+           MAX(descendant.level) - ancestor.level AS depth
+    FROM suppliers AS ancestor
+    JOIN suppliers AS descendant
+      ON descendant.tree_id = ancestor.tree_id AND descendant.lft BETWEEN ancestor.lft AND ancestor.rght
+    WHERE {scope}
+    GROUP BY ancestor.id
+) AS rollup
+WHERE node.id = rollup.id
+  AND (node.subtree_debt, node.descendant_count, node.subtree_depth)
+      IS DISTINCT FROM (rollup.debt, rollup.descendants, rollup.depth)
+"""
+
+# Итоги нового звена - только его собственные значения.
+INIT_ROLLUPS_SQL = """
+CREATE FUNCTION init_supplier_rollups() RETURNS trigger AS $$
+BEGIN
+    NEW.subtree_debt := NEW.debt;
+    NEW.descendant_count := 0;
+    NEW.subtree_depth := 0;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER suppliers_rollups_init BEFORE INSERT ON suppliers
+FOR EACH ROW EXECUTE FUNCTION init_supplier_rollups();
+"""
+
+# Каждое изменение - вклад (долг, количество звеньев, глубина), который прибавляется к звену start_id
+# и всем его предкам. Вставка добавляет вклад звена родителю, удаление вычитает, перенос вычитает
+# из старой цепочки и добавляет в новую, изменение долга добавляет разницу самому звену.
+# Глубина при уменьшении (удаление, перенос) пересчитывается по детям снизу вверх вдоль старой цепочки.
+UPDATE_ROLLUPS_SQL = """
+CREATE FUNCTION update_supplier_rollups() RETURNS trigger AS $$
+DECLARE
+    starts integer[];
+    debt_deltas numeric[];
+    count_deltas integer[];
+    depths integer[];
+    shrinks boolean[];
+    node_id integer;
+BEGIN
+    IF pg_trigger_depth() > 1 THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(parent_id), array_agg(debt), array_agg(1), array_agg(1), array_agg(FALSE)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM new_rows WHERE parent_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        WITH changed AS (
+            SELECT updated.id, updated.debt, updated.parent_id, previous.debt AS previous_debt,
+                   previous.parent_id AS previous_parent_id, previous.subtree_debt, previous.descendant_count,
+                   previous.subtree_depth
+            FROM new_rows AS updated JOIN old_rows AS previous ON previous.id = updated.id
+            WHERE updated.debt IS DISTINCT FROM previous.debt OR updated.parent_id IS DISTINCT FROM previous.parent_id
+        )
+        SELECT array_agg(start_id), array_agg(debt_delta), array_agg(count_delta), array_agg(depth), array_agg(shrink)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM (
+            SELECT id AS start_id, debt - previous_debt AS debt_delta, 0 AS count_delta,
+                   NULL::integer AS depth, FALSE AS shrink
+            FROM changed WHERE debt IS DISTINCT FROM previous_debt
+            UNION ALL
+            SELECT previous_parent_id, -subtree_debt, -(descendant_count + 1), NULL, TRUE
+            FROM changed WHERE parent_id IS DISTINCT FROM previous_parent_id AND previous_parent_id IS NOT NULL
+            UNION ALL
+            SELECT parent_id, subtree_debt, descendant_count + 1, subtree_depth + 1, FALSE
+            FROM changed WHERE parent_id IS DISTINCT FROM previous_parent_id AND parent_id IS NOT NULL
+        ) AS changes;
+    ELSE
+        SELECT array_agg(parent_id), array_agg(-subtree_debt), array_agg(-(descendant_count + 1)),
+               array_agg(NULL::integer), array_agg(TRUE)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM old_rows WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM old_rows);
+    END IF;
+
+    IF starts IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH RECURSIVE changes AS (
+        SELECT * FROM unnest(starts, debt_deltas, count_deltas, depths)
+            WITH ORDINALITY AS change(start_id, debt_delta, count_delta, depth, no)
+    ), chain AS (
+        SELECT changes.no, suppliers.id, suppliers.parent_id, 0 AS distance
+        FROM changes JOIN suppliers ON suppliers.id = changes.start_id
+        UNION ALL
+        SELECT chain.no, suppliers.id, suppliers.parent_id, chain.distance + 1
+        FROM chain JOIN suppliers ON suppliers.id = chain.parent_id
+    ), deltas AS (
+        SELECT chain.id, SUM(changes.debt_delta) AS debt_delta, SUM(changes.count_delta) AS count_delta,
+               MAX(changes.depth + chain.distance) AS depth
+        FROM chain JOIN changes ON changes.no = chain.no
+        GROUP BY chain.id
+    ), locked AS (
+        SELECT suppliers.id FROM suppliers JOIN deltas ON deltas.id = suppliers.id ORDER BY suppliers.id FOR UPDATE
+    )
+    UPDATE suppliers
+    SET subtree_debt = subtree_debt + deltas.debt_delta,
+        descendant_count = descendant_count + deltas.count_delta,
+        subtree_depth = GREATEST(subtree_depth, COALESCE(deltas.depth, 0))
+    FROM deltas
+    WHERE suppliers.id = deltas.id AND suppliers.id IN (SELECT id FROM locked);
+
+    FOR node_id IN
+        WITH RECURSIVE chain AS (
+            SELECT suppliers.id, suppliers.parent_id, 0 AS distance
+            FROM unnest(starts, shrinks) AS change(start_id, shrink)
+            JOIN suppliers ON suppliers.id = change.start_id
+            WHERE change.shrink
+            UNION ALL
+            SELECT suppliers.id, suppliers.parent_id, chain.distance + 1
+            FROM chain JOIN suppliers ON suppliers.id = chain.parent_id
+        )
+        SELECT id FROM chain GROUP BY id ORDER BY MAX(distance)
+    LOOP
+        UPDATE suppliers SET subtree_depth = depth.value
+        FROM (
+            SELECT COALESCE(MAX(child.subtree_depth) + 1, 0) AS value FROM suppliers AS child
+            WHERE child.parent_id = node_id
+        ) AS depth
+        WHERE suppliers.id = node_id AND suppliers.subtree_depth <> depth.value;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER suppliers_rollups_insert AFTER INSERT ON suppliers
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION update_supplier_rollups();
+CREATE TRIGGER suppliers_rollups_update AFTER UPDATE ON suppliers
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION update_supplier_rollups();
+CREATE TRIGGER suppliers_rollups_delete AFTER DELETE ON suppliers
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION update_supplier_rollups();
+"""
+
+DROP_ROLLUPS_SQL = """
+DROP TRIGGER suppliers_rollups_init ON suppliers;
+DROP TRIGGER suppliers_rollups_insert ON suppliers;
+DROP TRIGGER suppliers_rollups_update ON suppliers;
+DROP TRIGGER suppliers_rollups_delete ON suppliers;
+DROP FUNCTION init_supplier_rollups();
+DROP FUNCTION update_supplier_rollups();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0006_tree_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='subtree_debt',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Задолженность звена и потомков'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='descendant_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество потомков'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='subtree_depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Глубина поддерева'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['subtree_debt'], name='suppliers_subtree_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['descendant_count'], name='suppliers_descendant_count_idx'),
+        ),
+        migrations.RunSQL(INIT_ROLLUPS_SQL + UPDATE_ROLLUPS_SQL, DROP_ROLLUPS_SQL),
+        migrations.RunSQL(REBUILD_ROLLUPS_SQL.format(scope='TRUE'), migrations.RunSQL.noop),
+    ]
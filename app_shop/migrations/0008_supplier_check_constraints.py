@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+# Ограничения добавляются NOT VALID: новые и изменяемые строки проверяются сразу, а уже нарушающие
+# правила строки не проваливают миграцию. Существующие строки проверяет 0021_validate_supplier_constraints.
+ADD_CONSTRAINTS_SQL = """
+ALTER TABLE suppliers ADD CONSTRAINT suppliers_factory_without_parent
+    CHECK (NOT (parent_id IS NOT NULL AND type_supplier = 'factory')) NOT VALID;
+ALTER TABLE suppliers ADD CONSTRAINT suppliers_root_without_debt
+    CHECK (parent_id IS NOT NULL OR debt <= 0) NOT VALID;
+"""
+
+DROP_CONSTRAINTS_SQL = """
+ALTER TABLE suppliers DROP CONSTRAINT suppliers_root_without_debt;
+ALTER TABLE suppliers DROP CONSTRAINT suppliers_factory_without_parent;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0007_supplier_rollups'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(ADD_CONSTRAINTS_SQL, DROP_CONSTRAINTS_SQL),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='supplier',
+                    constraint=models.CheckConstraint(check=models.Q(('parent__isnull', False), ('type_supplier', 'factory'), _negated=True), name='suppliers_factory_without_parent', violation_error_message='Ошибка: завод не может иметь родителя'),
+                ),
+                migrations.AddConstraint(
+                    model_name='supplier',
+                    constraint=models.CheckConstraint(check=models.Q(('parent__isnull', False), ('debt__lte', 0), _connector='OR'), name='suppliers_root_without_debt', violation_error_message='Ошибка: у звена без родителя не может быть долга'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Внешний ключ products.supplier_id пересоздается с ON DELETE CASCADE; имя ограничения,
+# созданного Django, берется из каталога.
+REPLACE_FOREIGN_KEY_SQL = """
+DO $$
+DECLARE
+    fk_name text;
+BEGIN
+    FOR fk_name IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'products'::regclass AND confrelid = 'suppliers'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE products DROP CONSTRAINT %I', fk_name);
+    END LOOP;
+END $$;
+ALTER TABLE products ADD CONSTRAINT products_supplier_id_fk_suppliers_id
+    FOREIGN KEY (supplier_id) REFERENCES suppliers (id) ON DELETE {action} DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0008_supplier_check_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='app_shop.supplier', verbose_name='Поставщик'),
+        ),
+        migrations.RunSQL(REPLACE_FOREIGN_KEY_SQL.format(action='CASCADE'),
+                          REPLACE_FOREIGN_KEY_SQL.format(action='NO ACTION')),
+    ]
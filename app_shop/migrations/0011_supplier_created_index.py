@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0010_supplier_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['created_at', 'id'], name='suppliers_created_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0011_supplier_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'country', 'city', 'street', 'email', config='simple'), name='suppliers_search_idx'),
+        ),
+    ]
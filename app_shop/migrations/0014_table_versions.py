@@ -0,0 +1,55 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:07
+
+from django.db import migrations, models
+
+BUMP_TABLE_VERSIONS_SQL = """
+CREATE SEQUENCE table_versions_seq;
+
+CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version, changed_at)
+    VALUES (TG_TABLE_NAME, nextval('table_versions_seq'), clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version, changed_at = EXCLUDED.changed_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+INSERT INTO table_versions (table_name, version, changed_at)
+VALUES ('suppliers', nextval('table_versions_seq'), now()), ('products', nextval('table_versions_seq'), now());
+
+CREATE TRIGGER suppliers_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON suppliers
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER products_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+"""
+
+DROP_TABLE_VERSIONS_SQL = """
+DROP TRIGGER suppliers_table_version ON suppliers;
+DROP TRIGGER products_table_version ON products;
+DROP FUNCTION bump_table_version();
+DROP SEQUENCE table_versions_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0013_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table_name', models.CharField(max_length=63, primary_key=True, serialize=False, verbose_name='Таблица')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('changed_at', models.DateTimeField(verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия таблицы',
+                'verbose_name_plural': 'Версии таблиц',
+                'db_table': 'table_versions',
+            },
+        ),
+        migrations.RunSQL(BUMP_TABLE_VERSIONS_SQL, DROP_TABLE_VERSIONS_SQL),
+    ]
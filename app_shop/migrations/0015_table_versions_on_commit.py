@@ -0,0 +1,78 @@
+# Generated by Django 5.0.6 on 2026-10-17 09:40
+
+from django.db import migrations
+
+# Строка table_versions блокируется только при фиксации транзакции: операторы записи лишь отмечают
+# изменение таблицы номером из последовательности в локальной для транзакции настройке
+# app_shop.changes_<таблица>, а новую версию записывает отложенный триггер.
+# Пишущие транзакции в разных деревьях не ждут друг друга.
+FLUSH_TABLE_VERSIONS_SQL = """
+CREATE FUNCTION mark_table_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM set_config('app_shop.changes_' || TG_TABLE_NAME, nextval('table_versions_seq')::text, true);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION flush_table_versions() RETURNS trigger AS $$
+DECLARE
+    changed text[];
+BEGIN
+    SELECT array_agg(name ORDER BY name) INTO changed FROM unnest(TG_ARGV) AS name
+    WHERE COALESCE(NULLIF(current_setting('app_shop.changes_' || name, true), ''), '0') <> '0';
+    IF changed IS NULL THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO table_versions (table_name, version, changed_at)
+    SELECT name, nextval('table_versions_seq'), clock_timestamp() FROM unnest(changed) AS name ORDER BY name
+    ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version, changed_at = EXCLUDED.changed_at;
+    PERFORM set_config('app_shop.changes_' || name, '0', true) FROM unnest(changed) AS name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER suppliers_table_version ON suppliers;
+DROP TRIGGER products_table_version ON products;
+
+CREATE TRIGGER suppliers_table_changed AFTER INSERT OR UPDATE OR DELETE ON suppliers
+FOR EACH STATEMENT EXECUTE FUNCTION mark_table_changed();
+CREATE TRIGGER products_table_changed AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH STATEMENT EXECUTE FUNCTION mark_table_changed();
+
+CREATE CONSTRAINT TRIGGER suppliers_table_version AFTER INSERT OR UPDATE OR DELETE ON suppliers
+DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION flush_table_versions('products', 'suppliers');
+CREATE CONSTRAINT TRIGGER products_table_version AFTER INSERT OR UPDATE OR DELETE ON products
+DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION flush_table_versions('products', 'suppliers');
+
+CREATE TRIGGER suppliers_table_truncated AFTER TRUNCATE ON suppliers
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER products_table_truncated AFTER TRUNCATE ON products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+"""
+
+BUMP_TABLE_VERSIONS_SQL = """
+DROP TRIGGER suppliers_table_changed ON suppliers;
+DROP TRIGGER products_table_changed ON products;
+DROP TRIGGER suppliers_table_version ON suppliers;
+DROP TRIGGER products_table_version ON products;
+DROP TRIGGER suppliers_table_truncated ON suppliers;
+DROP TRIGGER products_table_truncated ON products;
+DROP FUNCTION mark_table_changed();
+DROP FUNCTION flush_table_versions();
+
+CREATE TRIGGER suppliers_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON suppliers
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER products_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0014_table_versions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FLUSH_TABLE_VERSIONS_SQL, BUMP_TABLE_VERSIONS_SQL),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.6 on 2026-10-17 11:30
+
+from django.db import migrations
+
+# Отложенный триггер строк таблиц звеньев и продуктов ставил в очередь событие на каждую измененную строку.
+# Теперь первый изменивший таблицу оператор транзакции вставляет одну строку-отметку в table_version_marks,
+# и отложенный триггер этой таблицы записывает новые версии один раз при фиксации.
+VERSION_MARKS_SQL = """
+CREATE UNLOGGED TABLE table_version_marks (txid bigint PRIMARY KEY);
+
+CREATE OR REPLACE FUNCTION mark_table_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM set_config('app_shop.changes_' || TG_TABLE_NAME, nextval('table_versions_seq')::text, true);
+    IF COALESCE(current_setting('app_shop.version_marked', true), '') = '' THEN
+        PERFORM set_config('app_shop.version_marked', 'on', true);
+        INSERT INTO table_version_marks (txid) VALUES (txid_current());
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION flush_table_versions() RETURNS trigger AS $$
+DECLARE
+    changed text[];
+BEGIN
+    DELETE FROM table_version_marks WHERE txid = NEW.txid;
+    PERFORM set_config('app_shop.version_marked', '', true);
+    SELECT array_agg(name ORDER BY name) INTO changed FROM unnest(TG_ARGV) AS name
+    WHERE COALESCE(NULLIF(current_setting('app_shop.changes_' || name, true), ''), '0') <> '0';
+    IF changed IS NULL THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO table_versions (table_name, version, changed_at)
+    SELECT name, nextval('table_versions_seq'), clock_timestamp() FROM unnest(changed) AS name ORDER BY name
+    ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version, changed_at = EXCLUDED.changed_at;
+    PERFORM set_config('app_shop.changes_' || name, '0', true) FROM unnest(changed) AS name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER suppliers_table_version ON suppliers;
+DROP TRIGGER products_table_version ON products;
+
+CREATE CONSTRAINT TRIGGER table_version_marks_flush AFTER INSERT ON table_version_marks
+DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION flush_table_versions('products', 'suppliers');
+"""
+
+ROW_FLUSH_SQL = """
+DROP TRIGGER table_version_marks_flush ON table_version_marks;
+
+CREATE OR REPLACE FUNCTION mark_table_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM set_config('app_shop.changes_' || TG_TABLE_NAME, nextval('table_versions_seq')::text, true);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION flush_table_versions() RETURNS trigger AS $$
+DECLARE
+    changed text[];
+BEGIN
+    SELECT array_agg(name ORDER BY name) INTO changed FROM unnest(TG_ARGV) AS name
+    WHERE COALESCE(NULLIF(current_setting('app_shop.changes_' || name, true), ''), '0') <> '0';
+    IF changed IS NULL THEN
+        RETURN NULL;
+    END IF;
+    INSERT INTO table_versions (table_name, version, changed_at)
+    SELECT name, nextval('table_versions_seq'), clock_timestamp() FROM unnest(changed) AS name ORDER BY name
+    ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version, changed_at = EXCLUDED.changed_at;
+    PERFORM set_config('app_shop.changes_' || name, '0', true) FROM unnest(changed) AS name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER suppliers_table_version AFTER INSERT OR UPDATE OR DELETE ON suppliers
+DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION flush_table_versions('products', 'suppliers');
+CREATE CONSTRAINT TRIGGER products_table_version AFTER INSERT OR UPDATE OR DELETE ON products
+DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION flush_table_versions('products', 'suppliers');
+
+DROP TABLE table_version_marks;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0016_supplier_rollups_bigint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(VERSION_MARKS_SQL, ROW_FLUSH_SQL),
+    ]
@@ -0,0 +1,154 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:10
+
+from importlib import import_module
+
+from django.db import migrations
+
+from app_shop.managers import REBUILD_ROLLUPS_SQL
+
+# Звено, помеченное удаленным, перестает входить в задолженность и количество потомков предков:
+# пометка и снятие пометки - такие же изменения вклада звена, как изменение долга.
+# Вклад помеченного звена при переносе и удалении - только его потомки.
+# Глубина поддерева по-прежнему считается по всем звеньям дерева.
+UPDATE_ROLLUPS_SQL = """
+CREATE OR REPLACE FUNCTION init_supplier_rollups() RETURNS trigger AS $$
+BEGIN
+    NEW.subtree_debt := CASE WHEN NEW.deleted_at IS NULL THEN NEW.debt ELSE 0 END;
+    NEW.descendant_count := 0;
+    NEW.subtree_depth := 0;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_supplier_rollups() RETURNS trigger AS $$
+DECLARE
+    starts bigint[];
+    debt_deltas numeric[];
+    count_deltas integer[];
+    depths integer[];
+    shrinks boolean[];
+    node_id bigint;
+BEGIN
+    IF pg_trigger_depth() > 1 THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(parent_id), array_agg(CASE WHEN deleted_at IS NULL THEN debt ELSE 0 END),
+               array_agg((deleted_at IS NULL)::integer), array_agg(1), array_agg(FALSE)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM new_rows WHERE parent_id IS NOT NULL;
+    ELSIF TG_OP = 'UPDATE' THEN
+        WITH changed AS (
+            SELECT updated.id, updated.parent_id, previous.parent_id AS previous_parent_id,
+                   CASE WHEN updated.deleted_at IS NULL THEN updated.debt ELSE 0 END AS own_debt,
+                   CASE WHEN previous.deleted_at IS NULL THEN previous.debt ELSE 0 END AS previous_own_debt,
+                   (updated.deleted_at IS NULL)::integer AS alive,
+                   (previous.deleted_at IS NULL)::integer AS previous_alive,
+                   previous.subtree_debt, previous.descendant_count, previous.subtree_depth
+            FROM new_rows AS updated JOIN old_rows AS previous ON previous.id = updated.id
+            WHERE updated.debt IS DISTINCT FROM previous.debt OR updated.parent_id IS DISTINCT FROM previous.parent_id
+               OR (updated.deleted_at IS NULL) <> (previous.deleted_at IS NULL)
+        )
+        SELECT array_agg(start_id), array_agg(debt_delta), array_agg(count_delta), array_agg(depth), array_agg(shrink)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM (
+            SELECT id AS start_id, own_debt - previous_own_debt AS debt_delta, 0 AS count_delta,
+                   NULL::integer AS depth, FALSE AS shrink
+            FROM changed WHERE own_debt <> previous_own_debt
+            UNION ALL
+            SELECT previous_parent_id, -subtree_debt, -(descendant_count + previous_alive), NULL, TRUE
+            FROM changed WHERE parent_id IS DISTINCT FROM previous_parent_id AND previous_parent_id IS NOT NULL
+            UNION ALL
+            SELECT parent_id, subtree_debt, descendant_count + previous_alive, subtree_depth + 1, FALSE
+            FROM changed WHERE parent_id IS DISTINCT FROM previous_parent_id AND parent_id IS NOT NULL
+            UNION ALL
+            SELECT parent_id, 0, alive - previous_alive, NULL, FALSE
+            FROM changed WHERE alive <> previous_alive AND parent_id IS NOT NULL
+        ) AS changes;
+    ELSE
+        SELECT array_agg(parent_id), array_agg(-subtree_debt),
+               array_agg(-(descendant_count + (deleted_at IS NULL)::integer)),
+               array_agg(NULL::integer), array_agg(TRUE)
+        INTO starts, debt_deltas, count_deltas, depths, shrinks
+        FROM old_rows WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM old_rows);
+    END IF;
+
+    IF starts IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH RECURSIVE changes AS (
+        SELECT * FROM unnest(starts, debt_deltas, count_deltas, depths)
+            WITH ORDINALITY AS change(start_id, debt_delta, count_delta, depth, no)
+    ), chain AS (
+        SELECT changes.no, suppliers.id, suppliers.parent_id, 0 AS distance
+        FROM changes JOIN suppliers ON suppliers.id = changes.start_id
+        UNION ALL
+        SELECT chain.no, suppliers.id, suppliers.parent_id, chain.distance + 1
+        FROM chain JOIN suppliers ON suppliers.id = chain.parent_id
+    ), deltas AS (
+        SELECT chain.id, SUM(changes.debt_delta) AS debt_delta, SUM(changes.count_delta) AS count_delta,
+               MAX(changes.depth + chain.distance) AS depth
+        FROM chain JOIN changes ON changes.no = chain.no
+        GROUP BY chain.id
+    ), locked AS (
+        SELECT suppliers.id FROM suppliers JOIN deltas ON deltas.id = suppliers.id ORDER BY suppliers.id FOR UPDATE
+    )
+    UPDATE suppliers
+    SET subtree_debt = subtree_debt + deltas.debt_delta,
+        descendant_count = descendant_count + deltas.count_delta,
+        subtree_depth = GREATEST(subtree_depth, COALESCE(deltas.depth, 0))
+    FROM deltas
+    WHERE suppliers.id = deltas.id AND suppliers.id IN (SELECT id FROM locked);
+
+    FOR node_id IN
+        WITH RECURSIVE chain AS (
+            SELECT suppliers.id, suppliers.parent_id, 0 AS distance
+            FROM unnest(starts, shrinks) AS change(start_id, shrink)
+            JOIN suppliers ON suppliers.id = change.start_id
+            WHERE change.shrink
+            UNION ALL
+            SELECT suppliers.id, suppliers.parent_id, chain.distance + 1
+            FROM chain JOIN suppliers ON suppliers.id = chain.parent_id
+        )
+        SELECT id FROM chain GROUP BY id ORDER BY MAX(distance)
+    LOOP
+        UPDATE suppliers SET subtree_depth = depth.value
+        FROM (
+            SELECT COALESCE(MAX(child.subtree_depth) + 1, 0) AS value FROM suppliers AS child
+            WHERE child.parent_id = node_id
+        ) AS depth
+        WHERE suppliers.id = node_id AND suppliers.subtree_depth <> depth.value;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+INIT_ROLLUPS_SQL = """
+CREATE OR REPLACE FUNCTION init_supplier_rollups() RETURNS trigger AS $$
+BEGIN
+    NEW.subtree_debt := NEW.debt;
+    NEW.descendant_count := 0;
+    NEW.subtree_depth := 0;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+previous = import_module('app_shop.migrations.0016_supplier_rollups_bigint')
+initial = import_module('app_shop.migrations.0007_supplier_rollups')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0017_table_version_marks'),
+    ]
+
+    operations = [
+        migrations.RunSQL(UPDATE_ROLLUPS_SQL, INIT_ROLLUPS_SQL + previous.UPDATE_ROLLUPS_SQL),
+        migrations.RunSQL(REBUILD_ROLLUPS_SQL.format(scope='TRUE'),
+                          initial.REBUILD_ROLLUPS_SQL.format(scope='TRUE')),
+    ]
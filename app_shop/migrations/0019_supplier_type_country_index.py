@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0018_supplier_rollups_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['type_supplier', 'country'], name='suppliers_type_country_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0019_supplier_type_country_index'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='TreeFixup',
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-17 13:20
+
+from django.db import migrations
+
+# Строки, нарушающие ограничения из 0008_supplier_check_constraints.
+VIOLATIONS_SQL = {
+    'suppliers_factory_without_parent': "type_supplier = 'factory' AND parent_id IS NOT NULL",
+    'suppliers_root_without_debt': 'parent_id IS NULL AND debt > 0',
+}
+
+REPORT_LIMIT = 20
+
+
+def validate_constraints(apps, schema_editor):
+    """
+    Проверяет существующие строки и помечает ограничения проверенными (VALIDATE CONSTRAINT).
+    Если нарушающие строки есть, миграция не падает: их id выводятся, а ограничение остается NOT VALID
+    и проверяет только новые и изменяемые строки. После исправления строк проверку повторяет
+    migrate app_shop 0020 && migrate app_shop.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        for name, condition in VIOLATIONS_SQL.items():
+            cursor.execute('SELECT id FROM suppliers WHERE {} ORDER BY id'.format(condition))
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                shown = ', '.join(map(str, ids[:REPORT_LIMIT])) + (', ...' if len(ids) > REPORT_LIMIT else '')
+                print('\n  {}: {} нарушающих строк (id: {}), ограничение не проверено'.format(name, len(ids), shown))
+                continue
+            cursor.execute('ALTER TABLE suppliers VALIDATE CONSTRAINT {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_shop', '0020_delete_treefixup'),
+    ]
+
+    operations = [
+        migrations.RunPython(validate_constraints, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,39 @@
 from typing import List, Tuple, Optional
 
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
 
+from app_shop.hierarchy import get_hierarchy
+from app_shop.managers import SupplierManager
+from app_shop.search import search_vector
 from app_shop.validators import validate_not_blank
 
+ERROR_FACTORY_PARENT_MSG = 'Ошибка: завод не может иметь родителя'
+ERROR_ROOT_DEBT_MSG = 'Ошибка: у звена без родителя не может быть долга'
+
 
 class Supplier(MPTTModel):
     """
     Модель поставщика или звена в сети доставки.
+
+    Итоги поддерева (subtree_debt, descendant_count, subtree_depth) ведет триггер базы данных
+    вдоль цепочки предков измененных звеньев, поэтому при сохранении звена они не записываются.
+    Звенья, помеченные удаленными, в задолженность и количество потомков не входят.
+
+    Правила иерархии (завод без родителя, звено без родителя без долга) - ограничения CHECK
+    в базе данных: они соблюдаются и при массовых изменениях через bulk_create и QuerySet.update.
+
+    Звено, помеченное удаленным (deleted_at), скрыто менеджером objects и остается в дереве
+    до фоновой очистки; all_objects возвращает все звенья.
     """
 
+    ROLLUP_FIELDS = ('subtree_debt', 'descendant_count', 'subtree_depth')
+
     TYPE_CHOICES = (
         ('factory', 'Завод'),
         ('retail', 'Розничная сеть'),
@@ -35,14 +55,54 @@ class Supplier(MPTTModel):
     parent = TreeForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children',
                             verbose_name='Поставщик')
 
+    sort_path = ArrayField(models.CharField(max_length=100), default=list, editable=False,
+                           verbose_name='Ключ сортировки')
+
+    subtree_debt = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                       verbose_name='Задолженность звена и потомков')
+    descendant_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество потомков')
+    subtree_depth = models.PositiveIntegerField(default=0, editable=False, verbose_name='Глубина поддерева')
+
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Время удаления')
+
+    objects = SupplierManager()
+    all_objects = SupplierManager(include_deleted=True)
+
     class MPTTMeta:
-        order_insertion_by = ['name']
+        order_insertion_by = ['name'] if settings.SUPPLIER_SORTED_INSERTION else []
 
     class Meta:
         verbose_name = 'Звено сети'
         verbose_name_plural = 'Звенья сети'
         db_table = 'suppliers'
         unique_together = (('country', 'city', 'name', 'email'),)
+        indexes = [
+            models.Index(fields=['sort_path'], name='suppliers_sort_path_idx'),
+            models.Index(fields=['tree_id', 'lft'], name='suppliers_tree_lft_idx'),
+            models.Index(fields=['subtree_debt'], name='suppliers_subtree_debt_idx'),
+            models.Index(fields=['descendant_count'], name='suppliers_descendant_count_idx'),
+            models.Index(fields=['created_at', 'id'], name='suppliers_created_idx'),
+            GinIndex(search_vector(), name='suppliers_search_idx'),
+            models.Index(fields=['city', 'country'], name='suppliers_city_country_idx'),
+            models.Index(fields=['country'], name='suppliers_country_idx'),
+            models.Index(fields=['type_supplier', 'debt'], name='suppliers_type_debt_idx'),
+            models.Index(fields=['type_supplier', 'country'], name='suppliers_type_country_idx'),
+            models.Index(fields=['debt'], name='suppliers_debt_idx'),
+            models.Index(fields=['deleted_at', 'id'], name='suppliers_deleted_idx',
+                         condition=models.Q(deleted_at__isnull=False)),
+        ]
+        constraints = [
+            models.CheckConstraint(check=~models.Q(type_supplier='factory', parent__isnull=False),
+                                   name='suppliers_factory_without_parent',
+                                   violation_error_message=ERROR_FACTORY_PARENT_MSG),
+            models.CheckConstraint(check=models.Q(parent__isnull=False) | models.Q(debt__lte=0),
+                                   name='suppliers_root_without_debt',
+                                   violation_error_message=ERROR_ROOT_DEBT_MSG),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sort_key = self._get_sort_key()
 
     def __str__(self):
         return f'{self.get_type_supplier_display()}: {self.name}'
@@ -50,22 +110,95 @@ class Supplier(MPTTModel):
     @classmethod
     def get_all_suppliers(cls) -> List['Supplier']:
         """
-        Возвращает список всех звеньев.
+        Возвращает список всех звеньев в порядке обхода сети:
+        каждое звено следует за родителем, соседние звенья упорядочены по названию.
         """
-        return cls.objects.all()
+        return cls.objects.order_by('sort_path')
 
-    def clean(self) -> None:
+    def _get_sort_key(self) -> tuple:
+        # Поля читаются из __dict__: у звена, загруженного через only(), они могут быть отложены.
+        return self.__dict__.get('parent_id'), self.__dict__.get('name')
+
+    def save(self, *args, **kwargs):
         """
-        Проверяет правила для поставщика:
-        - Завод не может иметь родителя.
-        - Звено без родителя не может иметь долга.
+        Сохраняет звено и при вставке, переименовании или переносе
+        обновляет ключ сортировки звена и его поддерева.
+
+        Вставка и перенос выполняются под блокировкой затронутых деревьев.
+        При вставке ключ сортировки записывается отдельным UPDATE только новой строки (лист без потомков);
+        сдвиг lft/rght соседей зависит от SUPPLIER_NESTED_SET_GAP, см. SupplierManager.
+        Итоги поддерева при обновлении не записываются: их ведет триггер.
         """
+        if self._state.adding:
+            self.subtree_debt, self.descendant_count, self.subtree_depth = self.debt or 0, 0, 0
+        elif self._sort_key == self._get_sort_key():
+            return super().save(*args, **kwargs)
+        elif kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.ROLLUP_FIELDS and field.attname not in deferred
+            ]
 
-        if self.type_supplier == 'factory' and self.parent:
-            raise ValidationError('Ошибка: завод не может иметь родителя')
+        tree_ids = []
+        if self._state.adding or self._sort_key[0] != self.parent_id:
+            tree_ids.append(Supplier.objects.filter(pk=self.parent_id).values_list('tree_id', flat=True).first())
+        with Supplier.objects.lock_trees(self, tree_ids=tree_ids):
+            super().save(*args, **kwargs)
+            Supplier.objects.update_sort_path(self)
+        self._sort_key = self._get_sort_key()
 
-        if not self.parent and (self.debt or 0) > 0:
-            raise ValidationError('Ошибка: у звена без родителя не может быть долга')
+    def _get_user_field_names(self) -> List[str]:
+        """
+        Поля, которые mptt записывает при сохранении звена без переноса, без итогов поддерева.
+        """
+        return [name for name in super()._get_user_field_names() if name not in self.ROLLUP_FIELDS]
+
+    def get_children(self):
+        """
+        Возвращает детей звена из выбранного хранилища иерархии, кроме помеченных удаленными.
+        """
+        return get_hierarchy().get_children(self).filter(deleted_at__isnull=True)
+
+    def get_descendants(self, include_self=False):
+        """
+        Возвращает потомков звена из выбранного хранилища иерархии, кроме помеченных удаленными.
+        """
+        return get_hierarchy().get_descendants(self, include_self=include_self).filter(deleted_at__isnull=True)
+
+    def get_ancestors(self, ascending=False, include_self=False):
+        """
+        Возвращает предков звена из выбранного хранилища иерархии, кроме помеченных удаленными.
+        """
+        return get_hierarchy().get_ancestors(self, ascending=ascending, include_self=include_self).filter(
+            deleted_at__isnull=True)
+
+    def get_level(self) -> int:
+        """
+        Возвращает уровень звена из выбранного хранилища иерархии.
+        """
+        return get_hierarchy().get_level(self)
+
+    def get_descendant_count(self) -> int:
+        """
+        Возвращает количество потомков. При разреженной нумерации
+        оно не выводится из ширины интервала и считается запросом.
+        """
+        if not Supplier.objects.gap:
+            return super().get_descendant_count()
+        return Supplier.objects.filter(tree_id=self.tree_id, lft__gt=self.lft, lft__lt=self.rght).count()
+
+    @classmethod
+    def constraint_error(cls, error: IntegrityError) -> Optional[str]:
+        """
+        Возвращает сообщение нарушенного ограничения CHECK звена или None,
+        если ошибка вызвана не им.
+        """
+        name = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None)
+        for constraint in cls._meta.constraints:
+            if constraint.name == name:
+                return constraint.get_violation_error_message()
+        return None
 
     def can_be_deleted(self) -> Tuple[bool, Optional['Supplier']]:
         """
@@ -77,31 +210,38 @@ class Supplier(MPTTModel):
         if self.debt > 0:
             return False, self
 
-        if not self.children.exists():
-            return True, None
+        debtor = Supplier.objects.filter(pk=self.pk).deletion_blockers().get(self.pk)
+        return debtor is None, debtor
 
-        for child in self.children.all():
-            if child.debt > 0 and child.level == self.level + 1:
-                return False, child
 
-        return True, None
+# Менеджер дерева mptt (перечитывание полей дерева, сдвиги интервалов при удалении) должен
+# видеть и звенья, помеченные удаленными: они остаются в дереве до очистки.
+Supplier._tree_manager = Supplier.all_objects
 
 
 class Product(models.Model):
     """
     Модель продукта.
+
+    Продукты удаляются вместе с поставщиком каскадом ON DELETE CASCADE внешнего ключа
+    в базе данных (миграция 0009), поэтому Django не загружает и не удаляет их сам:
+    удаление поставщика - один DELETE, сколько бы продуктов у него ни было.
     """
 
     name = models.CharField(max_length=100, verbose_name='Название', validators=[validate_not_blank])
     model = models.CharField(max_length=100, verbose_name='Модель', validators=[validate_not_blank])
     release_date = models.DateField(verbose_name='Дата выхода на рынок')
-    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, verbose_name='Поставщик')
+    supplier = models.ForeignKey(Supplier, on_delete=models.DO_NOTHING, verbose_name='Поставщик')
 
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
         db_table = 'products'
         unique_together = (('name', 'model', 'release_date', 'supplier'),)
+        indexes = [
+            models.Index(fields=['supplier', 'release_date'], name='products_supplier_release_idx'),
+            models.Index(fields=['release_date'], name='products_release_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -109,6 +249,77 @@ class Product(models.Model):
     @classmethod
     def get_all_products(cls):
         """
-        Возвращает список всех продуктов.
+        Возвращает список всех продуктов, кроме продуктов звеньев, помеченных удаленными.
         """
-        return cls.objects.all()
+        return cls.objects.filter(supplier__deleted_at__isnull=True)
+
+
+class SupplierClosure(models.Model):
+    """
+    Таблица замыкания иерархии звеньев: пара предок-потомок с расстоянием между ними.
+    Используется стратегией хранения иерархии 'closure'.
+    """
+
+    ancestor = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='descendant_links',
+                                 verbose_name='Предок')
+    descendant = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='ancestor_links',
+                                   verbose_name='Потомок')
+    depth = models.PositiveIntegerField(verbose_name='Расстояние')
+
+    class Meta:
+        verbose_name = 'Связь предок-потомок'
+        verbose_name_plural = 'Связи предок-потомок'
+        db_table = 'supplier_closure'
+        unique_together = (('ancestor', 'descendant'),)
+        indexes = [models.Index(fields=['descendant', 'depth'], name='supplier_closure_desc_idx')]
+
+
+class SupplierPath(models.Model):
+    """
+    Материализованный путь звена от корня в виде '1/5/9/'.
+    Используется стратегией хранения иерархии 'path'.
+    """
+
+    supplier = models.OneToOneField(Supplier, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='hierarchy_path', verbose_name='Звено')
+    path = models.CharField(max_length=255, verbose_name='Путь')
+    depth = models.PositiveIntegerField(verbose_name='Уровень')
+
+    class Meta:
+        verbose_name = 'Путь звена'
+        verbose_name_plural = 'Пути звеньев'
+        db_table = 'supplier_paths'
+        indexes = [models.Index(fields=['path'], name='supplier_paths_path_idx', opclasses=['varchar_pattern_ops'])]
+
+
+class TreeVersion(models.Model):
+    """
+    Версия дерева звеньев: увеличивается триггером базы данных при любом изменении строк дерева.
+    По версии кэшируются ответы, зависящие только от одного дерева.
+    """
+
+    tree_id = models.PositiveIntegerField(primary_key=True, verbose_name='Дерево')
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия дерева'
+        verbose_name_plural = 'Версии деревьев'
+        db_table = 'supplier_tree_versions'
+
+
+class TableVersion(models.Model):
+    """
+    Версия таблицы: триггер базы данных присваивает новую версию из последовательности и время изменения
+    при фиксации транзакции, изменившей строки таблицы - сохранением и удалением, QuerySet.update,
+    bulk_create, перестройкой дерева и каскадным удалением. Строка блокируется только на время фиксации,
+    поэтому пишущие транзакции не ждут друг друга. По версиям кэшируются ответы API.
+    """
+
+    table_name = models.CharField(max_length=63, primary_key=True, verbose_name='Таблица')
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+    changed_at = models.DateTimeField(verbose_name='Время изменения')
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+        db_table = 'table_versions'
@@ -0,0 +1,235 @@
+"""
+Онлайн-перестроение nested set звеньев сети.
+
+Supplier.objects.rebuild() переписывает lft/rght/level/tree_id всех строк
+в одной транзакции и держит блокировки строк до ее конца. Здесь новые значения
+вычисляются по снимку таблицы во временную теневую таблицу без блокировок,
+затем догоняются изменения, сделанные за это время, и только в конце
+в короткой транзакции блокируются структура всех деревьев и запись в таблицу
+(чтение продолжается), догоняются последние изменения и значения переносятся одним UPDATE.
+"""
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Set
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from app_shop.coordinator import all_trees_lock
+from app_shop.integrity import children_map, number_subtree
+
+SHADOW_TABLE = 'supplier_tree_shadow'
+
+TREE_COLUMNS = 'id, parent_id, tree_id, lft, rght, level'
+
+CREATE_SHADOW_SQL = f"""
+CREATE TEMPORARY TABLE {SHADOW_TABLE} (
+    id bigint PRIMARY KEY,
+    root_id bigint NOT NULL,
+    tree_id integer,
+    lft integer NOT NULL,
+    rght integer NOT NULL,
+    level integer NOT NULL,
+    seen_parent_id bigint,
+    seen_tree_id integer NOT NULL,
+    seen_lft integer NOT NULL,
+    seen_rght integer NOT NULL,
+    seen_level integer NOT NULL
+)
+"""
+
+# Строки, структура которых изменилась после снимка, и новые строки.
+CHANGED_SQL = f"""
+SELECT supplier.id
+FROM suppliers AS supplier LEFT JOIN {SHADOW_TABLE} AS shadow ON shadow.id = supplier.id
+WHERE shadow.id IS NULL
+   OR (supplier.parent_id, supplier.tree_id, supplier.lft, supplier.rght, supplier.level)
+      IS DISTINCT FROM
+      (shadow.seen_parent_id, shadow.seen_tree_id, shadow.seen_lft, shadow.seen_rght, shadow.seen_level)
+"""
+
+# Корни из снимка, к которым относились измененные или удаленные строки.
+STALE_ROOTS_SQL = f"""
+SELECT DISTINCT shadow.root_id
+FROM {SHADOW_TABLE} AS shadow LEFT JOIN suppliers AS supplier ON supplier.id = shadow.id
+WHERE supplier.id IS NULL
+   OR (supplier.parent_id, supplier.tree_id, supplier.lft, supplier.rght, supplier.level)
+      IS DISTINCT FROM
+      (shadow.seen_parent_id, shadow.seen_tree_id, shadow.seen_lft, shadow.seen_rght, shadow.seen_level)
+"""
+
+# Текущие корни звеньев по связям parent.
+CURRENT_ROOTS_SQL = """
+WITH RECURSIVE up AS (
+    SELECT id, parent_id FROM suppliers WHERE id = ANY(%s)
+    UNION
+    SELECT suppliers.id, suppliers.parent_id FROM suppliers JOIN up ON suppliers.id = up.parent_id
+)
+SELECT id FROM up WHERE parent_id IS NULL
+"""
+
+SUBTREES_SQL = f"""
+WITH RECURSIVE subtree AS (
+    SELECT {TREE_COLUMNS} FROM suppliers WHERE id = ANY(%s) AND parent_id IS NULL
+    UNION ALL
+    SELECT suppliers.id, suppliers.parent_id, suppliers.tree_id, suppliers.lft, suppliers.rght, suppliers.level
+    FROM suppliers JOIN subtree ON suppliers.parent_id = subtree.id
+)
+SELECT {TREE_COLUMNS} FROM subtree
+"""
+
+ASSIGN_TREE_IDS_SQL = f"""
+UPDATE {SHADOW_TABLE} AS shadow SET tree_id = numbered.tree_id
+FROM (
+    SELECT root_id, (SELECT COALESCE(MAX(tree_id), 0) FROM suppliers) + ROW_NUMBER() OVER (ORDER BY root_id) AS tree_id
+    FROM (SELECT DISTINCT root_id FROM {SHADOW_TABLE} WHERE tree_id IS NULL) AS roots
+) AS numbered
+WHERE shadow.root_id = numbered.root_id
+"""
+
+SWAP_SQL = f"""
+UPDATE suppliers AS supplier
+SET tree_id = shadow.tree_id, lft = shadow.lft, rght = shadow.rght, level = shadow.level
+FROM {SHADOW_TABLE} AS shadow
+WHERE supplier.id = shadow.id
+  AND (supplier.tree_id, supplier.lft, supplier.rght, supplier.level)
+      IS DISTINCT FROM (shadow.tree_id, shadow.lft, shadow.rght, shadow.level)
+"""
+
+
+@dataclass
+class RebuildResult:
+    """
+    Итог онлайн-перестроения.
+    """
+
+    nodes: int = 0
+    rows: int = 0
+    passes: int = 0
+    seconds: float = 0
+    lock_seconds: float = 0
+
+
+class OnlineRebuild:
+    """
+    Онлайн-перестроение: snapshot(), несколько catch_up() и swap().
+
+    Для каждого звена в теневой таблице хранятся вычисленные значения,
+    корень, от которого они вычислены, и значения структуры из снимка.
+    Изменившиеся с тех пор строки делают «грязными» свои прежний и текущий корни,
+    деревья этих корней пересчитываются заново по связям parent.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, max_passes: int = 5, swap_threshold: int = 100, lock_timeout: str = '5s'):
+        self.max_passes = max_passes
+        self.swap_threshold = swap_threshold
+        self.lock_timeout = lock_timeout
+        self.step = getattr(settings, 'SUPPLIER_NESTED_SET_GAP', 0) or 1
+        self.result = RebuildResult()
+
+    def run(self, attempts: int = 3) -> RebuildResult:
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SHADOW_TABLE}')
+            cursor.execute(CREATE_SHADOW_SQL)
+        try:
+            self.snapshot()
+            while self.result.passes < self.max_passes and self.catch_up() > self.swap_threshold:
+                pass
+            for attempt in range(attempts):
+                try:
+                    self.swap()
+                    break
+                except OperationalError:
+                    if attempt == attempts - 1:
+                        raise
+                    self.catch_up()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {SHADOW_TABLE}')
+        self.result.seconds = time.perf_counter() - started
+        return self.result
+
+    def snapshot(self) -> None:
+        """
+        Вычисляет значения для всей таблицы по согласованному снимку без блокировок строк.
+        Структура таблицы (id, parent_id и поля дерева) читается в память целиком.
+        """
+        outermost = not connection.in_atomic_block
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if outermost:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                cursor.execute(f'SELECT {TREE_COLUMNS} FROM suppliers')
+                nodes = cursor.fetchall()
+            self._store(nodes, [node for node in nodes if node[1] is None], set())
+        self.result.nodes = len(nodes)
+
+    def catch_up(self) -> int:
+        """
+        Пересчитывает деревья, затронутые изменениями после снимка или прошлого прохода.
+        Возвращает количество пересчитанных корней.
+        """
+        self.result.passes += 1
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(CHANGED_SQL)
+                changed = [pk for pk, in cursor.fetchall()]
+                cursor.execute(STALE_ROOTS_SQL)
+                dirty = {pk for pk, in cursor.fetchall()}
+                if changed:
+                    cursor.execute(CURRENT_ROOTS_SQL, [changed])
+                    dirty |= {pk for pk, in cursor.fetchall()}
+                if not dirty:
+                    return 0
+
+                cursor.execute(f'DELETE FROM {SHADOW_TABLE} WHERE root_id = ANY(%s) OR id = ANY(%s)',
+                               [list(dirty), changed])
+                cursor.execute(f'SELECT DISTINCT tree_id FROM {SHADOW_TABLE}')
+                taken = {tree_id for tree_id, in cursor.fetchall()}
+                cursor.execute(SUBTREES_SQL, [list(dirty)])
+                nodes = cursor.fetchall()
+            self._store(nodes, [node for node in nodes if node[0] in dirty], taken)
+        return len(dirty)
+
+    def swap(self) -> None:
+        """
+        Блокирует структуру всех деревьев и таблицу от записи, догоняет последние изменения
+        и переносит значения одним UPDATE.
+
+        Блокировка всех деревьев дожидается изменений, которые уже держат блокировку своего дерева
+        и прочитали прежние границы, а новые изменения прочитают границы после переноса.
+        """
+        started = time.perf_counter()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL lock_timeout = %s', [self.lock_timeout])
+            with all_trees_lock(), connection.cursor() as cursor:
+                cursor.execute('LOCK TABLE suppliers IN SHARE ROW EXCLUSIVE MODE')
+                self.catch_up()
+                cursor.execute(ASSIGN_TREE_IDS_SQL)
+                cursor.execute(SWAP_SQL)
+                self.result.rows = cursor.rowcount
+        self.result.lock_seconds = time.perf_counter() - started
+
+    def _store(self, nodes: List[tuple], roots: Iterable[tuple], taken: Set[int]) -> None:
+        """
+        Нумерует поддеревья roots и записывает результат в теневую таблицу.
+        Корень сохраняет свой tree_id, если его не занял другой корень, иначе tree_id назначается при swap.
+        """
+        children = children_map(nodes)
+        seen = {node[0]: node for node in nodes}
+        rows = []
+        for root in sorted(roots, key=lambda node: (node[2], node[3], node[0])):
+            tree_id = None if root[2] in taken else root[2]
+            taken.add(root[2])
+            for pk, left, right, level in number_subtree(children, root, self.step):
+                rows.append((pk, root[0], tree_id, left, right, level, *seen[pk][1:]))
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+                cursor.execute(f'INSERT INTO {SHADOW_TABLE} VALUES {placeholders}',
+                               [value for row in batch for value in row])
@@ -0,0 +1,141 @@
+"""
+Постраничный вывод списков по ключу (keyset).
+
+Страница читается условием "строки после последней выведенной" по полям сортировки списка
+и LIMIT, а не OFFSET: стоимость страницы не зависит от того, насколько далеко клиент пролистал,
+если сортировку поддерживает индекс, например (created_at, id) для звеньев. Поля сортировки
+дополняются id, поэтому порядок строгий, и вставки между запросами не приводят к повторам
+или пропускам уже существующих строк.
+
+Токен следующей страницы хранит сортировку и значения ее полей у последней строки и подписан,
+как токен продолжения поддерева.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q, QuerySet, Value
+from django.db.models.functions import Cast
+from rest_framework import serializers
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+CURSOR_SALT = 'app_shop.pagination'
+ERROR_CURSOR_MSG = 'Ошибка: недействительный курсор'
+
+
+def after_filter(queryset: QuerySet, ordering: Tuple[str, ...], values: list) -> Q:
+    """
+    Возвращает условие "строка после values" для сортировки ordering.
+
+    Первое поле дополнительно ограничено нестрогим неравенством: по нему выполняется
+    поиск диапазона в индексе, остальная часть условия проверяется для строк диапазона.
+    Значения приводятся к типам полей (или аннотаций, например rank поиска),
+    иначе массив sort_path не сравнивается с параметром.
+    """
+    condition = None
+    for name, value in reversed(list(zip(ordering, values))):
+        field = name.lstrip('-')
+        value = Cast(Value(value), output_field=output_field(queryset, field))
+        after = Q(**{f'{field}__{"lt" if name.startswith("-") else "gt"}': value})
+        condition = after if condition is None else after | Q(**{field: value}) & condition
+        bound = Q(**{f'{field}__{"lte" if name.startswith("-") else "gte"}': value})
+    return bound & condition
+
+
+def output_field(queryset: QuerySet, name: str):
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    return queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу с параметрами cursor и page_size.
+
+    Сортировка берется из набора (после OrderingFilter), без сортировки - по id.
+    Размер страницы задается параметром page_size и ограничен API_MAX_PAGE_SIZE.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_ordering = ('id',)
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(after_filter(queryset, self.ordering, self.decode_cursor(cursor)))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.API_PAGE_SIZE
+        if page_size < 1:
+            return settings.API_PAGE_SIZE
+        return min(page_size, settings.API_MAX_PAGE_SIZE)
+
+    def get_ordering(self, queryset: QuerySet) -> Tuple[str, ...]:
+        """
+        Возвращает сортировку набора, дополненную id в направлении последнего поля.
+        """
+        ordering = tuple(queryset.query.order_by) or self.default_ordering
+        if not any(name.lstrip('-') in ('id', 'pk') for name in ordering):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def encode_cursor(self, row) -> str:
+        values = []
+        for name in self.ordering:
+            value = getattr(row, name.lstrip('-'))
+            if isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return signing.dumps([self.ordering, values], salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor: str) -> list:
+        """
+        Возвращает значения полей сортировки из курсора. Курсор другой сортировки
+        или с нарушенной подписью отклоняется.
+        """
+        try:
+            ordering, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise serializers.ValidationError({self.cursor_query_param: [ERROR_CURSOR_MSG]})
+        if tuple(ordering) != self.ordering or len(values) != len(self.ordering):
+            raise serializers.ValidationError({self.cursor_query_param: [ERROR_CURSOR_MSG]})
+        return values
@@ -0,0 +1,109 @@
+"""
+Фоновая очистка звеньев, помеченных удаленными.
+
+При мягком удалении (SUPPLIER_SOFT_DELETE) запрос только помечает звено. Очистка обрабатывает
+помеченные звенья в порядке пометки: продукты звена удаляются порциями, каждая в своей транзакции,
+затем под блокировкой дерева дети звена переназначаются на его родителя, строка удаляется
+и промежуток в интервалах дерева закрывается.
+
+Очередью служат сами помеченные строки, поэтому после сбоя очистка продолжается с того же места:
+удаленные порции продуктов и звенья не обрабатываются повторно. Несколько обработчиков могут
+работать одновременно: звено, уже очищенное другим обработчиком, пропускается.
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.db import connection, transaction
+
+from app_shop.models import Supplier
+
+PURGE_PRODUCTS_SQL = """
+DELETE FROM products WHERE id IN (
+    SELECT id FROM products WHERE supplier_id = %s LIMIT %s FOR UPDATE SKIP LOCKED
+)
+"""
+
+
+@dataclass
+class PurgeProgress:
+    """
+    Ход очистки: помечено звеньев на начало, очищено, восстановлено (удаление стало невозможным),
+    удалено продуктов и затраченное время.
+    """
+
+    total: int = 0
+    purged: int = 0
+    restored: int = 0
+    products: int = 0
+    seconds: float = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.purged + self.restored
+
+
+def purge_products(supplier_id: int, batch_size: int) -> int:
+    """
+    Удаляет продукты звена порциями по batch_size строк и возвращает их количество.
+    Каждая порция - отдельная короткая транзакция.
+    """
+    deleted = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(PURGE_PRODUCTS_SQL, [supplier_id, batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def purge_supplier(pk: int) -> Optional[bool]:
+    """
+    Переназначает детей помеченного звена на его родителя и удаляет звено.
+
+    Возвращает True, если звено удалено, False, если после пометки у его детей появился долг
+    и пометка снята, и None, если звено уже очищено или пометка снята раньше.
+    """
+    node = Supplier.all_objects.filter(pk=pk, deleted_at__isnull=False).first()
+    if node is None:
+        return None
+    with Supplier.all_objects.lock_trees(node, tree_ids=[None] if node.parent_id is None else []):
+        marked = Supplier.all_objects.filter(pk=pk, deleted_at__isnull=False)
+        if not marked.exists():
+            return None
+        if marked.deletion_blockers(include_deleted=True):
+            marked.update(deleted_at=None)
+            return False
+        Supplier.all_objects.reparent_children(node)
+        Supplier.all_objects.delete_node(node)
+    return True
+
+
+def purge_deleted(batch_size: int = 100, product_batch_size: int = 10000, limit: Optional[int] = None,
+                  progress: Optional[Callable[[PurgeProgress], None]] = None) -> PurgeProgress:
+    """
+    Очищает помеченные звенья порциями по batch_size, не больше limit звеньев,
+    и после каждой порции передает ход очистки в progress.
+    """
+    started = time.perf_counter()
+    marked = Supplier.all_objects.filter(deleted_at__isnull=False)
+    result = PurgeProgress(total=marked.count())
+    while limit is None or result.processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - result.processed)
+        ids = list(marked.order_by('deleted_at', 'id').values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        for pk in ids:
+            # продукты звена, удаление которого стало невозможным, сохраняются
+            if not Supplier.all_objects.filter(pk=pk).deletion_blockers(include_deleted=True):
+                result.products += purge_products(pk, product_batch_size)
+            outcome = purge_supplier(pk)
+            if outcome is not None:
+                result.purged += outcome
+                result.restored += not outcome
+        result.seconds = time.perf_counter() - started
+        if progress is not None:
+            progress(result)
+    result.seconds = time.perf_counter() - started
+    return result
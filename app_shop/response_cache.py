@@ -0,0 +1,152 @@
+"""
+Кэш ответов списков и отдельных объектов API по версиям таблиц.
+
+Ключ ответа - путь с отсортированными параметрами запроса и версии таблиц, от которых зависит ответ.
+Версию таблицы при фиксации любой транзакции, изменившей ее строки, меняет триггер базы данных
+(см. TableVersion), поэтому кэш сбрасывается и при изменениях в обход сигналов моделей: QuerySet.update
+(clear_debt в админке), bulk_create, перестройке дерева, очистке удаленных звеньев и каскадном удалении
+продуктов. Версии берутся из последовательности и после отката транзакции не повторяются.
+Запрос внутри транзакции, которая сама изменила таблицу, видит еще не зафиксированные изменения:
+к версии такой таблицы добавляется номер из той же последовательности, полученный последним
+изменившим ее оператором.
+
+В кэше хранится уже сериализованный и сжатый gzip JSON: при попадании запрос читает только версии
+таблиц, а тело отдается клиенту без распаковки, если клиент принимает gzip.
+
+Из тех же версий строятся строгий ETag (версии таблиц и кодировка тела) и Last-Modified (время
+последнего изменения таблиц). Условный запрос (If-None-Match, If-Modified-Since) с неизменившимися
+версиями получает 304 сразу после чтения версий, до обращения к кэшу и выборки данных. Для отдельного
+объекта перед 304 проверяется по ключу, что он существует (и не помечен удаленным): версии таблиц
+одинаковы для всех ключей, и без этой проверки несуществующий объект получил бы 304 вместо 404.
+Last-Modified имеет точность в секунду, поэтому клиентам лучше опрашивать по ETag.
+"""
+import gzip
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, urlencode
+from django.utils.text import compress_string
+from rest_framework import status
+from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
+
+from app_shop.models import TableVersion
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+TABLE_VERSIONS_SQL = """
+SELECT tables.table_name, COALESCE(versions.version, 0), versions.changed_at,
+       NULLIF(current_setting('app_shop.changes_' || tables.table_name, true), '')
+FROM unnest(%s::text[]) AS tables(table_name)
+LEFT JOIN {table} AS versions ON versions.table_name = tables.table_name
+""".format(table=TableVersion._meta.db_table)
+
+
+def table_versions(tables: Iterable[str]) -> Dict[str, Tuple[str, Optional[datetime]]]:
+    """
+    Возвращает {таблица: (версия, время изменения)} одним запросом по первичному ключу.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_VERSIONS_SQL, [list(tables)])
+        rows = cursor.fetchall()
+    versions = {}
+    for table_name, version, changed_at, changes in rows:
+        pending = f'~{changes}' if changes not in (None, '0') else ''
+        versions[table_name] = (f'{version}{pending}', changed_at)
+    return versions
+
+
+class CachedResponseMixin:
+    """
+    Кэширует ответы list и retrieve набора представлений в формате JSON по версиям таблиц cache_tables.
+    Кэшируются только успешные ответы, ответы в других форматах (Browsable API) строятся заново.
+    """
+
+    cache_tables: Tuple[str, ...] = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, build, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return build(request, *args, **kwargs)
+
+        versions = table_versions(self.cache_tables)
+        gzipped = bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        etag = self.etag(versions, gzipped)
+        last_modified = self.last_modified(versions)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            if self.detail:
+                self.resolve_object()
+            return self.with_validators(not_modified, etag, last_modified)
+
+        key = self.cache_key(request, versions)
+        body = cache.get(key)
+        if body is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = compress_string(JSONRenderer().render(response.data))
+            cache.set(key, body, settings.API_CACHE_TIMEOUT)
+        return self.with_validators(self.compressed_response(body, gzipped), etag, last_modified)
+
+    def resolve_object(self) -> None:
+        """
+        Проверяет одним запросом по ключу, что объект виден в queryset представления, иначе Http404.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).values('pk')
+        get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+    def cache_key(self, request, versions: Dict[str, Tuple[str, Optional[datetime]]]) -> str:
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.sha256(f'{request.build_absolute_uri(request.path)}?{params}'.encode()).hexdigest()
+        return f'api:{self.basename}:{self.version_tag(versions)}:{digest}'
+
+    @staticmethod
+    def version_tag(versions: Dict[str, Tuple[str, Optional[datetime]]]) -> str:
+        return '.'.join(f'{table}{version}' for table, (version, _) in sorted(versions.items()))
+
+    def etag(self, versions: Dict[str, Tuple[str, Optional[datetime]]], gzipped: bool) -> str:
+        """
+        Строгий ETag: одинаковые версии таблиц и кодировка дают побайтно одинаковое тело.
+        """
+        return '"{}{}"'.format(self.version_tag(versions), '-gzip' if gzipped else '')
+
+    @staticmethod
+    def last_modified(versions: Dict[str, Tuple[str, Optional[datetime]]]) -> Optional[int]:
+        changed = [changed_at for _, changed_at in versions.values() if changed_at is not None]
+        return int(max(changed).timestamp()) if changed else None
+
+    @staticmethod
+    def with_validators(response: HttpResponse, etag: str, last_modified: Optional[int]) -> HttpResponse:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @staticmethod
+    def compressed_response(body: bytes, gzipped: bool) -> HttpResponse:
+        """
+        Отдает сжатое тело как есть, если клиент принимает gzip, иначе распаковывает его.
+        """
+        if gzipped:
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type='application/json')
+        return response
@@ -0,0 +1,34 @@
+"""
+Полнотекстовый поиск звеньев.
+
+Поиск выполняется по полнотекстовому индексу (GIN по tsvector названия, страны, города,
+улицы и email), а не сравнением ILIKE '%...%' с каждой строкой таблицы. Каждое слово запроса
+ищется как префикс слова звена.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchVector
+
+SEARCH_FIELDS = ('name', 'country', 'city', 'street', 'email')
+SEARCH_CONFIG = 'simple'
+
+
+def search_vector() -> SearchVector:
+    """
+    Выражение полнотекстового индекса звеньев. Запрос использует индекс,
+    только если выражение в нем совпадает с выражением индекса.
+    """
+    return SearchVector(*SEARCH_FIELDS, config=SEARCH_CONFIG)
+
+
+def prefix_query(text: str):
+    """
+    Возвращает запрос, в котором каждое слово text - префикс, или None, если слов нет.
+
+    Слова передаются в кавычках: разбор на лексемы выполняет тот же парсер, что и при
+    построении индекса (например, email остается одной лексемой), а символы операторов
+    tsquery в словах не действуют.
+    """
+    words = text.split()
+    if not words:
+        return None
+    quoted = ("'{}':*".format(word.replace('\\', '\\\\').replace("'", "''")) for word in words)
+    return SearchQuery(' & '.join(quoted), search_type='raw', config=SEARCH_CONFIG)
@@ -1,47 +1,103 @@
 from typing import Dict, Any
 
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
 from .models import Supplier, Product
+from .sparse_fields import SparseFieldsSerializerMixin
 
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Supplier.
 
     Поле debt (задолженность перед поставщиком) недоступно для обновления через API.
+    Уникальность проверяется и среди звеньев, помеченных удаленными: их строки еще в таблице.
+    Параметры fields и omit GET-запроса сокращают набор полей ответа.
     """
 
     class Meta:
         model = Supplier
-        fields = '__all__'
+        exclude = ('sort_path', 'deleted_at')
         read_only_fields = ('created_at',)
+        validators = [
+            UniqueTogetherValidator(queryset=Supplier.all_objects.all(), fields=('country', 'city', 'name', 'email')),
+        ]
 
     def validate(self, data):
         """
-        Проверяет корректность вводимых данных:
-        - Запрещает изменение значения долга через API.
-        - Завод не может иметь родителя.
-        - Звено без родителя не может иметь долга.
-        """
-        type_supplier = data.get('type_supplier', self.instance.type_supplier if self.instance else None)
-        parent = data.get('parent', self.instance.parent if self.instance else None)
-        debt = data.get('debt', self.instance.debt if self.instance else 0)
+        Запрещает изменение значения долга через API.
 
-        if self.instance and 'debt' in data and debt != self.instance.debt:
+        Правила иерархии (завод без родителя, звено без родителя без долга) проверяет база данных
+        при сохранении, поэтому родитель звена для проверки не загружается.
+        """
+        if self.instance and 'debt' in data and data['debt'] != self.instance.debt:
             raise serializers.ValidationError('Ошибка: нельзя изменять значение долга через API')
-        if type_supplier == 'factory' and parent:
-            raise serializers.ValidationError('Ошибка: завод не может иметь родителя')
-        if not parent and debt > 0:
-            raise serializers.ValidationError('Ошибка: у звена без родителя не может быть долга')
         return data
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Product.
+    Параметры fields и omit GET-запроса сокращают набор полей ответа.
     """
 
     class Meta:
         model = Product
         fields = '__all__'
+
+
+class SupplierMoveSerializer(serializers.Serializer):
+    """
+    Перенос звена вместе с поддеревом.
+
+    - id: переносимое звено (только в списке переносов).
+    - target: звено, относительно которого выполняется перенос, null - сделать звено первым звеном цепочки.
+    - position: позиция относительно target: first-child, last-child, left или right.
+    """
+
+    POSITIONS = ('first-child', 'last-child', 'left', 'right')
+
+    id = serializers.IntegerField(required=False)
+    target = serializers.IntegerField(allow_null=True)
+    position = serializers.ChoiceField(choices=POSITIONS, default='last-child')
+
+
+class SubtreeQuerySerializer(serializers.Serializer):
+    """
+    Параметры вложенного представления поддерева.
+
+    - depth: сколько уровней потомков выводить, по умолчанию все.
+    - breadth: сколько детей выводить у каждого звена, остальные доступны по токену продолжения.
+    - after: токен продолжения из поля next звена.
+    - chain: tree_id цепочки, дерево которой выводится целиком.
+    """
+
+    MAX_BREADTH = 1000
+
+    depth = serializers.IntegerField(min_value=0, required=False)
+    breadth = serializers.IntegerField(min_value=1, max_value=MAX_BREADTH, default=MAX_BREADTH)
+    after = serializers.CharField(required=False)
+    chain = serializers.IntegerField(min_value=1, required=False)
+
+
+class CommonAncestorQuerySerializer(serializers.Serializer):
+    """
+    Параметры поиска общего звена цепочек: other - второе звено.
+    """
+
+    other = serializers.IntegerField()
+
+
+class SupplierImportSerializer(serializers.ModelSerializer):
+    """
+    Поля звена при массовой загрузке.
+
+    Связи с родителями, правила иерархии и уникальность проверяются для всего документа сразу
+    (app_shop.bulk_import), поэтому валидаторы уникальности, выполняющие запрос на каждое звено, отключены.
+    """
+
+    class Meta:
+        model = Supplier
+        fields = ('type_supplier', 'name', 'email', 'country', 'city', 'street', 'house_number', 'debt')
+        validators = []
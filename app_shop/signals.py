@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from app_shop.hierarchy import get_hierarchy
+from app_shop.models import Supplier
+
+
+@receiver(post_save, sender=Supplier)
+def hierarchy_node_inserted(sender, instance, created, **kwargs):
+    """
+    Добавляет новое звено в дополнительное хранилище иерархии.
+    """
+    if created:
+        get_hierarchy().node_inserted(instance)
+
+
+@receiver(node_moved, sender=Supplier)
+def hierarchy_node_moved(sender, instance, **kwargs):
+    """
+    Переносит поддерево звена в дополнительном хранилище иерархии.
+    """
+    get_hierarchy().node_moved(instance)
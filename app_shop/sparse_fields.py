@@ -0,0 +1,86 @@
+"""
+Выборочные поля ответа: параметр fields оставляет в ответе только перечисленные поля,
+параметр omit исключает перечисленные (например, ?fields=id,name или ?omit=lft,rght,tree_id,level).
+
+Сериализатор выводит только выбранные поля, а набор звеньев или продуктов читает из базы данных
+только их столбцы (QuerySet.only), первичный ключ и поля сортировки, нужные для постраничного вывода.
+"""
+from typing import Iterable, Optional, Set
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+SPARSE_ACTIONS = ('list', 'retrieve')
+
+
+def _names(value: str) -> Set[str]:
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def is_sparse(query_params) -> bool:
+    return FIELDS_PARAM in query_params or OMIT_PARAM in query_params
+
+
+def selected_fields(query_params, available: Iterable[str]) -> Optional[Set[str]]:
+    """
+    Возвращает поля, выбранные параметрами fields и omit, или None, если параметров нет.
+    Неизвестные поля отклоняются.
+    """
+    if not is_sparse(query_params):
+        return None
+    available = set(available)
+    fields = _names(query_params[FIELDS_PARAM]) if FIELDS_PARAM in query_params else set(available)
+    omit = _names(query_params.get(OMIT_PARAM, ''))
+    errors = {param: [f'Ошибка: неизвестные поля: {", ".join(sorted(names - available))}']
+              for param, names in ((FIELDS_PARAM, fields), (OMIT_PARAM, omit)) if names - available}
+    if errors:
+        raise serializers.ValidationError(errors)
+    return fields - omit
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Оставляет в сериализаторе только поля, выбранные параметрами fields и omit запросов list и retrieve.
+    Ответы остальных действий (дерево, путь) кэшируются без учета этих параметров и выводятся полностью.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        view = self.context.get('view')
+        if request is None or getattr(view, 'action', None) not in SPARSE_ACTIONS:
+            return
+        fields = selected_fields(request.query_params, self.fields)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class SparseFieldsViewMixin:
+    """
+    Для list и retrieve читает из базы данных только столбцы полей сериализатора,
+    первичный ключ и поля сортировки набора.
+    """
+
+    def filter_queryset(self, queryset: QuerySet) -> QuerySet:
+        queryset = super().filter_queryset(queryset)
+        if self.action not in SPARSE_ACTIONS or not is_sparse(self.request.query_params):
+            return queryset
+        return queryset.only(*self.selected_columns(queryset))
+
+    def selected_columns(self, queryset: QuerySet) -> Set[str]:
+        model = queryset.model
+        names = {field.source for field in self.get_serializer().fields.values()}
+        names.update(name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str))
+        columns = {model._meta.pk.name}
+        for name in names:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete:
+                columns.add(name)
+        return columns
@@ -0,0 +1,86 @@
+"""
+Вложенное представление поддерева звеньев сети.
+
+Поддерево читается одним запросом по интервалу lft/rght в порядке lft
+(индекс (tree_id, lft)) и собирается за один проход со стеком открытых
+интервалов, как при проверке nested set. Глубина ограничивается условием
+на level в том же запросе. При ограничении ширины у звена выводятся первые
+breadth детей, а вместо остальных - токен продолжения: по нему следующий
+запрос читает только детей правее последнего выведенного.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.core import signing
+from django.db.models import QuerySet
+
+from app_shop.models import Supplier
+
+TOKEN_SALT = 'app_shop.subtree'
+
+
+def encode_token(parent_id: int, after: int) -> str:
+    """
+    Возвращает подписанный токен продолжения: дети parent_id с lft больше after.
+    """
+    return signing.dumps([parent_id, after], salt=TOKEN_SALT)
+
+
+def decode_token(token: str) -> Tuple[int, int]:
+    """
+    Возвращает (parent_id, after) из токена продолжения или выбрасывает signing.BadSignature.
+    """
+    parent_id, after = signing.loads(token, salt=TOKEN_SALT)
+    return parent_id, after
+
+
+def subtree_rows(root: Supplier, depth: Optional[int] = None, after: Optional[int] = None) -> QuerySet:
+    """
+    Возвращает потомков root в порядке lft одним запросом по интервалу,
+    не глубже depth уровней и, при after, только правее этой границы.
+    """
+    rows = Supplier.objects.filter(tree_id=root.tree_id, lft__gt=max(root.lft, after or 0), lft__lt=root.rght)
+    if depth is not None:
+        rows = rows.filter(level__lte=root.level + depth)
+    return rows.order_by('lft')
+
+
+def build_tree(root: Supplier, rows: QuerySet, serialize: Callable[[List[Supplier]], List[dict]],
+               breadth: Optional[int] = None) -> dict:
+    """
+    Собирает вложенное представление root за один проход по rows.
+
+    Звенья сначала раскладываются по родителям, затем сериализуются одним вызовом serialize,
+    поэтому потомки, не попавшие в ответ из-за ограничения ширины, не сериализуются.
+    """
+    nodes = [root]
+    parents: List[Optional[int]] = [None]
+    next_after: Dict[int, int] = {}
+    children_count = {0: 0}
+    stack = [(root, 0)]
+    skip_until = None
+
+    for node in rows.iterator():
+        if skip_until is not None and node.lft < skip_until:
+            continue
+        skip_until = None
+        while stack[-1][0].rght < node.lft:
+            stack.pop()
+        parent, parent_index = stack[-1]
+        if breadth is not None and children_count[parent_index] >= breadth:
+            next_after.setdefault(parent_index, node.lft - 1)
+            skip_until = node.rght
+            continue
+        children_count[parent_index] += 1
+        children_count[len(nodes)] = 0
+        stack.append((node, len(nodes)))
+        nodes.append(node)
+        parents.append(parent_index)
+
+    items = serialize(nodes)
+    for index, item in enumerate(items):
+        item['children'] = []
+        if index in next_after:
+            item['next'] = encode_token(nodes[index].pk, next_after[index])
+        if parents[index] is not None:
+            items[parents[index]]['children'].append(item)
+    return items[0]
@@ -0,0 +1,110 @@
+from django.db import connection
+from django.test import override_settings
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.hierarchy import get_hierarchy
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierBulkImportAPITestCase(BaseTestCase):
+    """Массовая загрузка цепочек звеньев"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+
+    def supplier(self, index, type_supplier='entrepreneur', **fields):
+        return {**self.ENT_DATA, 'type_supplier': type_supplier, 'name': f'ИП {index}',
+                'email': f'ent_{index}@example.com', **fields}
+
+    def post(self, document):
+        return self.user_client.post(f'{self.URL}import/', document, format='json')
+
+    def test_nested_and_referenced_suppliers_are_imported_with_fixed_number_of_queries(self):
+        """
+        Вложенные и связанные ссылками звенья вставляются одинаковым числом запросов независимо от размера,
+        перенумеровываются только затронутые деревья
+        """
+        queries = []
+        for size in (3, 30):
+            document = {'suppliers': [
+                {**self.supplier(f'{size}-f', 'factory'), 'ref': f'f{size}', 'children': [
+                    {**self.supplier(f'{size}-r', 'retail'), 'ref': f'r{size}'},
+                ]},
+                *({**self.supplier(f'{size}-{index}', debt=10), 'parent_ref': f'r{size}'} for index in range(size)),
+                {**self.supplier(f'{size}-old', debt=5), 'ref': f'old{size}', 'parent': self.retail.id},
+            ]}
+            with measure() as result:
+                response = self.post(document)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.json()['rows'], size + 3)
+            self.assertEqual((response.json()['trees'], response.json()['rebuilt_trees']), (1, 1))
+            queries.append(result.queries)
+
+            retail = Supplier.objects.get(id=response.json()['ids'][f'r{size}'])
+            self.assertEqual(retail.parent_id, response.json()['ids'][f'f{size}'])
+            self.assertEqual((retail.descendant_count, retail.subtree_debt), (size, 10 * size))
+            self.assertEqual(Supplier.objects.get(id=response.json()['ids'][f'old{size}']).parent_id, self.retail.id)
+
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(check_table().broken, set())
+        self.assertEqual(Supplier.objects.rebuild_rollups(), 0)
+        self.assertEqual(Supplier.objects.get(id=self.factory.id).subtree_debt, 10)
+        sort_paths = list(Supplier.get_all_suppliers().values_list('id', 'sort_path'))
+        Supplier.objects.rebuild_sort_paths()
+        self.assertEqual(list(Supplier.get_all_suppliers().values_list('id', 'sort_path')), sort_paths)
+
+    def test_closure_and_path_rows_are_added_for_new_suppliers(self):
+        """
+        Таблица замыкания и материализованный путь дополняются строками новых звеньев
+        так же, как при полном перестроении
+        """
+        columns = {'closure': 'ancestor_id, descendant_id, depth', 'path': 'supplier_id, path, depth'}
+        for name in ('closure', 'path'):
+            with self.subTest(name=name), override_settings(SUPPLIER_HIERARCHY=name):
+                hierarchy = get_hierarchy()
+                hierarchy.rebuild()
+                document = {'suppliers': [
+                    {**self.supplier(f'{name}-f', 'factory'), 'children': [
+                        {**self.supplier(f'{name}-r', 'retail'), 'children': [self.supplier(f'{name}-e')]},
+                    ]},
+                    {**self.supplier(f'{name}-old'), 'parent': self.retail.id,
+                     'children': [self.supplier(f'{name}-old-child')]},
+                ]}
+                self.assertEqual(self.post(document).status_code, status.HTTP_201_CREATED)
+
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT {columns[name]} FROM {hierarchy.table} ORDER BY 1, 2')
+                    imported = cursor.fetchall()
+                    hierarchy.rebuild()
+                    cursor.execute(f'SELECT {columns[name]} FROM {hierarchy.table} ORDER BY 1, 2')
+                    self.assertEqual(imported, cursor.fetchall())
+
+    def test_document_is_validated_as_a_whole(self):
+        """
+        Ошибки всех звеньев возвращаются вместе, и при любой ошибке ничего не загружается
+        """
+        count = Supplier.objects.count()
+        response = self.post([
+            {**self.supplier(1, 'factory'), 'parent': self.retail.id},
+            {**self.supplier(2, debt=10)},
+            {**self.supplier(3), 'ref': 'a', 'parent_ref': 'b'},
+            {**self.supplier(4), 'ref': 'b', 'parent_ref': 'a'},
+            {**self.supplier(5), 'parent_ref': 'missing'},
+            {**self.FACTORY_1_DATA},
+            {**self.supplier(6), 'parent': 0, 'name': ''},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = {error['index']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(errors[0], ['Ошибка: завод не может иметь родителя'])
+        self.assertEqual(errors[1], ['Ошибка: у звена без родителя не может быть долга'])
+        self.assertEqual(errors[2], ['Зацикленные отношения не допустимы'])
+        self.assertEqual(errors[3], ['Зацикленные отношения не допустимы'])
+        self.assertEqual(errors[4], ['Ошибка: звено с ref missing не найдено в документе'])
+        self.assertEqual(errors[5], ['Ошибка: звено с такими страной, городом, названием и email уже существует'])
+        self.assertEqual(len(errors[6]), 2)
+        self.assertEqual(Supplier.objects.count(), count)
@@ -0,0 +1,97 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date, parse_http_date
+from rest_framework import status
+
+from app_shop.models import Product, Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class ConditionalGetAPITestCase(BaseTestCase):
+    """Условные запросы списков и объектов по ETag и Last-Modified"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.product = Product.objects.create(name='Phone', model='A52', release_date='2023-09-29',
+                                              supplier=self.factory)
+
+    def test_unchanged_data_returns_304_without_reading_tables(self):
+        """
+        При совпадении If-None-Match возвращается 304 без чтения звеньев и продуктов,
+        для отдельного объекта читается только его ключ
+        """
+        detail_url = f'{self.URL}{self.factory.id}/'
+        for url in (self.URL, detail_url, self.URL_PRODUCT):
+            with self.subTest(url=url):
+                response = self.user_client.get(url)
+                etag = response['ETag']
+                with CaptureQueriesContext(connection) as context:
+                    response = self.user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                reads = [query['sql'] for query in context.captured_queries
+                         if 'FROM "suppliers"' in query['sql'] or 'FROM "products"' in query['sql']]
+                if url == detail_url:
+                    self.assertEqual(len(reads), 1)
+                    self.assertTrue(reads[0].startswith('SELECT "suppliers"."id" FROM "suppliers"'), reads[0])
+                else:
+                    self.assertFalse(reads)
+
+        etag = self.user_client.get(self.URL_PRODUCT)['ETag']
+        Supplier.objects.filter(id=self.factory.id).update(city='Казань')
+        response = self.user_client.get(self.URL_PRODUCT, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_is_checked_against_last_change(self):
+        """
+        If-Modified-Since сравнивается со временем последнего изменения таблиц
+        """
+        response = self.user_client.get(self.URL)
+        last_modified = response['Last-Modified']
+
+        response = self.user_client.get(self.URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        earlier = http_date(parse_http_date(last_modified) - 60)
+        response = self.user_client.get(self.URL, HTTP_IF_MODIFIED_SINCE=earlier)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_content_encoding(self):
+        """
+        Сжатое и несжатое тело имеют разные строгие ETag
+        """
+        plain = self.user_client.get(self.URL)
+        compressed = self.user_client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        self.assertFalse(plain['ETag'].startswith('W/'))
+        response = self.user_client.get(self.URL, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_object_returns_404_with_current_etag(self):
+        """
+        Несуществующий объект получает 404, даже если If-None-Match совпадает с текущими версиями таблиц
+        """
+        etag = self.user_client.get(f'{self.URL}{self.factory.id}/')['ETag']
+        for url in (f'{self.URL}{self.factory.id + 1000}/', f'{self.URL_PRODUCT}{self.product.id + 1000}/'):
+            with self.subTest(url=url):
+                if url.startswith(self.URL_PRODUCT):
+                    etag = self.user_client.get(f'{self.URL_PRODUCT}{self.product.id}/')['ETag']
+                response = self.user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SUPPLIER_SOFT_DELETE=True)
+    def test_marked_supplier_returns_404_with_current_etag(self):
+        """
+        Помеченное удаленным звено получает 404, а не 304, при совпадении If-None-Match с текущим ETag
+        """
+        retail = Supplier.objects.create(**self.RETAIL_DATA, parent=self.factory)
+        self.user_client.delete(f'{self.URL}{retail.id}/')
+        self.assertTrue(Supplier.all_objects.filter(id=retail.id, deleted_at__isnull=False).exists())
+        for url in (f'{self.URL}{retail.id}/', f'{self.URL}{retail.id}/path/'):
+            with self.subTest(url=url):
+                etag = self.user_client.get(f'{self.URL}{self.factory.id}/')['ETag']
+                response = self.user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 
 from app_shop.models import Supplier, Product
@@ -519,3 +521,18 @@ class SupplierDeleteAPITestCase(BaseTestCase):
         response = self.user_client.delete(f"{self.URL}{supplier_id}/")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Product.objects.filter(supplier_id=supplier_id).count(), 0)
+
+    def test_products_are_deleted_by_database_cascade(self):
+        """Продукты удаляет каскад базы данных: Django не обращается к таблице продуктов"""
+
+        supplier = Supplier.objects.create(**self.FACTORY_1_DATA)
+        Product.objects.bulk_create([
+            Product(name=f'Phone {index}', model='A52', release_date='2023-09-29', supplier=supplier)
+            for index in range(50)
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.user_client.delete(f"{self.URL}{supplier.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse([query for query in queries if '"products"' in query['sql']])
+        self.assertFalse(Product.objects.filter(supplier_id=supplier.id).exists())
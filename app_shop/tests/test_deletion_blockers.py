@@ -0,0 +1,49 @@
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierDeletionBlockersTestCase(BaseTestCase):
+    """Групповая проверка возможности удаления звеньев"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+        self.debtor = Supplier.objects.create(parent=self.retail, **self.SUPPLIER_WITH_DEBT)
+        self.ent = Supplier.objects.create(parent=self.factory, **self.ENT_DATA)
+        self.free = Supplier.objects.create(parent=self.ent, **self.SUPPLIER_WITHOUT_DEBT)
+
+    def test_deletion_blockers_for_many_suppliers_in_one_query(self):
+        """
+        Для набора звеньев одним запросом возвращаются заблокированные звенья и их должники
+
+        Структура:
+
+                  [Завод]
+                  /     \\
+            [Розница]   [ИП]
+                |         |
+            [Должник]  [Без долга]
+
+        Розницу нельзя удалить из-за долга ребенка, должника - из-за собственного долга.
+        """
+        with self.assertNumQueries(1):
+            blockers = Supplier.objects.all().deletion_blockers()
+
+        self.assertEqual(blockers, {self.retail.pk: self.debtor, self.debtor.pk: self.debtor})
+        self.assertEqual(blockers[self.retail.pk].name, self.SUPPLIER_WITH_DEBT['name'])
+
+    def test_deletion_blockers_ignore_grandchildren_debt(self):
+        """
+        Долг на втором уровне вложенности не блокирует удаление
+        """
+        blockers = Supplier.objects.filter(pk__in=[self.factory.pk, self.ent.pk, self.free.pk]).deletion_blockers()
+        self.assertEqual(blockers, {})
+
+    def test_can_be_deleted(self):
+        """
+        Проверка одного звена использует тот же запрос
+        """
+        self.assertEqual(self.retail.can_be_deleted(), (False, self.debtor))
+        self.assertEqual(self.debtor.can_be_deleted(), (False, self.debtor))
+        self.assertEqual(self.factory.can_be_deleted(), (True, None))
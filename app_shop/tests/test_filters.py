@@ -0,0 +1,111 @@
+import re
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app_shop.benchmark import build_forest
+from app_shop.models import Product, Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class ListFiltersAPITestCase(BaseTestCase):
+    """Точные фильтры и фильтры диапазонов списков звеньев и продуктов"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory_1, **{**self.RETAIL_DATA, 'debt': 50})
+        self.ent = Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'debt': 500})
+        self.products = Product.objects.bulk_create([
+            Product(name='Phone', model='A52', release_date='2023-09-29', supplier=self.retail),
+            Product(name='Phone', model='A53', release_date='2024-03-01', supplier=self.retail),
+            Product(name='Phone', model='A54', release_date='2024-03-01', supplier=self.ent),
+        ])
+
+    def ids(self, url, params):
+        return {row['id'] for row in self.user_client.get(url, params).json()['results']}
+
+    def test_suppliers_are_filtered(self):
+        """
+        Звенья фильтруются по типу, стране, городу, родителю, цепочке и диапазону долга
+        """
+        self.assertEqual(self.ids(self.URL, {'type_supplier': 'factory'}), {self.factory_1.id, self.factory_2.id})
+        self.assertEqual(self.ids(self.URL, {'country': 'Россия', 'city': 'Москва'}), {self.factory_1.id})
+        self.assertEqual(self.ids(self.URL, {'parent': self.retail.id}), {self.ent.id})
+        self.assertEqual(self.ids(self.URL, {'tree_id': self.factory_1.tree_id}),
+                         {self.factory_1.id, self.retail.id, self.ent.id})
+        self.assertEqual(self.ids(self.URL, {'debt__gte': 10, 'debt__lte': 100}), {self.retail.id})
+        self.assertEqual(self.ids(self.URL, {'type_supplier': 'entrepreneur', 'debt__gte': 100}), {self.ent.id})
+
+    def test_products_are_filtered(self):
+        """
+        Продукты фильтруются по поставщику и диапазону даты выхода
+        """
+        first, second, third = (product.id for product in self.products)
+        self.assertEqual(self.ids(self.URL_PRODUCT, {'supplier': self.retail.id}), {first, second})
+        self.assertEqual(self.ids(self.URL_PRODUCT, {'release_date__gte': '2024-01-01'}), {second, third})
+        self.assertEqual(self.ids(self.URL_PRODUCT, {'supplier': self.retail.id, 'release_date__lte': '2024-01-01'}),
+                         {first})
+
+    def explain_page(self, url, params):
+        """
+        Возвращает план запроса второй страницы списка, как его выполняет API:
+        с фильтрами, сортировкой списка, границей курсора и LIMIT
+        """
+        first = self.user_client.get(url, {**params, 'page_size': 5}).json()
+        with CaptureQueriesContext(connection) as context:
+            self.user_client.get(first['next'])
+        sql = next(query['sql'] for query in reversed(context.captured_queries) if 'LIMIT' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_filters_use_indexes(self):
+        """
+        Страница списка с каждым сочетанием фильтров читает строки по индексу фильтра
+        или, если фильтр почти не отсекает строки, по индексу сортировки списка до LIMIT,
+        а не полным просмотром таблицы
+        """
+        build_forest(5000)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+            UPDATE suppliers SET
+                country = CASE WHEN id % 20 = 0 THEN 'Беларусь' ELSE 'Россия' END,
+                city = CASE WHEN id % 40 = 0 THEN 'Минск' WHEN id % 20 = 0 THEN 'Брест' ELSE 'Москва' END,
+                debt = CASE WHEN parent_id IS NULL THEN 0 ELSE id % 1000 END
+            WHERE name LIKE 'bench-%%'
+            """)
+        supplier_ids = list(Supplier.objects.order_by('id').values_list('id', flat=True)[:1000])
+        Product.objects.bulk_create([
+            Product(name='Phone', model=f'A{index}', release_date=date(2020, 1, 1) + timedelta(days=index % 1500),
+                    supplier_id=supplier_ids[index % len(supplier_ids)])
+            for index in range(10000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE suppliers, products')
+
+        retail = Supplier.objects.filter(type_supplier='retail', name__startswith='bench-').first()
+        cases = [
+            (self.URL, {'type_supplier': 'factory'}, {'suppliers_type_debt_idx', 'suppliers_type_country_idx'}),
+            (self.URL, {'type_supplier': 'entrepreneur', 'debt__gte': 990}, {'suppliers_type_debt_idx'}),
+            (self.URL, {'type_supplier': 'retail', 'country': 'Беларусь'}, {'suppliers_type_country_idx'}),
+            (self.URL, {'country': 'Беларусь'}, {'suppliers_sort_path_idx'}),
+            (self.URL, {'country': 'Беларусь', 'city': 'Минск'}, {'suppliers_country_city_name_email_uniq'}),
+            (self.URL, {'city': 'Минск'}, {'suppliers_city_country_idx'}),
+            (self.URL, {'parent': retail.id}, {'suppliers_parent_id'}),
+            (self.URL, {'tree_id': retail.tree_id}, {'suppliers_tree_id'}),
+            (self.URL, {'debt__gte': 10, 'debt__lte': 12}, {'suppliers_debt_idx'}),
+            (self.URL_PRODUCT, {'supplier': supplier_ids[5]}, {'products_supplier_release_idx', 'suppliers_pkey'}),
+            (self.URL_PRODUCT, {'supplier': supplier_ids[5], 'release_date__gte': '2021-01-01'},
+             {'products_supplier_release_idx', 'suppliers_pkey'}),
+            (self.URL_PRODUCT, {'release_date__gte': '2024-01-01'}, {'products_pkey', 'suppliers_pkey'}),
+        ]
+        for url, params, indexes in cases:
+            with self.subTest(params=params):
+                plan = self.explain_page(url, params)
+                self.assertNotIn('Seq Scan', plan)
+                used = {re.sub(r'_[0-9a-f]{8}(?=(_uniq)?$)', '', index)
+                        for index in re.findall(r'(?:Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)', plan)}
+                self.assertTrue(used and used <= indexes, plan)
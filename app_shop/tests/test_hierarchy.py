@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+
+from app_shop.benchmark import build_tree
+from app_shop.hierarchy import HIERARCHY_BACKENDS, get_hierarchy
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierHierarchyStorageTestCase(BaseTestCase):
+    """Дополнительные хранилища иерархии совпадают с nested set"""
+
+    def build_network(self):
+        """
+        Структура:
+
+                  [Завод 1]            [Завод 2]
+                  /       \\
+            [Розница]    [ИП]
+                |
+            [Без долга]
+        """
+        factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+        retail = Supplier.objects.create(parent=factory_1, **self.RETAIL_DATA)
+        ent = Supplier.objects.create(parent=factory_1, **self.ENT_DATA)
+        leaf = Supplier.objects.create(parent=retail, **self.SUPPLIER_WITHOUT_DEBT)
+        return factory_1, factory_2, retail, ent, leaf
+
+    def assertMatchesNestedSet(self):
+        nested_set = get_hierarchy('nested_set')
+        for node in Supplier.objects.all():
+            self.assertEqual(set(node.get_children()), set(nested_set.get_children(node)))
+            self.assertEqual(set(node.get_descendants()), set(nested_set.get_descendants(node)))
+            self.assertEqual(list(node.get_ancestors()), list(nested_set.get_ancestors(node)))
+            self.assertEqual(list(node.get_ancestors(ascending=True, include_self=True)),
+                             list(nested_set.get_ancestors(node, ascending=True, include_self=True)))
+            self.assertEqual(node.get_level(), nested_set.get_level(node))
+
+    def check_backend(self, name):
+        with override_settings(SUPPLIER_HIERARCHY=name):
+            factory_1, factory_2, retail, ent, leaf = self.build_network()
+            self.assertMatchesNestedSet()
+
+            retail.parent = factory_2
+            retail.save()
+            self.assertMatchesNestedSet()
+
+            response = self.user_client.delete(f"{self.URL}{factory_2.id}/")
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertMatchesNestedSet()
+
+            get_hierarchy().rebuild()
+            self.assertMatchesNestedSet()
+
+    def test_closure_table(self):
+        """Таблица замыкания"""
+        self.check_backend('closure')
+
+    def test_materialized_path(self):
+        """Материализованный путь"""
+        self.check_backend('path')
+
+    def test_benchmark_single_deep_tree(self):
+        """
+        Сравнение стратегий выполняется и на одном глубоком дереве, данные после замера не изменяются
+        """
+        root = build_tree(255, fanout=2)
+        self.assertEqual(Supplier.objects.filter(tree_id=root.tree_id).count(), 255)
+        self.assertEqual(Supplier.objects.get(id=root.id).get_descendant_count(), 254)
+        self.assertEqual(max(Supplier.objects.values_list('level', flat=True)), 7)
+        self.assertEqual(check_table().broken, set())
+
+        out = StringIO()
+        call_command('benchmark_tree', '--scenario', 'hierarchy', '--shape', 'forest', 'tree',
+                     '--sizes', '300', '--fanout', '2', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 * 4 * len(HIERARCHY_BACKENDS))
+        self.assertEqual(sum('shape=tree' in line for line in lines), 4 * len(HIERARCHY_BACKENDS))
+        self.assertEqual(Supplier.objects.count(), 255)
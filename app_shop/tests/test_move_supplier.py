@@ -0,0 +1,121 @@
+from unittest import mock
+
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierMoveAPITestCase(BaseTestCase):
+    """Перенос звена вместе с поддеревом"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+
+    def create_branch(self, size):
+        distributor = Supplier.objects.create(
+            parent=self.factory_1, **{**self.RETAIL_DATA, 'name': f'Сеть {size}', 'debt': 0}
+        )
+        for index in range(size):
+            Supplier.objects.create(parent=distributor, **{**self.ENT_DATA, 'name': f'ИП {size}-{index}'})
+        return distributor
+
+    def move(self, supplier_id, target, position='last-child'):
+        return self.user_client.post(f'{self.URL}{supplier_id}/move/', {'target': target, 'position': position},
+                                     format='json')
+
+    def test_move_branch_uses_fixed_number_of_queries(self):
+        """
+        Перенос поддерева к другому заводу выполняется одинаковым числом запросов независимо от его размера
+        """
+        queries = []
+        for size in (2, 20):
+            distributor = self.create_branch(size)
+            with measure() as result:
+                response = self.move(distributor.id, self.factory_2.id)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['parent'], self.factory_2.id)
+            queries.append(result.queries)
+
+            distributor = Supplier.objects.get(id=distributor.id)
+            self.assertEqual(distributor.tree_id, self.factory_2.tree_id)
+            self.assertEqual(Supplier.objects.filter(parent=distributor, tree_id=self.factory_2.tree_id).count(), size)
+
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(check_table().broken, set())
+        self.assertEqual(
+            list(Supplier.get_all_suppliers().values_list('name', flat=True)[:3]),
+            [self.FACTORY_1_DATA['name'], self.FACTORY_2_DATA['name'], 'Сеть 2'],
+        )
+
+    def test_move_positions_and_rules(self):
+        """
+        Звено переносится соседом target или первым звеном цепочки, правила иерархии соблюдаются
+        """
+        distributor = self.create_branch(1)
+        retail = Supplier.objects.create(parent=self.factory_1, **self.SUPPLIER_WITH_DEBT)
+
+        response = self.move(retail.id, distributor.id, 'left')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        retail = Supplier.objects.get(id=retail.id)
+        self.assertEqual(retail.rght + 1, Supplier.objects.get(id=distributor.id).lft)
+
+        response = self.move(retail.id, None)
+        self.assertEqual(response.json()['error'], 'Ошибка: у звена без родителя не может быть долга')
+        response = self.move(self.factory_2.id, retail.id)
+        self.assertEqual(response.json()['error'], 'Ошибка: завод не может иметь родителя')
+
+        response = self.move(distributor.id, None)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(Supplier.objects.get(id=distributor.id).parent_id)
+        self.assertEqual(check_table().broken, set())
+
+    def test_batch_move_runs_in_one_transaction(self):
+        """
+        Список переносов выполняется целиком или не выполняется вовсе, если вместе переносы образуют цикл
+        """
+        first = self.create_branch(1)
+        second = self.create_branch(2)
+        ent = Supplier.objects.get(name='ИП 2-0')
+
+        response = self.user_client.post(f'{self.URL}move/', [
+            {'id': first.id, 'target': second.id},
+            {'id': second.id, 'target': Supplier.objects.get(name='ИП 1-0').id},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'Зацикленные отношения не допустимы')
+        self.assertEqual(Supplier.objects.get(id=first.id).parent_id, self.factory_1.id)
+
+        response = self.user_client.post(f'{self.URL}move/', [
+            {'id': first.id, 'target': self.factory_2.id},
+            {'id': ent.id, 'target': first.id, 'position': 'first-child'},
+            {'id': second.id, 'target': first.id, 'position': 'right'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([supplier['parent'] for supplier in response.json()],
+                         [self.factory_2.id, first.id, self.factory_2.id])
+        self.assertEqual(list(Supplier.objects.get(id=self.factory_2.id).get_children()), [first, second])
+        self.assertEqual(Supplier.objects.get(id=ent.id).get_previous_sibling(), None)
+        self.assertEqual(check_table().broken, set())
+
+    def test_concurrent_debt_change_returns_rule_error(self):
+        """
+        Долг, появившийся у звена после проверки правил, отклоняет перенос в корень ошибкой правила, а не 500
+        """
+        distributor = self.create_branch(1)
+        invalid_moves = Supplier.objects.invalid_moves
+
+        def add_debt(moves):
+            Supplier.objects.filter(id=distributor.id).update(debt=100)
+            return invalid_moves(moves)
+
+        with mock.patch.object(Supplier.objects, 'invalid_moves', side_effect=add_debt):
+            response = self.move(distributor.id, None)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'Ошибка: у звена без родителя не может быть долга')
+        self.assertEqual(Supplier.objects.get(id=distributor.id).parent_id, self.factory_1.id)
+        self.assertEqual(check_table().broken, set())
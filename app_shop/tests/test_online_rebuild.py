@@ -0,0 +1,128 @@
+import threading
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+
+from app_shop.coordinator import tree_lock
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_shop.online_rebuild import CREATE_SHADOW_SQL, SHADOW_TABLE, OnlineRebuild
+from app_shop.tests.base_test import BaseTestCase
+
+
+class OnlineRebuildTestCase(BaseTestCase):
+    """Онлайн-перестроение nested set через теневую таблицу"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory_1, **self.RETAIL_DATA)
+        self.ent = Supplier.objects.create(parent=self.retail, **self.ENT_DATA)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+        self.leaf = Supplier.objects.create(parent=self.factory_2, **self.SUPPLIER_WITHOUT_DEBT)
+        self.expected = list(Supplier.objects.values_list('id', 'tree_id', 'lft', 'rght', 'level'))
+
+    def test_command_repairs_corrupted_rows(self):
+        """
+        Команда восстанавливает испорченные значения и изменяет только их
+        """
+        Supplier.objects.filter(id=self.ent.id).update(lft=20, rght=30, level=5)
+        out = StringIO()
+        call_command('rebuild_tree', stdout=out)
+
+        self.assertIn('изменено строк: 1', out.getvalue())
+        self.assertEqual(list(Supplier.objects.values_list('id', 'tree_id', 'lft', 'rght', 'level')), self.expected)
+
+    def test_bigint_ids_are_rebuilt(self):
+        """
+        Звенья с id больше 2^31 переносятся в теневую таблицу без переполнения
+        """
+        Supplier.objects.filter(id=self.leaf.id).update(id=2 ** 31 + 1, lft=20, rght=30)
+        call_command('rebuild_tree', stdout=StringIO())
+
+        self.assertEqual(check_table().broken, set())
+        self.assertEqual(Supplier.objects.get(id=2 ** 31 + 1).rght, 3)
+
+    def test_catch_up_applies_changes_made_after_snapshot(self):
+        """
+        Изменения, сделанные между снимком и переносом, учитываются при переносе
+        """
+        Supplier.objects.filter(id=self.leaf.id).update(lft=7, rght=9)
+        rebuild = OnlineRebuild()
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SHADOW_SQL)
+        rebuild.snapshot()
+
+        Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'name': 'ИП 2'})
+        self.leaf.refresh_from_db()
+        self.leaf.parent = Supplier.objects.get(id=self.retail.id)
+        self.leaf.save()
+        Supplier.objects.filter(id=self.factory_2.id).update(rght=10)
+
+        self.assertEqual(rebuild.catch_up(), 2)
+        rebuild.swap()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {SHADOW_TABLE}')
+
+        self.assertEqual(check_table().broken, set())
+        self.assertEqual(Supplier.objects.get(id=self.retail.id).get_descendant_count(), 3)
+        self.assertEqual(Supplier.objects.get(id=self.factory_2.id).rght, 2)
+
+
+class OnlineRebuildLockTestCase(TransactionTestCase):
+    """Перенос значений онлайн-перестроения и изменения деревьев под блокировкой"""
+
+    HOLD_SECONDS = 0.5
+
+    def create_supplier(self, name, parent=None):
+        return Supplier.objects.create(type_supplier='retail' if parent else 'factory', name=name,
+                                       email=f'{name}@example.com', country='Россия', city='Москва',
+                                       street='Ленина', house_number='1', debt=0, parent=parent)
+
+    def test_swap_waits_for_writer_holding_tree_lock(self):
+        """
+        Перенос ждет изменение, которое уже держит блокировку дерева и читает прежние границы,
+        и не переписывает дерево, пока это изменение не записано
+        """
+        factory = self.create_supplier('factory')
+        retail = self.create_supplier('retail', factory)
+        Supplier.objects.filter(id=retail.id).update(lft=5, rght=6)
+        Supplier.objects.filter(id=factory.id).update(rght=8)
+
+        holding, swapping = threading.Event(), threading.Event()
+        hold_seconds = self.HOLD_SECONDS
+
+        class SlowSwap(OnlineRebuild):
+            def catch_up(self):
+                # Вызывается только из swap, после блокировки таблицы.
+                swapping.set()
+                time.sleep(hold_seconds)
+                return super().catch_up()
+
+        def insert_child():
+            try:
+                with tree_lock([factory.tree_id]):
+                    holding.set()
+                    swapping.wait(hold_seconds)
+                    self.create_supplier('ent', Supplier.objects.get(id=retail.id))
+            finally:
+                holding.set()
+                connection.close()
+
+        rebuild = SlowSwap()
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SHADOW_SQL)
+        rebuild.snapshot()
+        writer = threading.Thread(target=insert_child)
+        writer.start()
+        holding.wait()
+        rebuild.swap()
+        writer.join()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {SHADOW_TABLE}')
+
+        self.assertEqual(Supplier.objects.count(), 3)
+        self.assertEqual(check_table().broken, set())
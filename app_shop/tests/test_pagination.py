@@ -0,0 +1,84 @@
+from django.test import override_settings
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.models import Product, Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class KeysetPaginationAPITestCase(BaseTestCase):
+    """Постраничный вывод списков звеньев и продуктов по ключу"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        for index in range(9):
+            Supplier.objects.create(parent=self.factory, **{**self.ENT_DATA, 'name': f'ИП {index}'})
+
+    def pages(self, url, params):
+        """
+        Проходит все страницы списка и возвращает id строк и число запросов каждой страницы.
+        """
+        ids, queries = [], []
+        response = self.user_client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [row['id'] for row in response.json()['results']]
+            if response.json()['next'] is None:
+                return ids, queries
+            with measure() as result:
+                response = self.user_client.get(response.json()['next'])
+            queries.append(result.queries)
+
+    def test_pages_follow_list_ordering_with_fixed_number_of_queries(self):
+        """
+        Страницы идут в порядке списка без повторов и пропусков, каждая читается одинаковым числом запросов
+        """
+        for ordering, expected in (
+            (None, list(Supplier.get_all_suppliers().values_list('id', flat=True))),
+            ('created_at', list(Supplier.objects.order_by('created_at', 'id').values_list('id', flat=True))),
+            ('-id', list(Supplier.objects.order_by('-id').values_list('id', flat=True))),
+        ):
+            params = {'page_size': 3, **({'ordering': ordering} if ordering else {})}
+            ids, queries = self.pages(self.URL, params)
+            self.assertEqual(ids, expected)
+            self.assertEqual(len(set(queries)), 1)
+
+    def test_inserted_rows_do_not_shift_pages(self):
+        """
+        Звенья, добавленные между запросами, не приводят к повторам строк на следующей странице
+        """
+        response = self.user_client.get(self.URL, {'ordering': 'created_at', 'page_size': 4})
+        first = [row['id'] for row in response.json()['results']]
+        Supplier.objects.create(**self.FACTORY_2_DATA)
+        response = self.user_client.get(response.json()['next'])
+        second = [row['id'] for row in response.json()['results']]
+
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(first + second, list(Supplier.objects.order_by('created_at', 'id').values_list(
+            'id', flat=True))[:8])
+
+    @override_settings(API_MAX_PAGE_SIZE=5)
+    def test_page_size_is_limited_and_cursor_is_checked(self):
+        """
+        Размер страницы ограничен максимумом сервера, курсор другой сортировки отклоняется
+        """
+        response = self.user_client.get(self.URL, {'page_size': 100})
+        self.assertEqual(len(response.json()['results']), 5)
+
+        cursor = response.json()['next'].split('cursor=')[1].split('&')[0]
+        response = self.user_client.get(self.URL, {'cursor': cursor, 'ordering': 'created_at'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.user_client.get(self.URL, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_products_are_paginated_by_id(self):
+        """
+        Продукты выводятся страницами в порядке id
+        """
+        Product.objects.bulk_create([
+            Product(name=f'Phone {index}', model='A52', release_date='2023-09-29', supplier=self.factory)
+            for index in range(7)
+        ])
+        ids, _ = self.pages(self.URL_PRODUCT, {'page_size': 2})
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
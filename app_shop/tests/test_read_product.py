@@ -49,7 +49,7 @@ class ProductReadAPITestCase(BaseTestCase):
         """Авторизованный пользователь может просмотреть список продуктов"""
         response = self.user_client.get(self.URL_PRODUCT)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.json()['results']), 2)
 
     def test_non_existent_product(self):
         """При запросе продукта с несуществующим ID должна возвращаться ошибка"""
@@ -61,7 +61,7 @@ class ProductReadAPITestCase(BaseTestCase):
         response = self.user_client.get(f"{self.URL_PRODUCT}{self.product1['id']}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        self.assertEqual(response.data["name"], self.product_data_1["name"])
-        self.assertEqual(response.data["model"], self.product_data_1["model"])
-        self.assertEqual(response.data["release_date"], self.product_data_1["release_date"])
-        self.assertEqual(response.data["supplier"], self.product_data_1["supplier"])
+        self.assertEqual(response.json()["name"], self.product_data_1["name"])
+        self.assertEqual(response.json()["model"], self.product_data_1["model"])
+        self.assertEqual(response.json()["release_date"], self.product_data_1["release_date"])
+        self.assertEqual(response.json()["supplier"], self.product_data_1["supplier"])
@@ -31,7 +31,7 @@ class SupplierReadAPITestCase(BaseTestCase):
         """Тест иерархии и порядка узлов"""
 
         response = self.user_client.get(self.URL)
-        suppliers = response.json()
+        suppliers = response.json()['results']
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -54,7 +54,7 @@ class SupplierReadAPITestCase(BaseTestCase):
         """Проверка атрибутов у созданных узлов"""
 
         response = self.user_client.get(self.URL)
-        suppliers = sorted(response.json(), key=lambda x: x["id"])
+        suppliers = sorted(response.json()['results'], key=lambda x: x["id"])
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
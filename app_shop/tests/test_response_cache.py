@@ -0,0 +1,119 @@
+import gzip
+import json
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from app_shop.models import Product, Supplier, TableVersion
+from app_shop.tests.base_test import BaseTestCase
+
+
+class ResponseCacheAPITestCase(BaseTestCase):
+    """Кэш ответов списков и объектов по версиям таблиц"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **{**self.RETAIL_DATA, 'debt': 100})
+        self.product = Product.objects.create(name='Phone', model='A52', release_date='2023-09-29',
+                                              supplier=self.retail)
+
+    def get(self, url, **extra):
+        with CaptureQueriesContext(connection) as context:
+            response = self.user_client.get(url, **extra)
+        tables = {table for query in context.captured_queries for table in ('suppliers', 'products')
+                  if f'FROM "{table}"' in query['sql']}
+        return response, tables
+
+    def test_cached_response_does_not_read_tables(self):
+        """
+        Повторный запрос списка или объекта отдается из кэша без чтения таблиц
+        """
+        urls = (self.URL, f'{self.URL}{self.retail.id}/', self.URL_PRODUCT, f'{self.URL_PRODUCT}{self.product.id}/')
+        for url in urls:
+            with self.subTest(url=url):
+                first, tables = self.get(url)
+                self.assertTrue(tables)
+                cached, tables = self.get(url)
+                self.assertEqual(tables, set())
+                self.assertEqual(cached.json(), first.json())
+
+        response, tables = self.get(self.URL, data={'ordering': '-id'})
+        self.assertEqual(tables, {'suppliers'})
+
+    def test_cache_is_invalidated_by_any_change(self):
+        """
+        Ответы сбрасываются при сохранении, QuerySet.update, перестройке дерева и каскадном удалении
+        """
+        def debts():
+            return {row['id']: row['debt'] for row in self.get(self.URL)[0].json()['results']}
+
+        self.assertEqual(debts()[self.retail.id], '100.00')
+        Supplier.objects.filter(id=self.retail.id).update(debt=0)
+        self.assertEqual(debts()[self.retail.id], '0.00')
+
+        self.retail.debt = 5
+        self.retail.save()
+        self.assertEqual(debts()[self.retail.id], '5.00')
+
+        levels = {row['id']: row['level'] for row in self.get(self.URL)[0].json()['results']}
+        Supplier.objects.filter(id=self.retail.id).update(level=7)
+        Supplier.objects.rebuild()
+        self.assertEqual({row['id']: row['level'] for row in self.get(self.URL)[0].json()['results']}, levels)
+
+        self.assertEqual(len(self.get(self.URL_PRODUCT)[0].json()['results']), 1)
+        Supplier.objects.filter(id=self.retail.id).update(debt=0)
+        self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        self.assertEqual(self.get(self.URL_PRODUCT)[0].json()['results'], [])
+
+    def test_compressed_body_is_sent_to_gzip_clients(self):
+        """
+        Клиенту, который принимает gzip, сжатое тело из кэша отдается без распаковки
+        """
+        plain, _ = self.get(self.URL)
+        compressed, _ = self.get(self.URL, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+
+    def test_version_row_is_not_locked_by_writers(self):
+        """
+        Строка версии не блокируется пишущей транзакцией до фиксации: другая транзакция меняет ее
+        без ожидания, а версия увеличивается при фиксации
+        """
+        version = TableVersion.objects.get(table_name='suppliers').version
+        Supplier.objects.filter(id=self.retail.id).update(debt=0)
+        self.assertEqual(TableVersion.objects.get(table_name='suppliers').version, version)
+
+        other = connection.copy()
+        try:
+            with other.cursor() as cursor:
+                cursor.execute("SET lock_timeout = '1s'")
+                cursor.execute("SELECT version FROM table_versions WHERE table_name = 'suppliers' FOR UPDATE")
+        finally:
+            other.close()
+
+        with transaction.atomic():
+            connection.check_constraints()
+        self.assertGreater(TableVersion.objects.get(table_name='suppliers').version, version)
+
+    def test_versions_are_flushed_once_per_transaction(self):
+        """
+        Транзакция, изменившая много строк обеих таблиц, оставляет одну отметку для записи версий при фиксации
+        """
+        def marks():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM table_version_marks')
+                return cursor.fetchone()[0]
+
+        versions = dict(TableVersion.objects.values_list('table_name', 'version'))
+        Supplier.objects.update(city='Казань')
+        Product.objects.update(model='A53')
+        Supplier.objects.rebuild()
+        self.assertEqual(marks(), 1)
+
+        with transaction.atomic():
+            connection.check_constraints()
+        self.assertEqual(marks(), 0)
+        for table_name, version in TableVersion.objects.values_list('table_name', 'version'):
+            self.assertGreater(version, versions[table_name])
@@ -0,0 +1,134 @@
+from django.test import override_settings
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.integrity import check_table
+from app_shop.models import Product, Supplier
+from app_shop.purge import purge_deleted
+from app_shop.tests.base_test import BaseTestCase
+
+
+@override_settings(SUPPLIER_SOFT_DELETE=True)
+class SupplierSoftDeleteAPITestCase(BaseTestCase):
+    """Мягкое удаление звена и фоновая очистка"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+        self.ents = [
+            Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'name': f'ИП {index}'})
+            for index in range(3)
+        ]
+        Product.objects.bulk_create([
+            Product(name=f'Phone {index}', model='A52', release_date='2023-09-29', supplier=self.retail)
+            for index in range(25)
+        ])
+
+    def test_delete_marks_supplier_and_hides_it(self):
+        """
+        Удаление только помечает звено, не изменяя дерево, и звено скрыто из всех выборок
+        """
+        tree = list(Supplier.all_objects.order_by('id').values_list('id', 'lft', 'rght', 'parent_id'))
+        with measure() as result:
+            response = self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(result.rows, 1)
+
+        self.assertEqual(list(Supplier.all_objects.order_by('id').values_list('id', 'lft', 'rght', 'parent_id')), tree)
+        self.assertFalse(Supplier.objects.filter(id=self.retail.id).exists())
+        self.assertEqual(self.user_client.get(f'{self.URL}{self.retail.id}/').status_code, status.HTTP_404_NOT_FOUND)
+        suppliers = self.user_client.get(self.URL).json()['results']
+        self.assertNotIn(self.retail.id, [supplier['id'] for supplier in suppliers])
+        self.assertEqual(self.user_client.get(self.URL_PRODUCT).json()['results'], [])
+        self.assertEqual(list(self.factory.get_children()), [])
+        self.assertEqual(check_table().broken, set())
+
+        tree = self.user_client.get(f'{self.URL}{self.factory.id}/tree/').json()
+        self.assertEqual([child['id'] for child in tree['children']], [ent.id for ent in self.ents])
+
+        self.assertEqual(self.user_client.get(f'{self.URL}{self.retail.id}/path/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        url = f'{self.URL}{self.ents[0].id}/common-ancestor/'
+        self.assertEqual(self.user_client.get(url, {'other': self.retail.id}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.user_client.get(url, {'other': self.ents[1].id}).json()['ancestor']['id'],
+                         self.factory.id)
+
+    def test_purge_reparents_children_and_resumes(self):
+        """
+        Очистка переназначает детей, удаляет продукты порциями и продолжается с места остановки
+        """
+        other = Supplier.objects.create(parent=self.factory, **self.SUPPLIER_WITHOUT_DEBT)
+        self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        self.user_client.delete(f'{self.URL}{other.id}/')
+
+        progress = []
+        result = purge_deleted(batch_size=1, product_batch_size=10, limit=1, progress=progress.append)
+        self.assertEqual((result.total, result.purged, result.products), (2, 1, 25))
+        self.assertEqual(len(progress), 1)
+        self.assertFalse(Supplier.all_objects.filter(id=self.retail.id).exists())
+        self.assertEqual(Product.objects.count(), 0)
+        self.assertEqual(list(Supplier.objects.get(id=self.factory.id).get_children()), [*self.ents])
+        self.assertEqual(check_table().broken, set())
+
+        result = purge_deleted()
+        self.assertEqual((result.total, result.purged), (1, 1))
+        self.assertEqual(Supplier.all_objects.count(), 4)
+        self.assertEqual(purge_deleted().processed, 0)
+
+    def test_marked_supplier_is_restored_if_child_got_debt(self):
+        """
+        Если после пометки у ребенка появился долг, очистка снимает пометку вместо удаления
+        """
+        self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        Supplier.objects.filter(id=self.ents[0].id).update(debt=100)
+
+        result = purge_deleted()
+        self.assertEqual((result.purged, result.restored), (0, 1))
+        self.assertTrue(Supplier.objects.filter(id=self.retail.id).exists())
+        self.assertEqual(Product.objects.filter(supplier=self.retail).count(), 25)
+
+    def test_marked_supplier_is_restored_if_marked_child_has_debt(self):
+        """
+        Долг ребенка, тоже помеченного удаленным, и долг самого помеченного звена блокируют очистку
+        """
+        self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        self.user_client.delete(f'{self.URL}{self.ents[0].id}/')
+        Supplier.all_objects.filter(id=self.ents[0].id).update(debt=100)
+        other = Supplier.objects.create(parent=self.factory, **self.SUPPLIER_WITHOUT_DEBT)
+        self.user_client.delete(f'{self.URL}{other.id}/')
+        Supplier.all_objects.filter(id=other.id).update(debt=50)
+
+        result = purge_deleted()
+        self.assertEqual((result.purged, result.restored), (0, 3))
+        self.assertEqual(Supplier.objects.get(id=self.ents[0].id).parent_id, self.retail.id)
+        self.assertEqual(Product.objects.filter(supplier=self.retail).count(), 25)
+        self.assertEqual(check_table().broken, set())
+
+    def test_marked_suppliers_are_excluded_from_rollups(self):
+        """
+        Звено, помеченное удаленным, не входит в задолженность и количество потомков предков,
+        пересчет итогов дает те же значения
+        """
+        self.user_client.delete(f'{self.URL}{self.ents[0].id}/')
+        self.user_client.delete(f'{self.URL}{self.retail.id}/')
+        Supplier.all_objects.filter(id=self.ents[0].id).update(debt=100)
+
+        def rollups():
+            return list(Supplier.all_objects.order_by('id').values_list('id', 'subtree_debt', 'descendant_count'))
+
+        factory = Supplier.objects.get(id=self.factory.id)
+        self.assertEqual((factory.subtree_debt, factory.descendant_count), (0, 2))
+        expected = rollups()
+        self.assertEqual(Supplier.objects.rebuild_rollups(), 0)
+        self.assertEqual(rollups(), expected)
+
+        Supplier.all_objects.filter(id=self.ents[0].id).update(deleted_at=None)
+        factory = Supplier.objects.get(id=self.factory.id)
+        self.assertEqual((factory.subtree_debt, factory.descendant_count), (100, 3))
+
+        Supplier.objects.filter(id=self.ents[0].id).update(debt=0)
+        self.assertEqual(purge_deleted().purged, 1)
+        factory = Supplier.objects.get(id=self.factory.id)
+        self.assertEqual((factory.subtree_debt, factory.descendant_count), (0, 3))
+        self.assertEqual(Supplier.objects.rebuild_rollups(), 0)
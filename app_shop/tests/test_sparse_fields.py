@@ -0,0 +1,81 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from app_shop.models import Product, Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SparseFieldsAPITestCase(BaseTestCase):
+    """Выборочные поля ответа и столбцы запроса"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        for index in range(4):
+            Supplier.objects.create(parent=self.factory, **{**self.ENT_DATA, 'name': f'ИП {index}'})
+        self.product = Product.objects.create(name='Phone', model='A52', release_date='2023-09-29',
+                                              supplier=self.factory)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.user_client.get(url, params)
+        table = '"products"' if 'products' in url else '"suppliers"'
+        selects = [query['sql'] for query in context.captured_queries if f'FROM {table}' in query['sql']]
+        return response, selects
+
+    def test_fields_limit_response_and_selected_columns(self):
+        """
+        В ответе и в запросе только выбранные поля, без дополнительных запросов на строку
+        """
+        response, selects = self.get(self.URL, {'fields': 'id,name', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({tuple(row) for row in response.json()['results']}, {('id', 'name')})
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn('"email"', selects[0])
+        self.assertNotIn('"lft"', selects[0])
+
+        names = [row['name'] for row in response.json()['results']]
+        response, selects = self.get(response.json()['next'], {})
+        self.assertEqual(len(selects), 1)
+        names += [row['name'] for row in response.json()['results']]
+        self.assertEqual(names, list(Supplier.get_all_suppliers().values_list('name', flat=True))[:4])
+
+        response, selects = self.get(f'{self.URL}{self.factory.id}/', {'fields': 'debt'})
+        self.assertEqual(response.json(), {'debt': '0.00'})
+        self.assertNotIn('"name"', selects[0])
+
+    def test_omit_excludes_fields(self):
+        """
+        Параметр omit исключает поля из ответа и столбцы из запроса
+        """
+        omit = ['lft', 'rght', 'tree_id', 'level', 'email', 'created_at']
+        response, selects = self.get(self.URL, {'omit': ','.join(omit)})
+        row = response.json()['results'][0]
+        self.assertFalse(set(omit) & set(row))
+        self.assertIn('name', row)
+        self.assertNotIn('"email"', selects[0])
+
+        response, selects = self.get(self.URL_PRODUCT, {'fields': 'id,name,model', 'omit': 'model'})
+        self.assertEqual(response.json()['results'], [{'id': self.product.id, 'name': 'Phone'}])
+        self.assertNotIn('"release_date"', selects[0])
+
+    def test_unknown_fields_are_rejected(self):
+        """
+        Неизвестные поля отклоняются до выборки данных
+        """
+        response, selects = self.get(self.URL, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'fields': ['Ошибка: неизвестные поля: password']})
+        self.assertEqual(selects, [])
+
+    def test_other_actions_ignore_fields(self):
+        """
+        Путь и общее звено выводятся полностью: их ответы кэшируются без учета fields и omit
+        """
+        child = Supplier.objects.filter(parent=self.factory).first()
+        url = f'{self.URL}{child.id}/path/'
+        response = self.user_client.get(url, {'fields': 'id'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('name', response.json()[0])
+        self.assertEqual(self.user_client.get(url).json(), response.json())
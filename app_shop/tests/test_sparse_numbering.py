@@ -0,0 +1,141 @@
+from django.test import override_settings
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+@override_settings(SUPPLIER_NESTED_SET_GAP=8)
+class SparseNestedSetTestCase(BaseTestCase):
+    """Разреженная нумерация lft/rght"""
+
+    def create_supplier(self, data, parent=None, **overrides):
+        return Supplier.objects.create(parent=parent, **{**data, **overrides})
+
+    def assertTreeIsConsistent(self):
+        """
+        Проверяет, что интервалы вложены по связям parent, а выборки по lft/rght
+        совпадают с потомками, найденными по parent.
+        """
+        nodes = {node.id: node for node in Supplier.objects.all()}
+        children = {}
+        for node in nodes.values():
+            children.setdefault(node.parent_id, []).append(node.id)
+
+        def descendants(pk):
+            result = set()
+            for child in children.get(pk, []):
+                result |= {child} | descendants(child)
+            return result
+
+        for tree_id in {node.tree_id for node in nodes.values()}:
+            bounds = [bound for node in nodes.values() if node.tree_id == tree_id for bound in (node.lft, node.rght)]
+            self.assertEqual(len(bounds), len(set(bounds)))
+
+        for node in nodes.values():
+            self.assertLess(node.lft, node.rght)
+            if node.parent_id:
+                parent = nodes[node.parent_id]
+                self.assertTrue(parent.lft < node.lft < node.rght < parent.rght)
+                self.assertEqual((node.level, node.tree_id), (parent.level + 1, parent.tree_id))
+            self.assertEqual({other.id for other in node.get_descendants()}, descendants(node.id))
+            self.assertEqual(node.get_descendant_count(), len(descendants(node.id)))
+            self.assertEqual(node.is_leaf_node(), not children.get(node.id))
+
+    def test_insert_touches_only_new_row(self):
+        """
+        Вставка листа при наличии промежутка не изменяет lft/rght других звеньев
+        """
+        factory = self.create_supplier(self.FACTORY_1_DATA)
+        retail = self.create_supplier(self.RETAIL_DATA, factory)
+        self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, factory)
+
+        bounds = list(Supplier.objects.values_list('id', 'lft', 'rght'))
+        with measure() as result:
+            self.create_supplier(self.ENT_DATA, retail)
+        self.assertEqual(list(Supplier.objects.exclude(name=self.ENT_DATA['name'])
+                              .values_list('id', 'lft', 'rght')), bounds)
+        self.assertEqual(result.rows, 2)
+        self.assertTreeIsConsistent()
+
+    def test_append_touches_bounded_number_of_rows(self):
+        """
+        Добавление последнего ребенка затрагивает одинаковое число строк независимо от размера дерева,
+        а при плотной нумерации сдвигает границы всех звеньев правее места вставки
+        """
+        factory = self.create_supplier(self.FACTORY_1_DATA)
+        retail = self.create_supplier(self.RETAIL_DATA, factory)
+        wholesale = self.create_supplier(self.RETAIL_DATA, factory, email='wholesale@example.com')
+        rows = {}
+        for size in (10, 50):
+            while Supplier.objects.filter(parent=wholesale).count() < size:
+                self.create_supplier(self.ENT_DATA, wholesale, name=f'ИП {size}-{Supplier.objects.count()}')
+            Supplier.objects.rebuild()
+            for gap in (0, 8):
+                with self.settings(SUPPLIER_NESTED_SET_GAP=gap), measure() as result:
+                    self.create_supplier(self.ENT_DATA, Supplier.objects.get(id=retail.id), name=f'ИП {gap}-{size}')
+                rows[gap, size] = result.rows
+                Supplier.objects.rebuild()
+
+        self.assertEqual(rows[8, 10], rows[8, 50])
+        self.assertLessEqual(rows[8, 50], 3)
+        self.assertGreater(rows[0, 50], rows[0, 10])
+        self.assertTreeIsConsistent()
+
+    def test_exhausted_gap_renumbers_locally(self):
+        """
+        Когда промежуток исчерпан, дерево перенумеровывается и остается корректным,
+        другие деревья не изменяются
+        """
+        factory = self.create_supplier(self.FACTORY_1_DATA)
+        other = self.create_supplier(self.FACTORY_2_DATA)
+        self.create_supplier(self.RETAIL_DATA, other)
+        other_tree = list(Supplier.objects.filter(tree_id=other.tree_id).values_list('id', 'lft', 'rght'))
+
+        retail = self.create_supplier(self.RETAIL_DATA, factory, email='retail@example.com')
+        for index in range(30):
+            self.create_supplier(self.ENT_DATA, retail if index % 2 else factory, name=f'ИП {index}')
+
+        self.assertEqual(Supplier.objects.get(id=retail.id).get_children().count(), 15)
+        self.assertEqual(list(Supplier.objects.filter(tree_id=other.tree_id).values_list('id', 'lft', 'rght')),
+                         other_tree)
+        self.assertTreeIsConsistent()
+
+    def test_move_into_gap_updates_only_moved_subtree(self):
+        """
+        Перенос листа в звено со свободным местом изменяет только строку листа
+        """
+        factory = self.create_supplier(self.FACTORY_1_DATA)
+        retail = self.create_supplier(self.RETAIL_DATA, factory)
+        self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, retail)
+        ent = self.create_supplier(self.ENT_DATA, factory)
+        leaf = self.create_supplier(self.ENT_DATA, ent, email='leaf@example.com')
+        Supplier.objects.rebuild()
+
+        bounds = list(Supplier.objects.exclude(id=leaf.id).values_list('id', 'lft', 'rght'))
+        leaf.refresh_from_db()
+        leaf.parent = Supplier.objects.get(id=retail.id)
+        leaf.save()
+
+        self.assertEqual(list(Supplier.objects.exclude(id=leaf.id).values_list('id', 'lft', 'rght')), bounds)
+        self.assertEqual(list(Supplier.objects.get(id=leaf.id).get_ancestors()), [factory, retail])
+        self.assertTreeIsConsistent()
+
+    def test_delete_and_reparent_keep_tree_consistent(self):
+        """
+        Удаление звена через API оставляет промежуток, дерево остается корректным
+        """
+        factory = self.create_supplier(self.FACTORY_1_DATA)
+        retail = self.create_supplier(self.RETAIL_DATA, factory)
+        self.create_supplier(self.ENT_DATA, retail)
+        self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, retail)
+
+        factory_bounds = (factory.lft, Supplier.objects.get(id=factory.id).rght)
+        response = self.user_client.delete(f"{self.URL}{retail.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        factory.refresh_from_db()
+        self.assertEqual((factory.lft, factory.rght), factory_bounds)
+        self.assertEqual(factory.get_children().count(), 2)
+        self.assertTreeIsConsistent()
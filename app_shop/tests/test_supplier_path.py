@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from rest_framework import status
+
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierPathAPITestCase(BaseTestCase):
+    """Путь до первого звена цепочки и общее звено двух цепочек"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+        self.ent = Supplier.objects.create(parent=self.retail, **self.ENT_DATA)
+        self.other = Supplier.objects.create(parent=self.factory, **self.SUPPLIER_WITHOUT_DEBT)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+
+    def common_ancestor(self, first, second):
+        response = self.user_client.get(f'{self.URL}{first.id}/common-ancestor/', {'other': second.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ancestor = response.json()['ancestor']
+        return ancestor and ancestor['id']
+
+    def test_path_is_read_with_one_query_and_cached_per_tree_version(self):
+        """
+        Путь читается одним запросом, повторный запрос берется из кэша до изменения дерева
+        """
+        url = f'{self.URL}{self.ent.id}/path/'
+        with self.assertNumQueries(3):
+            response = self.user_client.get(url)
+        self.assertEqual([supplier['id'] for supplier in response.json()],
+                         [self.factory.id, self.retail.id, self.ent.id])
+
+        with self.assertNumQueries(2):
+            cached = self.user_client.get(url)
+        self.assertEqual(cached.json(), response.json())
+        not_modified = self.user_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user_client.patch(f'{self.URL}{self.retail.id}/', {'name': 'Новая сеть'})
+        response = self.user_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[1]['name'], 'Новая сеть')
+
+        self.factory_2.save()
+        self.assertEqual(self.user_client.get(url)['ETag'], response['ETag'])
+
+    def test_common_ancestor(self):
+        """
+        Общее звено - ближайший общий предок, само звено, если оно предок другого, или null для разных цепочек
+        """
+        self.assertEqual(self.common_ancestor(self.ent, self.other), self.factory.id)
+        self.assertEqual(self.common_ancestor(self.ent, self.retail), self.retail.id)
+        self.assertEqual(self.common_ancestor(self.ent, self.ent), self.ent.id)
+        self.assertIsNone(self.common_ancestor(self.ent, self.factory_2))
+
+        response = self.user_client.get(f'{self.URL}{self.ent.id}/common-ancestor/', {'other': 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
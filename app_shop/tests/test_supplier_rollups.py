@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from rest_framework import status
+
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierRollupsTestCase(BaseTestCase):
+    """Итоги поддерева: задолженность, количество потомков и глубина"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+        self.ent = Supplier.objects.create(parent=self.retail, **self.ENT_DATA)
+        self.other = Supplier.objects.create(parent=self.factory, **self.SUPPLIER_WITH_DEBT)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+
+    def assertRollupsAreValid(self):
+        """
+        Проверяет итоги каждого звена по связям parent.
+        """
+        nodes = {node.id: node for node in Supplier.objects.all()}
+        children = {}
+        for node in nodes.values():
+            children.setdefault(node.parent_id, []).append(node.id)
+
+        def rollup(pk):
+            debt, count, depth = nodes[pk].debt, 0, 0
+            for child in children.get(pk, []):
+                child_debt, child_count, child_depth = rollup(child)
+                debt, count, depth = debt + child_debt, count + child_count + 1, max(depth, child_depth + 1)
+            return debt, count, depth
+
+        for pk, node in nodes.items():
+            self.assertEqual((node.subtree_debt, node.descendant_count, node.subtree_depth), rollup(pk), node.name)
+
+    def rollups(self, supplier):
+        return Supplier.objects.values_list('subtree_debt', 'descendant_count', 'subtree_depth').get(id=supplier.id)
+
+    def test_rollups_follow_inserts_debt_changes_moves_and_deletes(self):
+        """
+        Итоги обновляются вдоль цепочки предков при вставке, изменении долга, переносе и удалении
+        """
+        debt = Decimal(self.RETAIL_DATA['debt']) + Decimal(self.ENT_DATA['debt']) + self.other.debt
+        self.assertEqual(self.rollups(self.factory), (debt, 3, 2))
+        self.assertRollupsAreValid()
+
+        self.ent.debt += 100
+        self.ent.save()
+        Supplier.objects.filter(id=self.other.id).update(debt=0)
+        self.assertEqual(self.rollups(self.factory)[0], debt + 100 - self.other.debt)
+        self.assertRollupsAreValid()
+
+        response = self.user_client.post(f'{self.URL}{self.retail.id}/move/', {'target': self.factory_2.id},
+                                         format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.rollups(self.factory), (0, 1, 1))
+        self.assertEqual(self.rollups(self.factory_2)[1:], (2, 2))
+        self.assertRollupsAreValid()
+
+        Supplier.objects.filter(id=self.ent.id).update(debt=0)
+        response = self.user_client.delete(f'{self.URL}{self.ent.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.rollups(self.factory_2)[1:], (1, 1))
+        self.assertRollupsAreValid()
+
+    def test_rollups_of_bigint_ids(self):
+        """
+        Итоги ведутся и для звеньев с id больше 2^31
+        """
+        Supplier.objects.filter(id=self.factory_2.id).update(id=2 ** 31 + 1)
+        factory_2 = Supplier.objects.get(id=2 ** 31 + 1)
+        child = Supplier.objects.create(parent=factory_2, **{**self.SUPPLIER_WITH_DEBT, 'name': 'ИП 2'})
+        self.assertEqual(self.rollups(factory_2), (child.debt, 1, 1))
+
+        Supplier.objects.delete_node(child)
+        self.assertEqual(self.rollups(factory_2), (0, 0, 0))
+        self.assertRollupsAreValid()
+
+    def test_saving_stale_instance_keeps_rollups(self):
+        """
+        Сохранение звена, загруженного до изменения его потомков, не затирает итоги
+        """
+        stale = Supplier.objects.get(id=self.factory.id)
+        Supplier.objects.create(parent=self.ent, **self.SUPPLIER_WITHOUT_DEBT)
+        stale.city = 'Казань'
+        stale.save()
+        self.assertEqual(self.rollups(self.factory)[1:], (4, 3))
+        self.assertRollupsAreValid()
+
+    def test_list_can_be_sorted_by_rollups(self):
+        """
+        Список звеньев сортируется по итогам поддерева
+        """
+        response = self.user_client.get(self.URL, {'ordering': '-descendant_count'})
+        suppliers = response.json()['results']
+        self.assertEqual([supplier['id'] for supplier in suppliers][:2], [self.factory.id, self.retail.id])
+        self.assertEqual(suppliers[0]['descendant_count'], 3)
+
+    def test_rebuild_rollups_fixes_only_broken_rows(self):
+        """
+        Перестроение итогов исправляет только строки с неверными значениями
+        """
+        Supplier.objects.filter(id=self.retail.id).update(subtree_debt=0, descendant_count=0)
+        self.assertEqual(Supplier.objects.rebuild_rollups([self.factory.tree_id]), 1)
+        self.assertRollupsAreValid()
@@ -0,0 +1,75 @@
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app_shop.filters import SupplierSearchFilter
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierSearchAPITestCase(BaseTestCase):
+    """Полнотекстовый поиск звеньев"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory_1, **self.RETAIL_DATA)
+        self.ent = Supplier.objects.create(parent=self.retail, **self.ENT_DATA)
+
+    def search(self, text, **params):
+        response = self.user_client.get(self.URL, {'search': text, **params})
+        return [supplier['id'] for supplier in response.json()['results']]
+
+    def test_search_matches_word_prefixes_in_all_fields(self):
+        """
+        Каждое слово запроса ищется как префикс слова названия, страны, города, улицы или email
+        """
+        self.assertEqual(set(self.search('росс')), {self.factory_1.id, self.factory_2.id, self.ent.id})
+        self.assertEqual(self.search('минск пушк'), [self.retail.id])
+        self.assertEqual(self.search('Нижн новг'), [self.ent.id])
+        self.assertEqual(self.search('factory_2@example.com'), [self.factory_2.id])
+        self.assertEqual(self.search('таврич москва'), [])
+        self.assertEqual(len(self.search('  ')), 4)
+
+    def test_results_are_ordered_by_rank(self):
+        """
+        Звенья, в которых слово встречается чаще, выводятся первыми, по всем страницам без повторов
+        """
+        Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'name': 'Москва', 'city': 'Москва'})
+        ids = self.search('москв')
+        self.assertEqual(ids[0], Supplier.objects.get(name='Москва').id)
+
+        response = self.user_client.get(self.URL, {'search': 'москв', 'page_size': 1})
+        self.assertEqual([supplier['id'] for supplier in response.json()['results']], ids[:1])
+        response = self.user_client.get(response.json()['next'])
+        self.assertEqual([supplier['id'] for supplier in response.json()['results']], ids[1:])
+
+    def test_tied_ranks_are_paged_without_losses(self):
+        """
+        Звенья с одинаковой релевантностью не теряются на границах страниц
+        """
+        for index in range(5):
+            Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'name': f'Москва {index}'})
+        ids = self.search('москв')
+        self.assertEqual(len(ids), 6)
+
+        paged = []
+        response = self.user_client.get(self.URL, {'search': 'москв', 'page_size': 2})
+        while True:
+            paged += [supplier['id'] for supplier in response.json()['results']]
+            if not response.json()['next']:
+                break
+            response = self.user_client.get(response.json()['next'])
+        self.assertEqual(paged, ids)
+
+    def test_search_uses_full_text_index(self):
+        """
+        Поиск читает звенья по индексу suppliers_search_idx
+        """
+        request = Request(APIRequestFactory().get(self.URL, {'search': 'минск'}))
+        queryset = SupplierSearchFilter().filter_queryset(request, Supplier.objects.all(), None)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn('suppliers_search_idx', plan)
@@ -0,0 +1,58 @@
+from rest_framework import status
+
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierTreeAPITestCase(BaseTestCase):
+    """Вложенное представление поддерева звена"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory, **self.RETAIL_DATA)
+        self.ents = [
+            Supplier.objects.create(parent=self.retail, **{**self.ENT_DATA, 'name': f'ИП {index}'})
+            for index in range(5)
+        ]
+        self.other = Supplier.objects.create(parent=self.factory, **self.SUPPLIER_WITHOUT_DEBT)
+
+    def names(self, item):
+        return [child['name'] for child in item['children']]
+
+    def test_tree_is_built_from_one_range_query(self):
+        """
+        Поддерево читается одним запросом по интервалу после чтения пользователя и самого звена
+        """
+        with self.assertNumQueries(3):
+            response = self.user_client.get(f'{self.URL}{self.factory.id}/tree/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        tree = response.json()
+        self.assertEqual(tree['id'], self.factory.id)
+        self.assertEqual(self.names(tree), [self.RETAIL_DATA['name'], self.SUPPLIER_WITHOUT_DEBT['name']])
+        self.assertEqual(self.names(tree['children'][0]), [f'ИП {index}' for index in range(5)])
+        self.assertEqual(tree['children'][1]['children'], [])
+
+        response = self.user_client.get(f'{self.URL}tree/', {'chain': self.factory.tree_id, 'depth': 1})
+        self.assertEqual(self.names(response.json()), self.names(tree))
+        self.assertEqual(response.json()['children'][0]['children'], [])
+
+    def test_breadth_cap_returns_continuation_tokens(self):
+        """
+        При ограничении ширины остальные дети звена доступны по токену продолжения
+        """
+        response = self.user_client.get(f'{self.URL}{self.factory.id}/tree/', {'breadth': 2})
+        retail = response.json()['children'][0]
+        self.assertEqual(self.names(retail), ['ИП 0', 'ИП 1'])
+        self.assertNotIn('next', response.json())
+
+        names = self.names(retail)
+        while 'next' in retail:
+            retail = self.user_client.get(f'{self.URL}{self.retail.id}/tree/',
+                                          {'breadth': 2, 'after': retail['next']}).json()
+            names += self.names(retail)
+        self.assertEqual(names, [f'ИП {index}' for index in range(5)])
+
+        response = self.user_client.get(f'{self.URL}{self.factory.id}/tree/', {'after': retail.get('next', 'x')})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
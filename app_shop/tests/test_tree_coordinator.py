@@ -0,0 +1,127 @@
+import threading
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app_shop.coordinator import lock_stats, tree_lock, tree_metrics
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_user.models import CustomUser
+
+
+class TreeLockTestCase(TransactionTestCase):
+    """Структурные изменения одного дерева выполняются по очереди, разных деревьев - параллельно"""
+
+    HOLD_SECONDS = 0.5
+
+    def create_supplier(self, name, parent=None):
+        return Supplier.objects.create(type_supplier='retail' if parent else 'factory', name=name,
+                                       email=f'{name}@example.com', country='Россия', city='Москва',
+                                       street='Ленина', house_number='1', debt=0, parent=parent)
+
+    def run_in_thread(self, target, results, key):
+        def run():
+            started = time.perf_counter()
+            try:
+                target()
+            finally:
+                results[key] = time.perf_counter() - started
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_same_tree_waits_other_tree_proceeds(self):
+        factory_1 = self.create_supplier('factory-1')
+        retail_1 = self.create_supplier('retail-1', factory_1)
+        factory_2 = self.create_supplier('factory-2')
+        retail_2 = self.create_supplier('retail-2', factory_2)
+
+        holding = threading.Event()
+        results = {}
+
+        def hold_tree():
+            with tree_lock([factory_1.tree_id]):
+                holding.set()
+                time.sleep(self.HOLD_SECONDS)
+
+        holder = self.run_in_thread(hold_tree, results, 'holder')
+        holding.wait()
+        lock_stats.reset()
+        same_tree = self.run_in_thread(lambda: Supplier.objects.delete_node(Supplier.objects.get(id=retail_1.id)),
+                                       results, 'same_tree')
+        other_tree = self.run_in_thread(lambda: Supplier.objects.delete_node(Supplier.objects.get(id=retail_2.id)),
+                                        results, 'other_tree')
+        other_tree.join()
+        time.sleep(0.1)
+        waiters = tree_metrics()['lock_waiters']
+        for thread in (holder, same_tree):
+            thread.join()
+
+        self.assertEqual(waiters, 1)
+        self.assertLess(results['other_tree'], self.HOLD_SECONDS)
+        self.assertGreaterEqual(results['same_tree'], self.HOLD_SECONDS / 2)
+        self.assertGreaterEqual(lock_stats.max_wait_seconds, self.HOLD_SECONDS / 2)
+        self.assertEqual(Supplier.objects.count(), 2)
+        self.assertEqual(check_table().broken, set())
+
+    def test_root_deletion_locks_new_tree_before_its_tree(self):
+        """
+        Удаление корня блокирует ключ нового дерева раньше своего дерева, как и перенос в корень,
+        поэтому они не блокируют друг друга взаимно
+        """
+        factory = self.create_supplier('factory')
+        self.create_supplier('retail', factory)
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create(email='ivan@mail.ru'))
+
+        holding = threading.Event()
+        results = {}
+
+        def move_to_root():
+            with tree_lock([None]):
+                holding.set()
+                time.sleep(self.HOLD_SECONDS)
+                with tree_lock([factory.tree_id]):
+                    results['moved'] = True
+
+        holder = self.run_in_thread(move_to_root, results, 'holder')
+        holding.wait()
+        response = client.delete(f'/api/suppliers/{factory.id}/')
+        holder.join()
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(results.get('moved'))
+        self.assertEqual(list(Supplier.objects.values_list('name', 'parent')), [('retail', None)])
+
+    def test_extra_root_and_new_root_get_different_trees(self):
+        """
+        Лишний корень поврежденного дерева и одновременно создаваемый корень получают разные tree_id
+        """
+        factory_1 = self.create_supplier('factory-1')
+        factory_2 = self.create_supplier('factory-2')
+        Supplier.objects.filter(id=factory_2.id).update(tree_id=factory_1.tree_id, lft=3, rght=4)
+
+        holding = threading.Event()
+        results = {}
+
+        def create_root():
+            with tree_lock([None]):
+                self.create_supplier('factory-3')
+                holding.set()
+                time.sleep(self.HOLD_SECONDS)
+
+        holder = self.run_in_thread(create_root, results, 'holder')
+        holding.wait()
+        call_command('check_tree', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        holder.join()
+
+        tree_ids = list(Supplier.objects.filter(parent=None).values_list('tree_id', flat=True))
+        self.assertEqual(len(set(tree_ids)), 3)
+        self.assertEqual(check_table().broken, set())
@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from app_shop.integrity import check_table
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierTreeIntegrityTestCase(BaseTestCase):
+    """Проверка nested set и перестроение только поврежденных деревьев"""
+
+    def setUp(self):
+        super().setUp()
+        self.factory_1 = Supplier.objects.create(**self.FACTORY_1_DATA)
+        self.retail = Supplier.objects.create(parent=self.factory_1, **self.RETAIL_DATA)
+        self.ent = Supplier.objects.create(parent=self.retail, **self.ENT_DATA)
+        self.factory_2 = Supplier.objects.create(**self.FACTORY_2_DATA)
+        self.leaf = Supplier.objects.create(parent=self.factory_2, **self.SUPPLIER_WITHOUT_DEBT)
+
+    def tree_fields(self, tree_id):
+        return list(Supplier.objects.filter(tree_id=tree_id).values_list('id', 'lft', 'rght', 'level'))
+
+    def check_tree(self, *args):
+        out = StringIO()
+        call_command('check_tree', '--workers', '1', *args, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def test_valid_table_has_no_broken_trees(self):
+        """
+        Корректная таблица проходит проверку, команда ничего не изменяет
+        """
+        result = check_table()
+        self.assertEqual((result.nodes, result.trees, result.broken), (5, 2, set()))
+        self.assertIn('повреждено деревьев: 0', self.check_tree())
+
+    def test_rebuilds_only_broken_tree(self):
+        """
+        Перестраивается только дерево с испорченными интервалами, другое дерево не изменяется
+        """
+        expected = self.tree_fields(self.factory_1.tree_id)
+        other_tree = self.tree_fields(self.factory_2.tree_id)
+        Supplier.objects.filter(id=self.ent.id).update(lft=10, rght=11)
+        Supplier.objects.filter(id=self.retail.id).update(level=3)
+
+        self.assertEqual(check_table().broken, {self.factory_1.tree_id})
+        output = self.check_tree()
+
+        self.assertIn('Перестроено деревьев: 1, изменено строк: 2', output)
+        self.assertEqual(self.tree_fields(self.factory_1.tree_id), expected)
+        self.assertEqual(self.tree_fields(self.factory_2.tree_id), other_tree)
+        self.assertEqual(check_table().broken, set())
+
+    def test_dry_run_does_not_change_rows(self):
+        """
+        В режиме --dry-run поврежденные деревья только выводятся
+        """
+        Supplier.objects.filter(id=self.leaf.id).update(rght=10)
+        self.assertIn('повреждено деревьев: 1', self.check_tree('--dry-run'))
+        self.assertEqual(Supplier.objects.get(id=self.leaf.id).rght, 10)
+
+    def test_parent_link_to_other_tree_rebuilds_both_trees(self):
+        """
+        Звено, чей parent указывает в другое дерево, переносится в это дерево вместе с потомками
+        """
+        Supplier.objects.filter(id=self.retail.id).update(parent=self.factory_2)
+        self.assertEqual(check_table().broken, {self.factory_1.tree_id, self.factory_2.tree_id})
+
+        self.check_tree()
+
+        retail = Supplier.objects.get(id=self.retail.id)
+        self.assertEqual(retail.tree_id, self.factory_2.tree_id)
+        self.assertEqual(list(Supplier.objects.get(id=self.ent.id).get_ancestors()), [self.factory_2, retail])
+        self.assertEqual(self.tree_fields(self.factory_1.tree_id), [(self.factory_1.id, 1, 2, 0)])
+        self.assertEqual(check_table().broken, set())
+
+    def test_second_root_gets_own_tree(self):
+        """
+        Второй корень с тем же tree_id получает собственное дерево
+        """
+        Supplier.objects.filter(id=self.factory_2.id).update(tree_id=self.factory_1.tree_id, lft=7, rght=8)
+        Supplier.objects.filter(id=self.leaf.id).update(tree_id=self.factory_1.tree_id, lft=9, rght=10, level=0)
+
+        self.check_tree()
+
+        factory_2 = Supplier.objects.get(id=self.factory_2.id)
+        self.assertNotEqual(factory_2.tree_id, self.factory_1.tree_id)
+        self.assertEqual((factory_2.lft, factory_2.rght), (1, 4))
+        self.assertEqual(check_table().broken, set())
@@ -0,0 +1,190 @@
+from unittest import mock
+
+from rest_framework import status
+
+from app_shop.benchmark import measure
+from app_shop.models import Supplier
+from app_shop.tests.base_test import BaseTestCase
+
+
+class SupplierTreeMaintenanceTestCase(BaseTestCase):
+    """Инкрементальное обслуживание дерева при удалении звеньев"""
+
+    def create_supplier(self, data, parent_id=None, **overrides):
+        supplier_data = {**data, **overrides}
+        if parent_id:
+            supplier_data['parent'] = parent_id
+        response = self.user_client.post(self.URL, supplier_data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()['id']
+
+    def assertTreeIsValid(self, tree_id):
+        """
+        Проверяет, что интервалы дерева совпадают со связями parent.
+        """
+        nodes = {node.id: node for node in Supplier.objects.filter(tree_id=tree_id)}
+        bounds = sorted([node.lft for node in nodes.values()] + [node.rght for node in nodes.values()])
+        self.assertEqual(bounds, list(range(1, 2 * len(nodes) + 1)))
+
+        for node in nodes.values():
+            self.assertEqual(node.get_descendant_count(), len([
+                other for other in nodes.values() if node.lft < other.lft < node.rght
+            ]))
+            if node.parent_id:
+                parent = nodes[node.parent_id]
+                self.assertTrue(parent.lft < node.lft < node.rght < parent.rght)
+                self.assertEqual(node.level, parent.level + 1)
+            else:
+                self.assertEqual((node.lft, node.level), (1, 0))
+
+    def test_delete_fixes_only_affected_tree(self):
+        """
+        Удаление дистрибьютора не изменяет другие деревья и оставляет свое дерево корректным
+
+        Исходная структура:
+
+            [Завод 1]                [Завод 2]
+                |                        |
+            [Дистрибьютор]           [Розница]
+              /       \\
+           [ИП 1]   [ИП 2]
+
+        После удаления дистрибьютора ИП 1 и ИП 2 становятся детьми завода 1,
+        дерево завода 2 не изменяется.
+        """
+        factory_1_id = self.create_supplier(self.FACTORY_1_DATA)
+        distributor_id = self.create_supplier(self.RETAIL_DATA, factory_1_id)
+        self.create_supplier(self.ENT_DATA, distributor_id, name='ИП 1')
+        self.create_supplier(self.ENT_DATA, distributor_id, name='ИП 2')
+
+        factory_2_id = self.create_supplier(self.FACTORY_2_DATA)
+        self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, factory_2_id)
+
+        factory_2 = Supplier.objects.get(id=factory_2_id)
+        other_tree = list(Supplier.objects.filter(tree_id=factory_2.tree_id).values_list('id', 'lft', 'rght'))
+
+        response = self.user_client.delete(f"{self.URL}{distributor_id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        factory_1 = Supplier.objects.get(id=factory_1_id)
+        self.assertEqual(factory_1.get_children().count(), 2)
+        self.assertTreeIsValid(factory_1.tree_id)
+        self.assertEqual(
+            list(Supplier.objects.filter(tree_id=factory_2.tree_id).values_list('id', 'lft', 'rght')),
+            other_tree
+        )
+
+    def test_delete_root_makes_children_separate_trees(self):
+        """
+        При удалении корня каждый ребенок становится корнем отдельного дерева вместе со своими потомками
+        """
+        factory_1_id = self.create_supplier(self.FACTORY_1_DATA)
+        retail_id = self.create_supplier(self.RETAIL_DATA, factory_1_id)
+        ent_id = self.create_supplier(self.ENT_DATA, retail_id)
+        other_retail_id = self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, factory_1_id)
+
+        response = self.user_client.delete(f"{self.URL}{factory_1_id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        retail = Supplier.objects.get(id=retail_id)
+        other_retail = Supplier.objects.get(id=other_retail_id)
+        self.assertNotEqual(retail.tree_id, other_retail.tree_id)
+        self.assertEqual(Supplier.objects.get(id=ent_id).parent_id, retail_id)
+        self.assertTreeIsValid(retail.tree_id)
+        self.assertTreeIsValid(other_retail.tree_id)
+
+    def test_reparent_children_uses_constant_number_of_queries(self):
+        """
+        Количество запросов при переназначении детей не зависит от их количества
+        """
+        for children_count in (2, 20):
+            factory = Supplier.objects.create(**{**self.FACTORY_1_DATA, 'name': f'Завод {children_count}'})
+            distributor = Supplier.objects.create(
+                parent=factory, **{**self.RETAIL_DATA, 'name': f'Сеть {children_count}'}
+            )
+            for index in range(children_count):
+                Supplier.objects.create(
+                    parent=distributor, **{**self.ENT_DATA, 'name': f'ИП {children_count}-{index}'}
+                )
+
+            with self.assertNumQueries(6):
+                Supplier.objects.reparent_children(distributor)
+
+            self.assertEqual(factory.get_children().count(), children_count + 1)
+            self.assertTreeIsValid(factory.tree_id)
+
+    def test_insert_appends_without_shifting_siblings(self):
+        """
+        Новое звено добавляется последним среди соседей, а алфавитный порядок
+        соседей сохраняется в списке звеньев за счет ключа сортировки
+        """
+        factory_id = self.create_supplier(self.FACTORY_1_DATA)
+        self.create_supplier(self.RETAIL_DATA, factory_id, name='Сеть Б')
+        sibling = Supplier.objects.get(name='Сеть Б')
+
+        self.create_supplier(self.ENT_DATA, factory_id, name='ИП А')
+        ent = Supplier.objects.get(name='ИП А')
+        self.assertGreater(ent.lft, sibling.rght)
+        self.assertEqual(Supplier.objects.get(id=sibling.id).lft, sibling.lft)
+
+        self.create_supplier(self.SUPPLIER_WITHOUT_DEBT, ent.id, name='Розница')
+        response = self.user_client.get(self.URL)
+        self.assertEqual(
+            [supplier['name'] for supplier in response.json()['results']],
+            [self.FACTORY_1_DATA['name'], 'ИП А', 'Розница', 'Сеть Б'],
+        )
+
+        ent.name = 'Сеть В'
+        ent.save()
+        self.assertEqual(
+            list(Supplier.get_all_suppliers().values_list('name', flat=True)),
+            [self.FACTORY_1_DATA['name'], 'Сеть Б', 'Сеть В', 'Розница'],
+        )
+
+    def test_root_insert_does_not_renumber_trees(self):
+        """
+        Вставка завода не изменяет tree_id существующих деревьев даже при алфавитной вставке mptt,
+        а корни в списке звеньев упорядочены по названию
+        """
+        names = [f'Завод {letter}' for letter in 'ДГЕБВА']
+        with mock.patch.object(Supplier._mptt_meta, 'order_insertion_by', ['name']):
+            for number, name in enumerate(names):
+                trees = list(Supplier.objects.values_list('id', 'tree_id'))
+                with measure() as result:
+                    self.create_supplier(self.FACTORY_1_DATA, name=name, email=f'factory_{number}@example.com')
+                self.assertEqual(list(Supplier.objects.filter(id__in=[pk for pk, _ in trees])
+                                      .values_list('id', 'tree_id')), trees)
+                self.assertLessEqual(result.rows, 2)
+
+            supplier = Supplier.objects.get(name='Завод Д')
+            supplier.name = 'Завод Ж'
+            supplier.save()
+            self.assertEqual(Supplier.objects.get(id=supplier.id).tree_id, supplier.tree_id)
+
+        self.assertEqual(list(Supplier.get_all_suppliers().values_list('name', flat=True)),
+                         sorted(names[1:]) + ['Завод Ж'])
+
+    def test_invalid_moves_are_found_before_any_write(self):
+        """
+        Переносы в собственное поддерево, в том числе циклы из нескольких переносов набора,
+        находятся одним запросом без записи
+        """
+        factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        retail = Supplier.objects.create(parent=factory, **self.RETAIL_DATA)
+        ent = Supplier.objects.create(parent=retail, **self.ENT_DATA)
+        other = Supplier.objects.create(parent=factory, **self.SUPPLIER_WITHOUT_DEBT)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(Supplier.objects.creates_cycle(retail, ent))
+        with self.assertNumQueries(1):
+            self.assertFalse(Supplier.objects.creates_cycle(ent, other))
+
+        with measure() as result:
+            invalid = Supplier.objects.invalid_moves({retail.id: other.id, other.id: ent.id, factory.id: factory.id})
+        self.assertEqual(invalid, {retail.id, other.id, factory.id})
+        self.assertEqual((result.queries, result.rows), (1, 0))
+        self.assertEqual(Supplier.objects.invalid_moves({retail.id: other.id, other.id: None}), set())
+
+        response = self.user_client.patch(f'{self.URL}{retail.id}/', {'parent': ent.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Supplier.objects.get(id=retail.id).parent_id, factory.id)
@@ -1,3 +1,8 @@
+import contextlib
+import io
+from importlib import import_module
+
+from django.db import IntegrityError, connection, transaction
 from rest_framework import status
 from rest_framework.test import APIClient
 
@@ -362,3 +367,67 @@ class SupplierPartialUpdateAPITestCase(BaseTestCase):
         updated_retail = Supplier.objects.get(id=retail_id)
 
         self.assertEqual(updated_retail.parent.id, factory_2_id)
+
+    def test_hierarchy_rules_are_enforced_by_database_constraints(self):
+        """Правила иерархии соблюдаются и при массовом обновлении, минуя проверки сериализатора"""
+
+        factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        retail = Supplier.objects.create(parent=factory, **self.SUPPLIER_WITH_DEBT)
+
+        for values, message in [
+            ({'parent': None}, 'Ошибка: у звена без родителя не может быть долга'),
+            ({'type_supplier': 'factory'}, 'Ошибка: завод не может иметь родителя'),
+        ]:
+            with self.assertRaises(IntegrityError) as error, transaction.atomic():
+                Supplier.objects.filter(id=retail.id).update(**values)
+            self.assertEqual(Supplier.constraint_error(error.exception), message)
+
+        response = self.user_client.patch(f"{self.URL}{retail.id}/", {"type_supplier": "factory"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json().get('non_field_errors')[0], 'Ошибка: завод не может иметь родителя')
+        self.assertEqual(Supplier.objects.get(id=retail.id).type_supplier, self.SUPPLIER_WITH_DEBT['type_supplier'])
+
+    def test_constraints_are_added_over_violating_rows_and_validated_separately(self):
+        """
+        Ограничения добавляются и при уже нарушающих правила строках, проверка существующих строк
+        сообщает о нарушениях и проходит после их исправления
+        """
+        add_constraints = import_module('app_shop.migrations.0008_supplier_check_constraints')
+        validate = import_module('app_shop.migrations.0021_validate_supplier_constraints')
+        factory = Supplier.objects.create(**self.FACTORY_1_DATA)
+        retail = Supplier.objects.create(parent=factory, **self.SUPPLIER_WITH_DEBT)
+
+        def validated():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT conname, convalidated FROM pg_constraint WHERE conname = ANY(%s)',
+                               [list(validate.VIOLATIONS_SQL)])
+                return dict(cursor.fetchall())
+
+        def alter(sql):
+            # ALTER TABLE недоступен, пока в транзакции теста есть отложенные триггеры версий таблиц
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(sql)
+
+        def run_validation():
+            alter('SELECT 1')
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output), connection.schema_editor() as schema_editor:
+                validate.validate_constraints(None, schema_editor)
+            return output.getvalue()
+
+        alter(add_constraints.DROP_CONSTRAINTS_SQL)
+        Supplier.objects.filter(id=retail.id).update(parent=None)
+        alter(add_constraints.ADD_CONSTRAINTS_SQL)
+        self.assertEqual(validated(), {'suppliers_factory_without_parent': False, 'suppliers_root_without_debt': False})
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Supplier.objects.filter(id=factory.id).update(debt=1)
+
+        report = run_validation()
+        self.assertIn(f'suppliers_root_without_debt: 1 нарушающих строк (id: {retail.id})', report)
+        self.assertEqual(validated(), {'suppliers_factory_without_parent': True, 'suppliers_root_without_debt': False})
+
+        Supplier.objects.filter(id=retail.id).update(parent=factory)
+        self.assertEqual(run_validation(), '')
+        self.assertEqual(validated(), {'suppliers_factory_without_parent': True, 'suppliers_root_without_debt': True})
@@ -1,35 +1,62 @@
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.db.models import Model
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
 from mptt.exceptions import InvalidMove
 from rest_framework import status
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, serializers
+from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import Supplier, Product
-from .serializers import SupplierSerializer, ProductSerializer
+from .bulk_import import SupplierImportError, import_suppliers
+from .filters import ProductFilter, SupplierFilter, SupplierSearchFilter
+from .models import ERROR_FACTORY_PARENT_MSG, ERROR_ROOT_DEBT_MSG, Supplier, Product
+from .pagination import KeysetPagination
+from .response_cache import CachedResponseMixin
+from .serializers import (SupplierSerializer, ProductSerializer, SupplierMoveSerializer, SubtreeQuerySerializer,
+                          CommonAncestorQuerySerializer)
+from .sparse_fields import SparseFieldsViewMixin
+from .subtree import build_tree, decode_token, subtree_rows
 
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Supplier.get_all_suppliers()
     serializer_class = SupplierSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['country']
+    filter_backends = [DjangoFilterBackend, SupplierSearchFilter, filters.OrderingFilter]
+    filterset_class = SupplierFilter
+    ordering_fields = ['created_at', 'id', 'subtree_debt', 'descendant_count', 'subtree_depth']
+    pagination_class = KeysetPagination
+    cache_tables = ('suppliers',)
     http_method_names = ['get', 'post', 'delete', 'patch']
 
     def destroy(self, request, *args, **kwargs):
         """
         Удаление объекта поставщика.
+        При мягком удалении звено только помечается, остальное делает фоновая очистка.
         """
         instance = self.get_object()
-        can_delete, debtor = instance.can_be_deleted()
+        if settings.SUPPLIER_SOFT_DELETE:
+            can_delete, debtor = instance.can_be_deleted()
+            if not can_delete:
+                return self._deletion_error_response(instance, debtor)
+            Supplier.objects.soft_delete(instance.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
-        if not can_delete:
-            return self._deletion_error_response(instance, debtor)
+        with Supplier.objects.lock_trees(instance, tree_ids=[None] if instance.parent_id is None else []):
+            can_delete, debtor = instance.can_be_deleted()
 
-        self._reparent_children(instance)
-        self.perform_destroy(instance)
-        Supplier.objects.rebuild()
+            if not can_delete:
+                return self._deletion_error_response(instance, debtor)
+
+            Supplier.objects.reparent_children(instance)
+            self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @staticmethod
@@ -46,29 +73,212 @@ class SupplierViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def perform_destroy(self, instance):
+        Supplier.objects.delete_node(instance)
+
+    def perform_create(self, serializer):
+        self._save(serializer)
+
+    def perform_update(self, serializer):
+        self._save(serializer)
+
     @staticmethod
-    def _reparent_children(instance):
-        children = instance.get_children()
-        for child in children:
-            child.parent = instance.parent
-            child.save()
+    def _save(serializer):
+        """
+        Сохраняет звено. Нарушение ограничения CHECK звена возвращается
+        с сообщением правила, как ошибка проверки сериализатора.
+        """
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as e:
+            message = Supplier.constraint_error(e)
+            if message is None:
+                raise
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
 
     def update(self, request, *args, **kwargs):
         """
         Обновление объекта поставщика.
+        Перенос звена в собственное поддерево отклоняется до записи по интервалам lft/rght.
         """
-        serializer = self.get_serializer(self.get_object(), data=request.data, partial=True)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
 
+        if Supplier.objects.creates_cycle(instance, serializer.validated_data.get('parent')):
+            return self._cycle_error_response()
         try:
-            return super().update(request, *args, **kwargs)
+            self.perform_update(serializer)
         except ValidationError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except InvalidMove:
-            return Response({'error': 'Зацикленные отношения не допустимы'}, status=status.HTTP_400_BAD_REQUEST)
+            # Звено перенесли параллельно между проверкой и сохранением.
+            return self._cycle_error_response()
+        return Response(serializer.data)
+
+    @staticmethod
+    def _cycle_error_response():
+        return Response({'error': 'Зацикленные отношения не допустимы'}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """
+        Перенос звена вместе с поддеревом относительно target.
+        """
+        instance = self.get_object()
+        serializer = SupplierMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._move([{**serializer.validated_data, 'id': instance.pk}], many=False)
+
+    @action(detail=False, methods=['post'], url_path='move')
+    def move_many(self, request):
+        """
+        Перенос нескольких звеньев с поддеревьями в одной транзакции.
+        Набор проверяется целиком: при ошибке в любом переносе ничего не изменяется.
+        """
+        serializer = SupplierMoveSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if any('id' not in move for move in serializer.validated_data):
+            return Response({'error': 'Ошибка: не указано переносимое звено'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._move(serializer.validated_data, many=True)
+
+    def _move(self, moves, many):
+        ids = {move['id'] for move in moves} | {move['target'] for move in moves if move['target'] is not None}
+        suppliers = Supplier.objects.in_bulk(ids)
+        missing = sorted(ids - set(suppliers))
+        if missing:
+            return Response({'error': f'Ошибка: звенья не найдены: {missing}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        plan = [(suppliers[move['id']], suppliers.get(move['target']), move['position']) for move in moves]
+        parents = Supplier.objects.new_parents(plan)
+        for node, _, _ in plan:
+            if node.type_supplier == 'factory' and parents[node.pk] is not None:
+                return Response({'error': ERROR_FACTORY_PARENT_MSG}, status=status.HTTP_400_BAD_REQUEST)
+            if parents[node.pk] is None and node.debt > 0:
+                return Response({'error': ERROR_ROOT_DEBT_MSG}, status=status.HTTP_400_BAD_REQUEST)
+        if Supplier.objects.invalid_moves(parents):
+            return self._cycle_error_response()
+
+        try:
+            with transaction.atomic():
+                Supplier.objects.move_subtrees(plan)
+        except InvalidMove:
+            return self._cycle_error_response()
+        except IntegrityError as e:
+            # Долг или тип звена изменили параллельно после проверки правил выше.
+            message = Supplier.constraint_error(e)
+            if message is None:
+                raise
+            return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+        data = self.get_serializer([node for node, _, _ in plan], many=True).data
+        return Response(data if many else data[0])
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Массовая загрузка звеньев из вложенного документа или документа со ссылками на родителей.
+        Документ проверяется целиком: при ошибке в любом звене ничего не загружается.
+        """
+        try:
+            result = import_suppliers(request.data)
+        except SupplierImportError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'rows': result.rows,
+            'trees': result.trees,
+            'rebuilt_trees': result.rebuilt_trees,
+            'seconds': round(result.seconds, 3),
+            'rows_per_second': round(result.rows_per_second),
+            'ids': result.ids,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        """
+        Вложенное представление звена и его потомков.
+        """
+        params = SubtreeQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return self._tree_response(self.get_object(), params.validated_data)
+
+    @action(detail=False, methods=['get'], url_path='tree')
+    def chain_tree(self, request):
+        """
+        Вложенное представление всей цепочки с tree_id из параметра chain.
+        """
+        params = SubtreeQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        if 'chain' not in params.validated_data:
+            return Response({'error': 'Ошибка: не указана цепочка'}, status=status.HTTP_400_BAD_REQUEST)
+        root = get_object_or_404(Supplier, tree_id=params.validated_data['chain'], parent=None)
+        return self._tree_response(root, params.validated_data)
+
+    def _tree_response(self, root, params):
+        after = None
+        if 'after' in params:
+            try:
+                parent_id, after = decode_token(params['after'])
+            except signing.BadSignature:
+                parent_id = None
+            if parent_id != root.pk:
+                return Response({'error': 'Ошибка: недействительный токен продолжения'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        def serialize(nodes):
+            return self.get_serializer(nodes, many=True).data
+
+        rows = subtree_rows(root, params.get('depth'), after)
+        return Response(build_tree(root, rows, serialize, params['breadth']))
+
+    @action(detail=True, methods=['get'])
+    def path(self, request, pk=None):
+        """
+        Путь от первого звена цепочки до звена.
+        """
+        return self._versioned_response(request, 'path', [pk], lambda: self.get_serializer(
+            Supplier.objects.path_to(pk), many=True).data)
+
+    @action(detail=True, methods=['get'], url_path='common-ancestor')
+    def common_ancestor(self, request, pk=None):
+        """
+        Ближайшее общее звено цепочек звена и звена other, null - если цепочки не пересекаются.
+        """
+        params = CommonAncestorQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        other = params.validated_data['other']
+
+        def build():
+            ancestor = Supplier.objects.common_ancestor(pk, other)
+            return {'ancestor': self.get_serializer(ancestor).data if ancestor else None}
+
+        return self._versioned_response(request, 'common-ancestor', [pk, other], build)
+
+    @staticmethod
+    def _versioned_response(request, name, pks, build):
+        """
+        Ответ, который зависит только от деревьев звеньев pks. Он кэшируется по версиям этих деревьев,
+        а если версии совпадают с If-None-Match, возвращается 304 без построения ответа.
+        """
+        try:
+            pks = [int(pk) for pk in pks]
+        except ValueError:
+            raise Http404
+        versions = Supplier.objects.tree_versions(*pks)
+        if len(versions) < len(set(pks)):
+            raise Http404
+
+        etag = '"{}"'.format('-'.join('{}.{}'.format(*versions[pk]) for pk in pks))
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        key = 'suppliers:{}:{}:{}'.format(name, ':'.join(map(str, pks)), etag)
+        return Response(cache.get_or_set(key, build), headers={'ETag': etag})
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Product.get_all_products()
     serializer_class = ProductSerializer
+    filterset_class = ProductFilter
+    pagination_class = KeysetPagination
+    cache_tables = ('products', 'suppliers')
     http_method_names = ['get', 'post', 'delete', 'patch']
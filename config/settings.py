@@ -133,3 +133,29 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7)
 }
+
+# Вставлять звенья среди соседей в алфавитном порядке (сдвигает lft/rght соседей).
+# По умолчанию звенья добавляются в конец, а алфавитный порядок задает ключ sort_path при чтении.
+SUPPLIER_SORTED_INSERTION = os.getenv('SUPPLIER_SORTED_INSERTION', 'False') == 'True'
+
+# Шаг разреженной нумерации lft/rght. При значении больше 0 между границами интервалов
+# остаются промежутки, и вставка листа или перенос небольшого поддерева не сдвигают соседей.
+# 0 - плотная нумерация django-mptt: добавление звена сдвигает lft/rght всех звеньев дерева правее
+# места вставки и предков, то есть стоит O(n) записей строк в большом дереве.
+SUPPLIER_NESTED_SET_GAP = int(os.getenv('SUPPLIER_NESTED_SET_GAP', '0'))
+
+# Хранилище иерархии звеньев сети: nested_set, closure или path
+SUPPLIER_HIERARCHY = os.getenv('SUPPLIER_HIERARCHY', 'nested_set')
+
+# Мягкое удаление звеньев: удаление через API и админку только помечает звено,
+# дети переназначаются и строки удаляются командой purge_deleted_suppliers.
+SUPPLIER_SOFT_DELETE = os.getenv('SUPPLIER_SOFT_DELETE', 'False') == 'True'
+
+# Размер страницы списков API по умолчанию и максимальный размер, который можно запросить
+# параметром page_size.
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '100'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '1000'))
+
+# Время хранения ответов API в кэше, секунд. Ответы сбрасываются по версиям таблиц при любом изменении,
+# время хранения только освобождает кэш от ответов устаревших версий.
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '3600'))